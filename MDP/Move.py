@@ -1,16 +1,17 @@
-
 class Move:
 
     """
-    This class takes in the old and new solution and the move made to change from one to another
-    The new solution is the copy of the old solution that can be achieved by exchanging 2 elements
-    described in path.change in the form of [i,j], where i is from the old solution and j from new solution
+    This class takes in the old solution and the move made to change it, in the form of [i,j] in path,
+    where i is from the old solution and j from the new solution
+    fitness is the score of the solution after the move. The new solution is only kept if it's given, as the search
+    applies the swap to its current solution in place and copies it only when a new best is found
     """
 
-    def __init__(self, old_sol, new_sol, path):
+    def __init__(self, old_sol, new_sol, path, fitness=None):
         self.old_sol = old_sol
         self.new_sol = new_sol
         self.path = path
+        self.fitness = getattr(new_sol, 'fitness', None) if fitness is None else fitness
 
     def __str__(self):
-        return str(self.path)
\ No newline at end of file
+        return str(self.path)
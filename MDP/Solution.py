@@ -1,3 +1,4 @@
+import numpy as np
 
 
 class Solution:
@@ -5,8 +6,40 @@ class Solution:
     """
     This class defines the solution class, where val is 0 or 1 of an element in the superset, depending
     whether it's in the solution or not, and fitness is the score of the solution
+    members and non_members hold the indices of elements in and out of the solution, and pos is the position of every
+    element in whichever of the two it belongs to, so that two elements can be swapped in O(1)
     """
 
     def __init__(self, val, fitness=0):
-        self.val = val
+        self.val = np.array(val, dtype=np.uint8)
+        self.members = np.flatnonzero(self.val == 1)
+        self.non_members = np.flatnonzero(self.val == 0)
+        self.pos = np.empty(len(self.val), dtype=int)
+        self.pos[self.members] = np.arange(len(self.members))
+        self.pos[self.non_members] = np.arange(len(self.non_members))
         self.fitness = fitness
+
+    def swap(self, out_elem, in_elem):
+
+        #out_elem takes the place of in_elem in non_members and vice versa
+        out_pos = self.pos[out_elem]
+        in_pos = self.pos[in_elem]
+
+        self.members[out_pos] = in_elem
+        self.non_members[in_pos] = out_elem
+        self.pos[in_elem] = out_pos
+        self.pos[out_elem] = in_pos
+
+        self.val[out_elem] = 0
+        self.val[in_elem] = 1
+
+    def copy(self):
+
+        sol = Solution.__new__(Solution)
+        sol.val = self.val.copy()
+        sol.members = self.members.copy()
+        sol.non_members = self.non_members.copy()
+        sol.pos = self.pos.copy()
+        sol.fitness = self.fitness
+
+        return sol
@@ -3,22 +3,44 @@ from __future__ import print_function
 from .tabuSearch import TabuSearch
 from .Solution import Solution
 from .Move import Move
+from utils.sharedMatrix import MatrixPool
+from utils.traceRecorder import trace_path
+from utils.profiler import phase
+from utils.condensedMatrix import open_matrix, is_condensed, read_header
 
-from copy import deepcopy
 import numpy as np
+import logging
 import json
 
+logger = logging.getLogger(__name__)
+
 
 class MEnzDPTabuSearch(TabuSearch):
 
 
+    def __init__(self, *args, cls_num=10, **kwargs):
+
+        #cls_num is the candidate list size on each side of a swap, None evaluates every swap in the k x (n-k) block
+        self.cls_num = cls_num
+        super().__init__(*args, **kwargs)
+
+
+    def evaluate_curr_sol(self):
+
+        #Keep the summed pair score of every element towards the solution, so fitness can be carried forward through swaps
+        mat = self.opt_tuple[0]
+
+        self.contrib = initialise_contrib(mat, self.curr_sol)
+        self.curr_sol.fitness = np.sum(self.contrib[self.curr_sol.members])/2
+
+
     def _score(self, sol, use_sim=False):
 
         score = 0
         mat = self.opt_tuple[0]
         sim_list = []
 
-        (set_indices, _) = sep_indices(sol.val)
+        set_indices = np.sort(sol.members)
 
         for i in range(0, len(set_indices)):
             for j in range(i + 1, len(set_indices)):
@@ -37,157 +59,172 @@ class MEnzDPTabuSearch(TabuSearch):
     def _create_neighbourhood(self):
 
         curr_sol = self.curr_sol
-        mat = self.opt_tuple[0]
         delta = self.opt_tuple[1]
 
-        (set_indices, non_indices) = sep_indices(curr_sol.val)
+        set_indices = curr_sol.members
+        non_indices = curr_sol.non_members
 
-        #Create non tabu indice lists
-        set_indices_nontabu = []
-        non_indices_nontabu = []
+        #Tabu state of every element in the solution and non-solution sets, in one lookup
+        tabu = self.tabu_list.is_tabu(np.arange(len(curr_sol.val)))
 
-        for i in set_indices:
-            if not i in self.tabu_list.element_list:
-                set_indices_nontabu += [i]
+        #Keep the indices of elements with the biggest cls_num deltas on both sides of the swap, or all of them in full mode
+        s_cls = candidate_list(set_indices, delta, self.cls_num)
+        n_cls = candidate_list(non_indices, delta, self.cls_num)
 
-        for i in non_indices:
-            if not i in self.tabu_list.element_list:
-                non_indices_nontabu += [i]
+        #Also get the candidate lists from the non tabu indices only, to ensure the neighbourhood never gets empty
+        s_cls_nontabu = candidate_list(set_indices[~tabu[set_indices]], delta, self.cls_num)
+        n_cls_nontabu = candidate_list(non_indices[~tabu[non_indices]], delta, self.cls_num)
 
-        #Arbitrary candidate list number
-        cls_num = 10
+        #neighbourhood is a list of Move objects that has old_sol, the fitness after the move, and the [i,j] move that change between the 2 solutions
+        #Here, the neighbourhood is only 2 moves: best from the s_cls and n_cls swap, if it's tabu and no aspiration, it gets removed; best from the nontabu swaps
         neighbourhood = []
 
-        #Sort the delta and get the indices of the largest, e.g. cls_num = 10 - keep the indices of elements with biggest 10 deltas
-        temp_vals = [(delta[i], i) for i in set_indices]
-        temp_vals.sort(reverse=True)
-        s_cls = [i for _, i in temp_vals[:cls_num]]
-
-        temp_vals = [(delta[i], i) for i in non_indices]
-        temp_vals.sort(reverse=True)
-        n_cls = [i for _, i in temp_vals[:cls_num]]
-
-        #Also sort the delta and indices for the non tabu indices to ensure the neighbourhood never gets empty
-        temp_vals = [(delta[i], i) for i in set_indices_nontabu]
-        temp_vals.sort(reverse=True)
-        s_cls_nontabu = [i for _, i in temp_vals[:cls_num]]
-
-        temp_vals = [(delta[i], i) for i in non_indices_nontabu]
-        temp_vals.sort(reverse=True)
-        n_cls_nontabu = [i for _, i in temp_vals[:cls_num]]
-
-        #alpha is a list with each element in the form of ([i,j], move_gain)
-        alpha = []
-
-        #Calculate the move gains for each combinations of swaps, according to the equation delta(i)+delta(j)-dij, here penalty term is included
-        for i in s_cls:
-            for j in n_cls:
-                alpha += [([i, j], delta[i] + delta[j] - ((1 - mat[i, j]))*1.0 - (mat[i, j]/(1 - mat[i, j])))]
-
-        temp_val = float('-inf')
-        temp_choice = 0
-
-        for i in alpha:
-            if i[1] > temp_val:
-                temp_val = i[1]
-                temp_choice = i
-
-        #Update the values of 1 and 0, and total score according to above
-        #As i (temp_choice[0][0]) is from solution candidate list and j from non-solution, values of 0 and 1 are exchanged
-        neighbour = deepcopy(curr_sol)
-        neighbour.val[temp_choice[0][0]] = 0
-        neighbour.val[temp_choice[0][1]] = 1
-        neighbour.fitness = self._score(neighbour)
-        path = [temp_choice[0][0], temp_choice[0][1]]
-        move = Move(curr_sol, neighbour, path)
-        neighbourhood.append(move)
-
-        alpha = []
-
-        #Calculate the move gains for combinations of nontabu swaps
-        for i in s_cls_nontabu:
-            for j in n_cls_nontabu:
-                alpha += [([i, j], delta[i] + delta[j] - ((1 - mat[i, j]))*1.0 - (mat[i, j]/(1 - mat[i, j])))]
-
-        temp_val = float('-inf')
-        temp_choice = 0
-
-        for i in alpha:
-            if i[1] > temp_val:
-                temp_val = i[1]
-                temp_choice = i
-
-        #Update the values of 1 and 0, and total score according to above
-        #As i (temp_choice[0][0]) is from solution candidate list and j from non-solution, values of 0 and 1 are exchanged
-        neighbour = deepcopy(curr_sol)
-        neighbour.val[temp_choice[0][0]] = 0
-        neighbour.val[temp_choice[0][1]] = 1
-        neighbour.fitness = self._score(neighbour)
-        path = [temp_choice[0][0], temp_choice[0][1]]
-        move = Move(curr_sol, neighbour, path)
-        neighbourhood.append(move)
-
-        #neighbourhood is a list of Move objects that has old_sol, new_sol, and the [i,j] move that change between the 2 solutions
-        #Here, the neighbourhood is only 2 moves: best from the s_cls and n_cls swap, if it's tabu and no aspiration, it gets removed; best from the nontabu swaps
+        for s_list, n_list in [(s_cls, n_cls), (s_cls_nontabu, n_cls_nontabu)]:
+            if len(s_list) == 0 or len(n_list) == 0:
+                continue
+
+            #As i is from solution candidate list and j from non-solution, values of 0 and 1 are exchanged
+            #Only the swapped pair and the score after the swap are recorded
+            path = self._best_swap(s_list, n_list)
+            neighbourhood.append(Move(curr_sol, None, path, self._swap_fitness(curr_sol, path[0], path[1])))
+
         return neighbourhood
 
 
-    def _post_swap_change(self, move):
+    def _best_swap(self, s_list, n_list, block_size=2**22):
 
         mat = self.opt_tuple[0]
         delta = self.opt_tuple[1]
-        indices = move.path
-        temp_sol = move.new_sol
 
-        (set_indices, non_indices) = sep_indices(temp_sol.val)
+        best_gain = float('-inf')
+        best_path = None
 
-        delta[indices[0]] = - (delta[indices[0]]) + (1 - mat[indices[0], indices[1]]) + (mat[indices[0], indices[1]]/(1 - mat[indices[0], indices[1]]))   #+penalty
-        delta[indices[1]] = - (delta[indices[1]]) + (1 - mat[indices[0], indices[1]]) - (mat[indices[0], indices[1]]/(1 - mat[indices[0], indices[1]])) #-penalty
+        #Calculate the move gains for the whole block of swaps at once, according to the equation delta(i)+delta(j)-dij, here penalty term is included
+        #Rows of the block are taken in chunks so a full k x (n-k) block is never held at once
+        rows = max(1, block_size // len(n_list))
+        for start in range(0, len(s_list), rows):
+            s_block = s_list[start:start + rows]
+            weights = mat[np.ix_(s_block, n_list)]
+            alpha = delta[s_block][:, None] + delta[n_list][None, :] - ((1 - weights))*1.0 - (weights/(1 - weights))
 
+            choice = np.argmax(alpha)
+            i, j = divmod(choice, len(n_list))
+            if alpha[i, j] > best_gain:
+                best_gain = alpha[i, j]
+                best_path = [int(s_block[i]), int(n_list[j])]
+
+        return best_path
 
-        for i in range(0, len(delta)):
-            if i in indices:
-                continue
-            if i in set_indices:
-                delta[i] = delta[i] + (1 - mat[indices[0], i]) - (1 - mat[i, indices[1]])- ((mat[indices[0], i])/(1 - mat[indices[0], i])) + ((mat[i, indices[1]])/(1 - mat[i, indices[1]]))
-                continue
-            if i in non_indices:
-                delta[i] = delta[i] - (1 - mat[indices[0], i]) + (1 - mat[i, indices[1]])+ ((mat[indices[0], i])/(1 - mat[indices[0], i])) - ((mat[i, indices[1]])/(1 - mat[i, indices[1]]))
-                continue
+
+    def _swap_fitness(self, sol, out_elem, in_elem):
+
+        #Exact score after the swap: the pair scores of out_elem leave the solution and those of in_elem (except towards out_elem) join it
+        mat = self.opt_tuple[0]
+        return sol.fitness - self.contrib[out_elem] + self.contrib[in_elem] - pair_score(mat[out_elem, in_elem])
+
+
+    def _post_swap_change(self, move):
+
+        mat = self.opt_tuple[0]
+        delta = np.asarray(self.opt_tuple[1], dtype=float)
+        out_elem, in_elem = move.path
+
+        #Membership mask of the current solution, which the swap has already been applied to, +1 for elements in the solution and -1 for the rest
+        sign = np.where(self.curr_sol.val == 1, 1.0, -1.0)
+
+        pair = mat[out_elem, in_elem]
+        new_out = - (delta[out_elem]) + (1 - pair) + (pair/(1 - pair))   #+penalty
+        new_in = - (delta[in_elem]) + (1 - pair) - (pair/(1 - pair)) #-penalty
+
+        #The matrix is symmetric, so the rows of the swapped pair are used in place of their columns
+        row_out = mat[out_elem]
+        row_in = mat[in_elem]
+
+        #Same terms and order as delta(i) + (1 - d(i,out)) - (1 - d(i,in)) - penalty(i,out) + penalty(i,in) for solution elements, with the signs flipped for non-solution elements
+        delta += sign * (1 - row_out)
+        delta -= sign * (1 - row_in)
+        delta -= sign * (row_out/(1 - row_out))
+        delta += sign * (row_in/(1 - row_in))
+
+        #The swapped pair are overwritten last, as their own rows hold the nan diagonal
+        delta[out_elem] = new_out
+        delta[in_elem] = new_in
 
         self.opt_tuple[1] = delta
 
+        #Every element gains its pair score towards in_elem and loses the one towards out_elem
+        contrib = self.contrib
+        new_out = contrib[out_elem] + pair_score(pair)
+        new_in = contrib[in_elem] - pair_score(pair)
+        contrib += pair_score(row_in) - pair_score(row_out)
+        contrib[out_elem] = new_out
+        contrib[in_elem] = new_in
 
-def initialise_matrix(sim_file):
+
+def initialise_matrix(sim_file, mmap=False, dtype=None, block_size=1024, memory=None):
 
     """
     This function switches the similarity matrices (.npy) into distance matrices
+    With mmap, the file is opened copy-on-write so only the pages changed here, those holding the diagonal or a similarity
+    of 1, are held in memory
+    dtype (e.g. np.float32) sets the working precision, a dtype other than the one of the file copies the whole matrix
+    A condensed matrix file is not loaded, it is read through an accessor that makes the same changes to each value it reads
+    With memory in MB, a .npy file is read the same way, memory mapped read-only, and the accessor keeps the rows it reads
+    in a cache of at most memory MB, so the search runs out of core on a matrix bigger than the memory
     """
 
-    #Load in similarity matrix
-    distance_matrix = np.load(sim_file)
+    if memory is not None or is_condensed(sim_file):
+        with phase('load'):
+            distance_matrix = open_matrix(sim_file).transformed(cap_ones, np.nan, dtype)
+        return distance_matrix.cached(memory * 2**20) if memory is not None else distance_matrix
+
+    #Load in similarity matrix, the file on disk is never changed by the in-place changes below
+    with phase('load'):
+        distance_matrix = np.load(sim_file, mmap_mode='c' if mmap else None)
+        if dtype is not None and distance_matrix.dtype != dtype:
+            distance_matrix = distance_matrix.astype(dtype)
 
-    #Change all diagnol values into nan
-    for i in range(0, len(distance_matrix)):
-        distance_matrix[i][i] = np.nan
-        for j in range(i+1, len(distance_matrix)):
-            #Change all values of 1 to 0.99 to aid the calculations in penalty terms
-            if distance_matrix[i][j] == 1:
-                distance_matrix[i][j] = 0.99
-                distance_matrix[j][i] = 0.99
+    return np.asarray(transform_matrix(distance_matrix, block_size))
 
-    return np.asarray(distance_matrix)
+
+def transform_matrix(distance_matrix, block_size=1024):
+
+    """
+    This function makes the changes to a loaded similarity matrix needed by the search, in place
+    """
+
+    with phase('transform'):
+
+        #This is done a block of rows at a time so the mask is never the size of the whole matrix
+        for start in range(0, len(distance_matrix), block_size):
+            cap_ones(distance_matrix[start:start + block_size])
+
+        #Change all diagnol values into nan
+        np.fill_diagonal(distance_matrix, np.nan)
+
+    return distance_matrix
+
+
+def cap_ones(block):
+
+    #Change all values of 1 to 0.99 to aid the calculations in penalty terms, in place
+    block[block == 1] = 0.99
+    return block
 
 
 def initialise_headings(heading_file):
 
     """
     This function switches the heading files (.json) into a dictionary with indices
+    The headings of a condensed matrix file are read from its header
     """
 
     #Load in heading file
-    with open(heading_file) as heading:
-        headings = json.loads(heading.read())
+    if is_condensed(heading_file):
+        headings = read_header(heading_file)[0]['headings']
+    else:
+        with open(heading_file) as heading:
+            headings = json.loads(heading.read())
 
     ind_dict = {}
 
@@ -198,17 +235,74 @@ def initialise_headings(heading_file):
     return ind_dict
 
 
-def random_solution(length, num_picked):
+def random_solution(length, num_picked, rng=None):
 
     """
     This produces the intial random solution set for swapping later
     length is the total number of elements in the superset, num_picked is the number of elements to include in the solution subset
+    rng is the numpy Generator to shuffle with, the global numpy random state is used if not given
     The output of this function is a list of 0s and 1s in random order
     """
 
-    arr = np.array([0] * (length - num_picked) + [1] * num_picked)
-    np.random.shuffle(arr)
-    return list(arr)
+    with phase('random_solution'):
+        arr = np.array([0] * (length - num_picked) + [1] * num_picked)
+        (np.random if rng is None else rng).shuffle(arr)
+        return list(arr)
+
+
+def pair_score(dist):
+
+    """
+    This is the score of a pair in the solution, which is its distance minus the penalty term
+    """
+
+    return (1 - dist) - (dist/(1 - dist))
+
+
+def delta_weight(dist):
+
+    """
+    This is the weight of a pair towards delta of an element in the solution set, with the penalty term
+    Pairs with distance of 1 are left out as their penalty term is infinite
+    """
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = (- (1 - dist))*0.5 + (dist/(1 - dist))
+    weight[dist == 1] = 0
+
+    return weight
+
+
+def member_sums(mat, sol, weight, block_size=1024):
+
+    """
+    This sums weight(d(i,j)) over every j in the solution set apart from i itself, for every element i in the superset
+    It is a weighted row sum of the matrix over the solution columns, worked out one block of rows at a time so only
+    a block of the (n x k) submatrix is held at once
+    """
+
+    set_indices = np.sort(sol.members)
+    ones = np.ones(len(set_indices))
+    sums = np.zeros(len(sol.val))
+
+    for start in range(0, len(sums), block_size):
+        rows = np.arange(start, min(start + block_size, len(sums)))
+        weights = weight(mat[np.ix_(rows, set_indices)])
+        #An element is not paired with itself
+        weights[rows[:, None] == set_indices[None, :]] = 0
+        sums[rows] = weights @ ones
+
+    return sums
+
+
+def initialise_contrib(mat, sol):
+
+    """
+    This is the summed pair score between every element in the superset and the elements in the solution set
+    The fitness of the solution is half the sum over its own elements, and the fitness after a swap can be found from it in O(1)
+    """
+
+    return member_sums(mat, sol, pair_score)
 
 
 def initialise_delta(mat, sol):
@@ -218,30 +312,35 @@ def initialise_delta(mat, sol):
     mat is the identity matrix, sol is the list of 0s and 1s (solution)
     """
 
-    delta = [0] * len(sol.val)
-    (set_indices, non_indices) = sep_indices(sol.val) #separate indices according to the values of 0s and 1s
+    #delta(i) = sum of minus dij for both i,j belong to solution set
+    #The sum of the distances times 0.5 because the same values will be added twice for a matrix, plus the penalty term
+    delta = member_sums(mat, sol, delta_weight)
 
-    for i in set_indices:
-        for j in set_indices:
-            if i == j:
-                continue
-            if mat[i, j] == 1:
-                continue
-            #delta(i) = sum of minus dij for both i,j belong to solution set
-            #The sum of the distances times 0.5 because the same values will be added twice for a matrix
-            delta[i] += (- (1 - mat[i, j]))*0.5 + (mat[i, j]/(1 - mat[i, j])) #This is the penalty term
+    #delta(i) = sum of dij for i belong in non-solution set and j belong in solution set, which is the same weight with its sign flipped
+    delta[sol.non_members] *= -1
 
+    return delta
 
-    for i in non_indices:
-        for j in set_indices:
-            if i == j:
-                continue
-            if mat[i, j] == 1:
-                continue
-            #delta(i) = sum of dij for i belong in non-solution set and j belong in solution set
-            delta[i] += ((1 - mat[i, j]))*0.5 - (mat[i, j]/(1 - mat[i, j])) #This is the penalty term
 
-    return delta
+def candidate_list(indices, delta, cls_num):
+
+    """
+    This returns the cls_num indices with the biggest deltas, in descending order of delta and then of index
+    It gives the same list as sorting all (delta, index) pairs, but only partitions them, so it is O(n) rather than O(n log n)
+    """
+
+    if cls_num is None or cls_num >= len(indices):
+        cand = indices
+    else:
+        vals = delta[indices]
+        threshold = vals[np.argpartition(vals, len(vals) - cls_num)[len(vals) - cls_num]]
+
+        #Ties at the threshold are settled by the biggest indices, as in the full sort
+        above = indices[vals > threshold]
+        ties = np.sort(indices[vals == threshold])[::-1][:cls_num - len(above)]
+        cand = np.concatenate([above, ties])
+
+    return cand[np.lexsort((-cand, -delta[cand]))]
 
 
 def sep_indices(val):
@@ -262,30 +361,180 @@ def sep_indices(val):
     return (set_indices, non_indices)
 
 
-def compute_MDP_tabu(mat, head, k):
+def pair_sims(mat, members):
 
-    head = initialise_headings(head)
-    mat = initialise_matrix(mat)
+    """
+    This returns the values of all pairs in the solution, in the order of the sorted solution indices
+    """
+
+    set_indices = np.sort(members)
+    rows, cols = np.triu_indices(len(set_indices), 1)
+
+    return mat[np.ix_(set_indices, set_indices)][rows, cols].tolist()
+
+
+def tabu_improve(mat, sol, k, cls_num=10, max_steps=20000, max_wait=2000, trace=None):
 
-    seq_len = len(head)
+    """
+    This runs the tabu search from the solution sol and returns the best solution found
+    trace is an optional .npz or .csv file to write the trace of the search to
+    """
+
+    logger.debug("Initialising Delta")
+    with phase('initialise_delta'):
+        delta = initialise_delta(mat, sol)
 
-    ini_sol = Solution(random_solution(seq_len, k))
-    #print(ini_sol.val)
-    print("Initialising Delta")
-    delta = initialise_delta(mat, ini_sol)
-    #print(delta)
-    results_list = []
     #Decrease tabu list size for small subsets to avoid empty neighbourhood
-    subset_size = min(k, 50)
-    test = MEnzDPTabuSearch(ini_sol, subset_size, subset_size, 20000, max_wait=2000, opt_tuple=[mat, delta])
+    tabu_size = min(k, 50)
+    search = MEnzDPTabuSearch(sol, tabu_size, tabu_size, max_steps, max_wait=max_wait, opt_tuple=[mat, delta], cls_num=cls_num)
+    best, _ = search.run(trace)
+
+    return best
+
+
+def _improve_task(mat, task):
+
+    #Task for the worker pool, which is a solution and the tabu search options
+    sol, options = task
+    return tabu_improve(mat, sol, **options)
+
+
+def _search_options(options, trace, number):
+
+    #Tabu search options of search number of a run, with its own trace file if a trace is kept
+    return dict(options, trace=trace_path(trace, number)) if trace else options
+
+
+def backbone_crossover(parent_a, parent_b, k, rng):
+
+    """
+    This creates an offspring that keeps the backbone of elements shared by both parents
+    The rest of the k elements are drawn at random, half from the elements only parent_a has and half from those only parent_b has
+    """
+
+    common = np.flatnonzero(parent_a.val & parent_b.val)
+    only_a = np.flatnonzero(parent_a.val & (1 - parent_b.val))
+    only_b = np.flatnonzero(parent_b.val & (1 - parent_a.val))
+
+    need = k - len(common)
+    from_a = need - need // 2
+
+    val = np.zeros(len(parent_a.val), dtype=np.uint8)
+    val[common] = 1
+    val[rng.choice(only_a, from_a, replace=False)] = 1
+    val[rng.choice(only_b, need - from_a, replace=False)] = 1
+
+    return Solution(val)
+
+
+def update_population(population, child, k, beta=0.6):
+
+    """
+    This adds child to the population if it's not already in it, then drops the individual with the worst goodness score
+    The goodness score weighs the quality of an individual (its fitness) by beta and its distance to the rest of the population
+    (the number of elements it doesn't share with its closest individual) by 1 - beta, both scaled to [0, 1]
+    """
+
+    pool = population + [child]
+    vals = np.array([sol.val for sol in pool], dtype=np.int32)
+
+    #Distance between two solutions is the number of elements in one and not in the other
+    distance = k - vals @ vals.T
+    np.fill_diagonal(distance, k + 1)
+    if distance[-1].min() == 0:
+        return population
+
+    quality = np.array([sol.fitness for sol in pool])
+    spread = distance.min(axis=1).astype(float)
+
+    def scaled(x):
+        return (x - x.min()) / (x.max() - x.min() + 1)
+
+    goodness = beta * scaled(quality) + (1 - beta) * scaled(spread)
+    del pool[int(np.argmin(goodness))]
+
+    return pool
+
+
+def memetic_search(mat, k, population, generations, workers=1, seed=None, trace=None, **options):
+
+    """
+    This is the memetic algorithm: a population of solutions improved by tabu search is evolved by backbone crossover
+    and a quality-and-distance pool update. Each generation creates one offspring per worker, and their tabu searches are
+    run in parallel in a pool of worker processes reading the matrix from shared memory
+    options are passed on to the tabu search
+    trace is an optional .npz or .csv file to write the trace of each tabu search to, numbered in the order they are made
+    """
+
+    rng = np.random.default_rng(seed)
+    options = dict(options, k=k)
+
+    with MatrixPool(mat, workers, _improve_task) as pool:
+
+        #Initial population of random solutions improved by tabu search
+        pop = pool.map([(Solution(random_solution(len(mat), k, rng)), _search_options(options, trace, i)) for i in range(population)])
+
+        for generation in range(0, generations):
+
+            offspring = []
+            for i in range(0, max(workers, 1)):
+                a, b = rng.choice(len(pop), 2, replace=False)
+                number = population + generation * max(workers, 1) + i
+                offspring.append((backbone_crossover(pop[a], pop[b], k, rng), _search_options(options, trace, number)))
+
+            for child in pool.map(offspring):
+                pop = update_population(pop, child, k)
+
+            logger.info('Generation %d best score: %s', generation, max(sol.fitness for sol in pop))
+
+    return max(pop, key=lambda sol: sol.fitness)
+
+
+def multi_start(mat, k, restarts=1, workers=1, seed=None, trace=None, **options):
+
+    """
+    This runs restarts independent tabu searches from random solutions in a pool of worker processes and returns the best
+    Each random solution is drawn with its own Generator seeded from seed, so the results can be repeated
+    options are passed on to the tabu search
+    trace is an optional .npz or .csv file to write the trace of each search to, numbered by search
+    """
+
+    seeds = np.random.SeedSequence(seed).spawn(restarts)
+    options = dict(options, k=k)
+    tasks = [(Solution(random_solution(len(mat), k, np.random.default_rng(s))), _search_options(options, trace, i)) for i, s in enumerate(seeds)]
+
+    with MatrixPool(mat, workers, _improve_task) as pool:
+        results = pool.map(tasks)
+
+    return max(results, key=lambda sol: sol.fitness)
+
+
+def compute_MDP_tabu(mat, head, k, mmap=False, dtype=None, cls_num=10, population=1, generations=10, workers=1, seed=None, restarts=1, trace=None, memory=None):
+
+    head = initialise_headings(head)
+    mat = initialise_matrix(mat, mmap, dtype, memory=memory)
+
+    return solve_MDP_tabu(mat, head, k, cls_num, population, generations, workers, seed, restarts, trace)
+
+
+def solve_MDP_tabu(mat, head, k, cls_num=10, population=1, generations=10, workers=1, seed=None, restarts=1, trace=None):
+
+    """
+    This solves the MaxSum problem on a matrix already given by initialise_matrix, head is the dictionary of headings
+    trace is an optional .npz or .csv file to write the trace of each tabu search to, numbered by search
+    """
+
+    if population > 1:
+        #Run the memetic algorithm on a population of solutions
+        best = memetic_search(mat, k, population, generations, workers, seed, trace, cls_num=cls_num)
+    else:
+        #Run independent tabu searches from random solutions
+        best = multi_start(mat, k, restarts, workers, seed, trace, cls_num=cls_num)
 
-    best, score = test.run()
-    #print(best.val)
-    _, sim_list = test._score(best, True)
-    #print(sim_list)
+    sim_list = pair_sims(mat, best.members)
 
-    initial_picked_set = [i for i in range(len(best.val)) if best.val[i] == 1]
+    initial_picked_set = np.sort(best.members).tolist()
     results_list = sorted([head[x] for x in initial_picked_set])
-    print('Best score: ', score)
+    logger.info('Best score: %s', best.fitness)
 
     return results_list, sim_list
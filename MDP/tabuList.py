@@ -1,74 +1,125 @@
-
 from collections import deque
+import numpy as np
 
 class TabuList:
 
     """
     This class stores information about tabu list
     list_len is the length of tabu list
-    element_list stores the indices of the elements
+    size is the number of elements that can be made tabu, the arrays grow if a bigger element is added
+    tabu_until stores for each element the step its tenure runs out at, when remove_expired_tabus takes it off the list
+    step counts the calls to increment_tabu_tenure, which is when the tenure of every element goes up by one
+    An element is tabu while it is on the list, so it stays tabu on the step its tenure runs out at until
+    remove_expired_tabus is called, and the tabu state of many elements is one lookup
     """
 
-    def __init__(self, list_len, max_tenure):
+    def __init__(self, list_len, max_tenure, size=0):
 
-        self.tabu_list = deque(maxlen=list_len)
-        self.element_list = deque(maxlen=list_len)
+        self.tabu_until = np.zeros(size, dtype=np.int64)
+        self.step = 0
 
+        self._list_len = list_len
         self._max_tenure = max_tenure
 
+        #Step each element joined the list at, -1 if not on the list, and the elements in the order they joined
+        #The list keeps its oldest members out when full, and entries left in _order by expired elements are skipped
+        self._joined = np.full(size, -1, dtype=np.int64)
+        self._order = deque()
+        self._len = 0
+        self._count = 0
+
+        #Elements by the step their tenure runs out at, so expired elements are found without scanning the list
+        self._expiry = {}
+        self._expired_to = 0
+
+
+    def __len__(self):
+        return self._len
+
+
+    @property
+    def element_list(self):
+        #Elements on the list, oldest first
+        return [elem for elem, joined in self._order if self._joined[elem] == joined]
+
+
+    def _grow(self, size):
+
+        if size > len(self.tabu_until):
+            extra = max(size, 2 * len(self.tabu_until)) - len(self.tabu_until)
+            self.tabu_until = np.concatenate([self.tabu_until, np.zeros(extra, dtype=np.int64)])
+            self._joined = np.concatenate([self._joined, np.full(extra, -1, dtype=np.int64)])
+
+
+    def _remove(self, elem):
+
+        self._joined[elem] = -1
+        self.tabu_until[elem] = 0
+        self._len -= 1
+
+
+    def is_tabu(self, elements):
+
+        #Boolean mask of which elements are on the list
+        elements = np.asarray(elements)
+        if elements.size:
+            self._grow(int(elements.max()) + 1)
+
+        return self._joined[elements] >= 0
+
 
     def is_move_tabu(self, move):
 
-        if len(self.element_list) == 0:
+        if self._len == 0:
             return False
-        
-        return True in [x in self.element_list for x in move.path]
 
+        return bool(self.is_tabu(move.path).any())
 
-    def append_tabu_list(self, path):
 
-        if path in self.element_list:
-            #If the elements to be added is already in the solution list, change the current tenure of the element back down to 0 instead of adding duplicates
-            copy = list(self.tabu_list)
+    def append_tabu_list(self, path):
 
-            for i in range(0, len(copy)):
-                if copy[i][0] == path:
-                    self.tabu_list[i][1] = 0
-                    return
+        if self._list_len == 0:
+            return
 
-        copy = list(self.element_list)
-        bool0 = True
-        bool1 = True
+        path = [int(elem) for elem in path]
+        self._grow(max(path) + 1)
+        tabu_until = self.step + self._max_tenure + 1
 
-        #Check if any elements are already in the solution list, if yes, change their current tenure to 0 and append the ones that are not in
-        for i in range(0, len(copy)):
-            if path[0] == copy[i]:
-                self.tabu_list[i] = [path[0], 0]
-                bool0 = False
+        #Elements already on the list have their tenure reset to 0 and keep their place, before the others are added
+        new = [elem for elem in path if self._joined[elem] < 0]
+        for elem in path:
+            self.tabu_until[elem] = tabu_until
+        self._expiry.setdefault(tabu_until, []).extend(path)
 
-            elif path[1] == copy[i]:
-                self.tabu_list[i] = [path[1], 0]
-                bool1 = False
+        for elem in new:
+            if self._len == self._list_len:
+                #Drop the oldest element to keep the list at list_len
+                while True:
+                    old, joined = self._order.popleft()
+                    if self._joined[old] == joined:
+                        break
+                self._remove(old)
 
-        if bool0:
-            self.tabu_list.append([path[0], 0])
-            self.element_list.append(path[0])
+            self._count += 1
+            self._joined[elem] = self._count
+            self._order.append((elem, self._count))
+            self._len += 1
 
-        if bool1:
-            self.tabu_list.append([path[1], 0])
-            self.element_list.append(path[1])
+        #Drop entries left behind by expired elements once they outnumber the list
+        if len(self._order) > 2 * self._list_len + 16:
+            self._order = deque((elem, joined) for elem, joined in self._order if self._joined[elem] == joined)
 
 
     def increment_tabu_tenure(self):
 
-        for i in range(0, len(self.tabu_list)):
-            self.tabu_list[i][1] += 1
+        self.step += 1
 
 
     def remove_expired_tabus(self):
-        
-        copy = list(self.tabu_list)
-        for tabu in copy:
-            if tabu[1] > self._max_tenure:
-                self.tabu_list.remove(tabu)
-                self.element_list.remove(tabu[0])
+
+        #Elements whose tenure is over max_tenure come off the list, unless their tenure was reset since
+        while self._expired_to <= self.step:
+            for elem in self._expiry.pop(self._expired_to, ()):
+                if self._joined[elem] >= 0 and self.tabu_until[elem] == self._expired_to:
+                    self._remove(elem)
+            self._expired_to += 1
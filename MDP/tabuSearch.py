@@ -3,17 +3,23 @@ from abc import abstractmethod
 #abstractmethod are declared but don't contain any implementation - serve as placeholders for methods that must be implemented by non-abstract subclasses
 from numpy import argmax
 #argmax gives the index of the biggest value in the list
-from copy import deepcopy
-#copy creates a new object that is a copy of the top-level structure of the original object, but not the nested objects
-#so changes on the nested objects within the copy will affect the original and vice versa
-#deepcopy creates a new object that's not only the top-level structure but also all nested objects - entirely independent copies
+from utils.progressLog import ProgressReporter
+from utils.traceRecorder import TraceRecorder, ACCEPT, ASPIRATION
+from utils.profiler import phase
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+#Columns of the trace of a search, recorded after each move
+_TRACE_COLUMNS = [('step', np.int64), ('fitness', np.float64), ('best_fitness', np.float64), ('tabu_size', np.int64), ('move', np.int8)]
 
 
 class TabuSearch:
 
     def __init__(self, initial_solution, max_len, max_tenure, max_steps, max_score='*', max_wait='*', opt_tuple=()):
         self.curr_sol = initial_solution
-        self.tabu_list = TabuList(max_len, max_tenure)
+        self.tabu_list = TabuList(max_len, max_tenure, len(initial_solution.val))
         self.max_steps = max_steps
         self.best = ''
         self.max_score = max_score
@@ -42,16 +48,38 @@ class TabuSearch:
         self.curr_sol.fitness = self._score(self.curr_sol)
 
     def _best_score(self, neighbourhood):
-        return neighbourhood[argmax([self._score(x.new_sol) for x in neighbourhood])]
+        #Fitness is cached on each move when it is created, so it is never rescored here
+        return neighbourhood[argmax([x.fitness for x in neighbourhood])]
+
+    def _improves(self, fitness, best_fitness):
+        #Fitness is carried forward through swaps, so allow for rounding when returning to a solution already seen
+        return fitness - best_fitness > 1e-9 * max(1, abs(best_fitness))
+
+    def _apply_move(self, move):
+        #Swap the pair in the current solution in place rather than copying the whole solution
+        self.curr_sol.swap(move.path[0], move.path[1])
+        self.curr_sol.fitness = move.fitness
+
+    def _finish(self, recorder, trace):
+        #Write the trace, if one is kept, and return the best solution
+        if recorder is not None:
+            recorder.save(trace)
+        return self.best, self.best.fitness
+
+    def run(self, trace=None):
 
-    def run(self):
+        #trace is an optional .npz or .csv file the values of the search at each step are written to at the end
+        progress = ProgressReporter(logger)
+        recorder = TraceRecorder(_TRACE_COLUMNS) if trace else None
 
         for i in range(0, self.max_steps):
 
-            neighbourhood = self._create_neighbourhood()
-            neighbourhood_best = self._best_score(neighbourhood)
+            with phase('neighbourhood'):
+                neighbourhood = self._create_neighbourhood()
+                neighbourhood_best = self._best_score(neighbourhood)
 
-            self.tabu_list.remove_expired_tabus()
+            with phase('tabu'):
+                self.tabu_list.remove_expired_tabus()
 
             while True:
 
@@ -60,16 +88,16 @@ class TabuSearch:
                     #print(self.tabu_list.tabu_list)
                     #print(self.tabu_list.element_list)
                     #print('TABU!')
-                    if self._score(neighbourhood_best.new_sol) > self._score(self.best):
-                        print('ASPIRATION!')
+                    if self._improves(neighbourhood_best.fitness, self.best.fitness):
+                        move = ASPIRATION
                         self.tabu_list.append_tabu_list(neighbourhood_best.path)
-                        self.best = deepcopy(neighbourhood_best.new_sol)
-                        self.curr_sol = deepcopy(neighbourhood_best.new_sol)
+                        self._apply_move(neighbourhood_best)
+                        self.best = self.curr_sol.copy()
 
                         if self.max_wait !='*':
                             self.wait = 0
 
-                        print(self.best.fitness)
+                        logger.debug('Aspiration, new best: %s', self.best.fitness)
                         break
 
                     else:
@@ -78,40 +106,45 @@ class TabuSearch:
 
                 else:
                     #print('NOT TABU!')
+                    move = ACCEPT
                     self.tabu_list.append_tabu_list(neighbourhood_best.path)
-                    self.curr_sol = deepcopy(neighbourhood_best.new_sol)
+                    self._apply_move(neighbourhood_best)
                     # print self.curr_sol.fitness
                     # print self.tabu_list.element_list
-                    if self.best == '' or self._score(self.curr_sol) > self._score(self.best):
-                        self.best = deepcopy(self.curr_sol)
+                    if self.best == '' or self._improves(self.curr_sol.fitness, self.best.fitness):
+                        self.best = self.curr_sol.copy()
 
                         if self.max_wait !='*':
                             self.wait = 0
 
-                        print('NEW BEST')
-                        print(self.best.fitness)
+                        logger.debug('New best: %s', self.best.fitness)
 
                     elif self.max_wait !='*':
                         self.wait += 1
 
                     break
 
-            self.tabu_list.increment_tabu_tenure()
+            with phase('tabu'):
+                self.tabu_list.increment_tabu_tenure()
+            progress(i, 'Step %d best score: %s', i, self.best.fitness)
+            if recorder is not None:
+                recorder.record(i, self.curr_sol.fitness, self.best.fitness, len(self.tabu_list), move)
 
             # print self.curr_sol.fitness
 
             # call abstract post_swap_change method in case necessary for algo (like eq5 for memetic algo paper)
-            self._post_swap_change(neighbourhood_best)
-            if self.max_score != '*' and self._score(self.best) >= self.max_score:
-                print('REACHED MAX SCORE AFTER ' + str(i) + ' ITERATIONS')
-                return self.best, self._score(self.best)
+            with phase('delta_update'):
+                self._post_swap_change(neighbourhood_best)
+            if self.max_score != '*' and self.best.fitness >= self.max_score:
+                logger.info('Reached max score after %d iterations', i)
+                return self._finish(recorder, trace)
 
 
             if self.max_wait !='*' and self.wait == self.max_wait:
-                print(str(self.max_wait) + ' ITERATIONS WITHOUT IMPROVEMENT, STOPPING')
-                return self.best, self._score(self.best)
+                logger.info('%s iterations without improvement, stopping', self.max_wait)
+                return self._finish(recorder, trace)
             # print self._score(self.curr_sol)
             # print self._score(self.best)
 
-        print('REACHED MAX STEPS')
-        return self.best, self._score(self.best)
\ No newline at end of file
+        logger.info('Reached max steps')
+        return self._finish(recorder, trace)
\ No newline at end of file
@@ -1,10 +1,16 @@
 
-from .initSol import initialise_matrix, initialise_headings
+from .initSol import initialise_matrix, initialise_headings, farthest_first
 from .statsUpdate import *
 from .dropAddTS import dropAddTS
-from copy import deepcopy
+from .neighbourIndex import neighbour_index, NeighbourCursor
+import numpy as np
+import logging
 import sys
 
+from utils.profiler import phase
+
+logger = logging.getLogger(__name__)
+
 
 def load_curr_subset(subset_file, ind_dict):
 
@@ -39,69 +45,43 @@ def expand_init(distance_matrix, curr_subset, subset_size, bilevel):
     for curr in curr_subset:
         iter_values[curr] = float('inf')
     
-    #Initialise summed distance using the existing subset
-    init_sum = 0
-    for i in curr_subset:
-        for j in curr_subset:
-            init_sum += distance_matrix[i,j]/2
-
-    #Separate the expanded solution
-    expanded_init = deepcopy(curr_subset)
-
-    #Before reaching the expanded size, repeat the same greedy constructive algorithm as constructing initial solution from scratch
-    while len(expanded_init) < len(curr_subset) + subset_size:
-
-        min_dist_to_s = float('-inf')
-        temp_selection = None
-
-        for i in range(0, len(distance_matrix)):
-
-            if i in expanded_init:
-                continue
-
-            max_min_dist = float('inf')
-
-            for j in expanded_init:
-                if distance_matrix[i,j] < max_min_dist:
-                    max_min_dist = distance_matrix[i, j]
+    #Repeat the same greedy constructive algorithm as constructing initial solution from scratch, starting from the existing subset
+    expanded_init, iter_values, iterations = farthest_first(distance_matrix, curr_subset, len(curr_subset) + subset_size, bilevel, iter_values, iterations)
 
-            if max_min_dist > min_dist_to_s:
-
-                min_dist_to_s = max_min_dist
-                temp_selection = i
-                print('MAX MIN ADD ' + str(temp_selection))
+    return expanded_init, iter_values, iterations
 
-            elif bilevel and max_min_dist == min_dist_to_s:
 
-                if init_sum + sum(distance_matrix[i, j] for j in expanded_init) > init_sum + sum(distance_matrix[temp_selection, j] for j in expanded_init):
-                    print('BREAKING TIE: adding ' + str(i) + ' will give a sum ' + str(init_sum + sum(distance_matrix[i, j] for j in expanded_init)) + ' rather than '
-                          + str(temp_selection) + ' giving sum ' + str(init_sum + sum(distance_matrix[temp_selection, j] for j in expanded_init)))
-                    temp_selection = i
+def expandSubset(sim_file, heading_file, subset_file, subset_size, bilevel, mmap=False, dtype=None, seed=None, neighbours=0, trace=None, memory=None):
 
-        init_sum += sum(distance_matrix[temp_selection, j] for j in expanded_init)
-        expanded_init += [temp_selection]
+    distance_matrix = initialise_matrix(sim_file, mmap, dtype, memory)
+    ind_dict = initialise_headings(heading_file)
+    curr_subset = load_curr_subset(subset_file, ind_dict)
 
-        iter_values[temp_selection] = iterations
-        iterations += 1
+    #Use a neighbour index of neighbours MB, cached next to sim_file
+    index = neighbour_index(sim_file, distance_matrix, neighbours) if neighbours else None
 
-        print('Adding '+ str(temp_selection))
+    return solveExpand(distance_matrix, ind_dict, curr_subset, subset_size, bilevel, seed, index, trace)
 
-    return expanded_init, iter_values, iterations
 
+def solveExpand(distance_matrix, ind_dict, curr_subset, subset_size, bilevel, seed=None, index=None, trace=None):
 
-def expandSubset(sim_file, heading_file, subset_file, subset_size, bilevel):
+    """
+    This expands curr_subset using a distance matrix already given by initialise_matrix, ind_dict is the dictionary of headings
+    index is the optional neighbour index from neighbour_index, or the path of its cache
+    trace is an optional .npz or .csv file to write the trace of the search to
+    """
 
-    distance_matrix = initialise_matrix(sim_file)
-    ind_dict = initialise_headings(heading_file)
-    curr_subset = load_curr_subset(subset_file, ind_dict)
-    expanded_init, iter_values, iterations = expand_init(distance_matrix, curr_subset, subset_size, bilevel)
-    min_dist, sum_dist, min_dist_count = initialise_stats(distance_matrix, expanded_init)
+    with phase('expand_init'):
+        expanded_init, iter_values, iterations = expand_init(distance_matrix, curr_subset, subset_size, bilevel)
+    with phase('initialise_stats'):
+        min_dist, sum_dist, min_dist_count = initialise_stats(distance_matrix, expanded_init)
+    neighbours = NeighbourCursor(index, expanded_init) if index is not None else None
 
-    best_expand, best_min, best_sum = dropAddTS(distance_matrix, expanded_init, iter_values, iterations, min_dist, sum_dist, min_dist_count, subset_size, bilevel)
+    best_expand, best_min, best_sum = dropAddTS(distance_matrix, expanded_init, iter_values, iterations, min_dist, sum_dist, min_dist_count, subset_size, bilevel, np.random.default_rng(seed), neighbours, trace)
 
-    print('Best expanded solution: ', best_expand)
-    print('Best min: ', best_min)
-    print('Best sum: ', best_sum)
+    logger.info('Best expanded solution: %s', best_expand)
+    logger.info('Best min: %s', best_min)
+    logger.info('Best sum: %s', best_sum)
 
     headings = [ind_dict[k] for k in best_expand]
 
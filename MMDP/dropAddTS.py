@@ -1,17 +1,36 @@
 
 from copy import deepcopy
+import numpy as np
 
 from .initSol import *
 from .statsUpdate import *
 from .tabuList import tabuList
+from .neighbourIndex import neighbour_index, NeighbourCursor
+from utils.sharedMatrix import MatrixPool
+from utils.progressLog import ProgressReporter
+from utils.traceRecorder import TraceRecorder, trace_path, ACCEPT, ASPIRATION, DEFAULT
+from utils.profiler import phase
+import logging
 
+logger = logging.getLogger(__name__)
 
-def dropAddTS(distance_matrix, solution, iter_values, iterations, min_dist, sum_dist, min_dist_count, subset_size, bilevel):
+#Columns of the trace of a search, recorded after each move is chosen
+_TRACE_COLUMNS = [('iteration', np.int64), ('min', np.float64), ('sum', np.float64), ('best_min', np.float64), ('best_sum', np.float64),
+                  ('tabu_size', np.int64), ('move', np.int8), ('no_gain', np.int64)]
+
+
+def dropAddTS(distance_matrix, solution, iter_values, iterations, min_dist, sum_dist, min_dist_count, subset_size, bilevel, rng=None, neighbours=None, trace=None):
 
     """
     This is the main algorithm to perform DropAddTS
+    rng is the numpy Generator for all random choices of the search, so a run can be repeated from its seed
+    neighbours is an optional NeighbourCursor on the starting solution, used to update the stats after each drop
+    trace is an optional .npz or .csv file the values of the search at each step are written to at the end
     """
-    
+
+    if rng is None:
+        rng = np.random.default_rng()
+
     #Initialise no_gain, max_no_gain and max_steps
     no_gain = 0
     max_no_gain = 2000
@@ -24,14 +43,21 @@ def dropAddTS(distance_matrix, solution, iter_values, iterations, min_dist, sum_
     base_size = min_size
     tabu_list = tabuList(base_size, base_size)
 
-    #Initialise best solution and best score
+    #Keep the iter_values in an array, so the oldest solution member is found with one argmin
+    iter_values = np.array(iter_values, dtype=float)
+
+    #Initialise best solution and best score, and keep the objective values of the solution up to date from here
     best_solution = []
+    objective = objTracker(min_dist, sum_dist, solution)
+    progress = ProgressReporter(logger)
+    recorder = TraceRecorder(_TRACE_COLUMNS) if trace else None
 
     #While exit criterion is not reached
     for i in range(0, max_steps):
 
         #Calculate the score of the solution before dropping
-        min_pair, sum_pair = obj_values(min_dist, sum_dist, solution)
+        with phase('scoring'):
+            min_pair, sum_pair = objective.values(min_dist)
 
         #If no best solution yet, set the current solution as the best
         if len(best_solution) == 0:
@@ -39,10 +65,12 @@ def dropAddTS(distance_matrix, solution, iter_values, iterations, min_dist, sum_
             best_min = min_pair
             best_sum = sum_pair
 
-        tabu_list.increment_tabu_tenure()
-        tabu_list.remove_expired_tabus()
+        with phase('tabu'):
+            tabu_list.increment_tabu_tenure()
+            tabu_list.remove_expired_tabus()
 
-        drop_elem, sort_options = create_neighborhood(solution, min_dist, iter_values, max_streak, plateau)
+        with phase('create_neighborhood'):
+            drop_elem, sort_options = create_neighborhood(solution, min_dist, iter_values, max_streak, plateau, rng)
         #Keep a copy of neighbourhood in case of aspiration by default
         default_asp = deepcopy(sort_options)
 
@@ -51,24 +79,22 @@ def dropAddTS(distance_matrix, solution, iter_values, iterations, min_dist, sum_
         new_sol.remove(drop_elem)
 
         #Create min_dist, sum_dist, min_dist_count for each point in the superset after dropping the element
-        min_dist, sum_dist, min_dist_count = drop_update(distance_matrix, solution, min_dist, sum_dist, min_dist_count, drop_elem)
+        with phase('drop_update'):
+            min_dist, sum_dist, min_dist_count = drop_update(distance_matrix, solution, min_dist, sum_dist, min_dist_count, drop_elem, neighbours, objective)
 
         while True:
 
             #Check if neighbourhood is empty
             if len(sort_options.keys()) != 0:
-                add_elem = search_add_elem(sort_options, sum_dist, new_sol, bilevel)
+                add_elem = search_add_elem(sort_options, sum_dist, new_sol, bilevel, rng)
 
-                #Add the potential point to new_sol, update all stats and calculate the objective value of the new_sol
+                #Calculate the objective value of new_sol with the potential point added, the stats are only updated once a move is made
+                with phase('scoring'):
+                    new_min, new_sum = objective.trial(min_dist, sum_dist, add_elem)
                 new_sol.append(add_elem)
-                temp_min_dist = deepcopy(min_dist)
-                temp_sum_dist = deepcopy(sum_dist)
-                temp_min_dist_count = deepcopy(min_dist_count)
-                temp_min_dist, temp_sum_dist, temp_min_dist_count = add_update(distance_matrix, temp_min_dist, temp_sum_dist, temp_min_dist_count, add_elem)
-                new_min, new_sum = obj_values(temp_min_dist, temp_sum_dist, new_sol)
 
                 if tabu_list.check_tabu((drop_elem, add_elem)):
-                    print('TABU')
+                    move = ASPIRATION
                     if new_min > best_min:
                         tabu_list.append_tabu_list((drop_elem, add_elem))
                         best_solution = deepcopy(new_sol)
@@ -76,120 +102,158 @@ def dropAddTS(distance_matrix, solution, iter_values, iterations, min_dist, sum_
                         best_sum = deepcopy(new_sum)
 
                         no_gain = 0
-                        print('NO GAIN UPDATED: ', no_gain)
-                        print(f'Iter {iterations} ASPIRATION MIN: ', best_min)
+                        logger.debug('Iter %d aspiration min: %s', iterations, best_min)
                         break
                     
                     elif bilevel and (new_min == best_min and new_sum > best_sum):
-                        print('BILEVEL!')
                         tabu_list.append_tabu_list((drop_elem, add_elem))
                         best_solution = deepcopy(new_sol)
                         best_min = deepcopy(new_min)
                         best_sum = deepcopy(new_sum)
 
                         no_gain = 0
-                        print('NO GAIN UPDATED: ', no_gain)
-                        print(f'Iter {iterations} ASPIRATION SUM: ', best_sum)
+                        logger.debug('Iter %d aspiration sum: %s', iterations, best_sum)
                         break
 
                     else:
                         del sort_options[add_elem]
                         new_sol.remove(add_elem)
-                        print('NO ASPIRATION. CONTINUE')
+                        logger.debug('Iter %d move (%d, %d) is tabu, no aspiration', iterations, drop_elem, add_elem)
                         continue
 
                 else:
+                    move = ACCEPT
                     tabu_list.append_tabu_list((drop_elem,add_elem))
-                    print('NOT TABU')
                     if bilevel:
-                        print('BILEVEL!')
                         if new_min > best_min or (new_min == best_min and new_sum > best_sum):
                             best_solution = deepcopy(new_sol)
                             best_min = deepcopy(new_min)
                             best_sum = deepcopy(new_sum)
 
                             no_gain = 0
-
-                            if new_min > best_min:
-                                print('NO GAIN UPDATED: ', no_gain)
-                                print(f'Iter {iterations} New Best Min: ', best_min)
-                            else:
-                                print('NO GAIN UPDATED: ', no_gain)
-                                print(f'Iter {iterations} New Best Sum: ', best_sum)
+                            logger.debug('Iter %d new best min: %s sum: %s', iterations, best_min, best_sum)
                         else:
                             no_gain += 1
-                            print('NO GAIN UPDATED: ', no_gain)
                         
                         break
 
                     else:
                         if new_min > best_min:
-                            print('MMD!')
                             best_solution = deepcopy(new_sol)
                             best_min = deepcopy(new_min)
                             best_sum = deepcopy(new_sum)
 
                             no_gain = 0
-                            print('NO GAIN UPDATED: ', no_gain)
-                            print(f'Iter {iterations} New Best Min: ', best_min)
+                            logger.debug('Iter %d new best min: %s', iterations, best_min)
                         else:
                             no_gain += 1
-                            print('NO GAIN UPDATED: ', no_gain)
                             
                         break
 
             #In case of empty neighbourhood, aspiration by default invokes the oldest tabu move
             else:
+                move = DEFAULT
                 add_elem = aspiration_by_default(default_asp, drop_elem, tabu_list.tabu_list)
+                new_min, new_sum = objective.trial(min_dist, sum_dist, add_elem)
                 new_sol.append(add_elem)
-                temp_min_dist = deepcopy(min_dist)
-                temp_sum_dist = deepcopy(sum_dist)
-                temp_min_dist_count = deepcopy(min_dist_count)
-                temp_min_dist, temp_sum_dist, temp_min_dist_count = add_update(distance_matrix, temp_min_dist, temp_sum_dist, temp_min_dist_count, add_elem)
 
                 tabu_list.append_tabu_list((drop_elem,add_elem))
-                print('ASPIRATION BY DEFAULT!')
+                logger.debug('Iter %d aspiration by default, adding %d', iterations, add_elem)
 
                 break
+
+        if recorder is not None:
+            recorder.record(iterations, new_min, new_sum, best_min, best_sum, base_size, move, no_gain)
         
         if no_gain == max_no_gain:
-            print(max_no_gain, ' ITERATIONS WITHOUT IMPROVEMENT, STOPPING')
+            logger.info('%d iterations without improvement, stopping', max_no_gain)
             break
     
+        #Update all stats for the move made
         solution = new_sol
-        min_dist = temp_min_dist
-        sum_dist = temp_sum_dist
-        min_dist_count = temp_min_dist_count
+        with phase('add_update'):
+            min_dist, sum_dist, min_dist_count = add_update(distance_matrix, min_dist, sum_dist, min_dist_count, add_elem, neighbours, objective)
 
         #Update the iter_values of added element
         iter_values[drop_elem] = iterations
         iter_values[add_elem] = iterations
 
         iterations += 1
-        base_size, max_streak = adaptive_tabu_size(plateau, max_size, min_size, base_size, no_gain, iterations, max_streak)
-        tabu_list.adaptive_size(base_size)
-        print('tabu list size: ', base_size)
+        with phase('tabu'):
+            base_size, max_streak = adaptive_tabu_size(plateau, max_size, min_size, base_size, no_gain, iterations, max_streak)
+            tabu_list.adaptive_size(base_size)
 
-        print('Iter: ', iterations)
-        print('Best Min: ', best_min)
-        print('Best Sum: ', best_sum)
+        progress(iterations, 'Iter %d tabu list size: %d best min: %s best sum: %s', iterations, base_size, best_min, best_sum)
+
+    else:
+        logger.info('Reached max steps')
+
+    if recorder is not None:
+        recorder.save(trace)
 
-    print('REACHED MAX STEPS')
     return best_solution, best_min, best_sum
 
 
-def computeSubset(sim_file, heading_file, subset_size, bilevel):
+def _subset_task(distance_matrix, task):
+
+    #Task for the worker pool: one search from a greedy start, randomized unless it's the first start
+    seed, subset_size, bilevel, randomized, index, trace = task
+    rng = np.random.default_rng(seed)
+
+    with phase('constructive_alg'):
+        init_sol, iter_values, iterations = constructive_alg(distance_matrix, subset_size, bilevel, rng if randomized else None)
+    with phase('initialise_stats'):
+        min_dist, sum_dist, min_dist_count = initialise_stats(distance_matrix, init_sol)
+    neighbours = NeighbourCursor(index, init_sol) if index is not None else None
 
-    distance_matrix = initialise_matrix(sim_file)
+    return dropAddTS(distance_matrix, init_sol, iter_values, iterations, min_dist, sum_dist, min_dist_count, subset_size, bilevel, rng, neighbours, trace)
+
+
+def multi_start(distance_matrix, subset_size, bilevel, restarts=1, workers=1, seed=None, index=None, trace=None):
+
+    """
+    This runs restarts independent searches in a pool of worker processes and returns the best (solution, min, sum)
+    The first search starts from the greedy solution and the rest from randomized greedy solutions, each with its own
+    Generator seeded from seed, so the results can be repeated
+    The best is the one with the biggest min, with ties broken by the biggest sum for the bi-level model
+    index is the optional neighbour index from neighbour_index, or the path of its cache
+    trace is an optional .npz or .csv file to write the trace of each search to, numbered by search
+    """
+
+    seeds = np.random.SeedSequence(seed).spawn(restarts)
+    tasks = [(seeds[i], subset_size, bilevel, i > 0, index, trace_path(trace, i) if trace else None) for i in range(restarts)]
+
+    with MatrixPool(distance_matrix, workers, _subset_task) as pool:
+        results = pool.map(tasks)
+
+    if bilevel:
+        return max(results, key=lambda res: (res[1], res[2]))
+    return max(results, key=lambda res: res[1])
+
+
+def computeSubset(sim_file, heading_file, subset_size, bilevel, mmap=False, dtype=None, restarts=1, workers=1, seed=None, neighbours=0, trace=None, memory=None):
+
+    distance_matrix = initialise_matrix(sim_file, mmap, dtype, memory)
     ind_dict = initialise_headings(heading_file)
-    init_sol, iter_values, iterations = constructive_alg(distance_matrix, subset_size, bilevel)
-    min_dist, sum_dist, min_dist_count = initialise_stats(distance_matrix, init_sol)
 
-    best_solution, best_min, best_sum = dropAddTS(distance_matrix, init_sol, iter_values, iterations, min_dist, sum_dist, min_dist_count, subset_size, bilevel)
+    #Use a neighbour index of neighbours MB, cached next to sim_file
+    index = neighbour_index(sim_file, distance_matrix, neighbours) if neighbours else None
+
+    return solveSubset(distance_matrix, ind_dict, subset_size, bilevel, restarts, workers, seed, index, trace)
+
+
+def solveSubset(distance_matrix, ind_dict, subset_size, bilevel, restarts=1, workers=1, seed=None, index=None, trace=None):
+
+    """
+    This selects the subset from a distance matrix already given by initialise_matrix, ind_dict is the dictionary of headings
+    trace is an optional .npz or .csv file to write the trace of each search to, numbered by search
+    """
+
+    best_solution, best_min, best_sum = multi_start(distance_matrix, subset_size, bilevel, restarts, workers, seed, index, trace)
     
-    print('Best solution: ', best_solution)
-    print('Best min: ', best_min)
-    print('Best sum: ', best_sum)
+    logger.info('Best solution: %s', best_solution)
+    logger.info('Best min: %s', best_min)
+    logger.info('Best sum: %s', best_sum)
 
     headings = [ind_dict[k] for k in best_solution]
 
@@ -200,4 +264,3 @@ def computeSubset(sim_file, heading_file, subset_size, bilevel):
             sim_list.append(1 - distance_matrix[best_solution[i], best_solution[j]])
 
     return headings, sim_list
-
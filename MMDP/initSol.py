@@ -1,36 +1,76 @@
 
 import numpy as np
+import logging
 import json
 
+from utils.profiler import phase
+from utils.condensedMatrix import open_matrix, is_condensed, read_header
 
-def initialise_matrix(sim_file):
+logger = logging.getLogger(__name__)
+
+
+def initialise_matrix(sim_file, mmap=False, dtype=None, memory=None):
 
     """
     This function switches the similarity matrices (.npy) into distance matrices
+    With mmap, the file is opened copy-on-write, but every value is changed here into a distance, so every page is copied
+    and it saves no memory. Use memory below to read the file without copying it
+    dtype (e.g. np.float32) sets the working precision, a dtype other than the one of the file copies the whole matrix
+    A condensed matrix file is not loaded, it is read through an accessor that makes the same changes to each value it reads
+    With memory in MB, a .npy file is read the same way, memory mapped read-only, and the accessor keeps the rows it reads
+    in a cache of at most memory MB, so the search runs out of core on a matrix bigger than the memory
+    """
+
+    if memory is not None or is_condensed(sim_file):
+        with phase('load'):
+            distance_matrix = open_matrix(sim_file).transformed(to_distance, 0, dtype)
+        return distance_matrix.cached(memory * 2**20) if memory is not None else distance_matrix
+
+    #Load in similarity matrix, the file on disk is never changed by the in-place changes below
+    with phase('load'):
+        similarity_matrix = np.load(sim_file, mmap_mode='c' if mmap else None)
+        if dtype is not None and similarity_matrix.dtype != dtype:
+            similarity_matrix = similarity_matrix.astype(dtype)
+
+    return np.asarray(transform_matrix(similarity_matrix))
+
+
+def transform_matrix(similarity_matrix):
+
     """
+    This function switches a loaded similarity matrix into a distance matrix in place
+    """
+
+    with phase('transform'):
+
+        #Convert similarity matrix to distance matrix in place
+        distance_matrix = to_distance(similarity_matrix)
 
-    #Load in similarity matrix
-    similarity_matrix = np.load(sim_file)
+        #Change all diagnol values into 0
+        np.fill_diagonal(distance_matrix, 0)
 
-    #Change all diagnol values into 1
-    for i in range(0, len(similarity_matrix)):
-        similarity_matrix[i][i] = 1
+    return distance_matrix
 
-    #Convert similarity matrix to distance matrix
-    distance_matrix = 1 - similarity_matrix
 
-    return np.asarray(distance_matrix)
+def to_distance(similarities):
+
+    #Switch similarities into distances in place
+    return np.subtract(1, similarities, out=similarities)
 
 
 def initialise_headings(heading_file):
 
     """
     This function switches the heading files (.json) into a dictionary with indices
+    The headings of a condensed matrix file are read from its header
     """
 
     #Load in heading file
-    with open(heading_file) as heading:
-        headings = json.loads(heading.read())
+    if is_condensed(heading_file):
+        headings = read_header(heading_file)[0]['headings']
+    else:
+        with open(heading_file) as heading:
+            headings = json.loads(heading.read())
 
     ind_dict = {}
 
@@ -41,11 +81,12 @@ def initialise_headings(heading_file):
     return ind_dict
 
 
-def constructive_alg(distance_matrix, subset_size, bilevel):
+def constructive_alg(distance_matrix, subset_size, bilevel, rng=None):
 
     """
     This function takes in the distance matrix and subset size and return the initial solution of the mmdp through greedy
     The set returned by the function will contain indices of elements
+    If the numpy Generator rng is given, the initial point is drawn at random for a randomized greedy start
     """
 
     #Check bilevel condition
@@ -53,65 +94,69 @@ def constructive_alg(distance_matrix, subset_size, bilevel):
         raise ValueError('Invalid input: bilevel input must be True/False')
 
     #Choose the initial point in the matrix that maximizes the sum of distances towards all the other points
-    init_point = np.argmax(np.sum(distance_matrix, axis=1))
+    if rng is None:
+        init_point = np.argmax(np.sum(distance_matrix, axis=1))
+    else:
+        init_point = int(rng.integers(len(distance_matrix)))
     init_sol = [init_point]
 
     #Initialise iter values for all elements and also the initial point
     iter_values = [0] * len(distance_matrix)
     iter_values[init_point] = 1
 
-    #Initialise the sum distance of the solution set, in this case since there is only one point in the solution, it's 0
-    init_sum = 0
+    return farthest_first(distance_matrix, [init_point], subset_size, bilevel, iter_values, 2)
+
+
+def farthest_first(distance_matrix, init_sol, subset_size, bilevel, iter_values, iterations):
+
+    """
+    This function adds elements to init_sol until it has subset_size elements, each time the element with the biggest
+    distance to its closest member, with ties broken by the biggest sum of distances to the members if the bi-level model
+    is in use, and then by the smallest index
+    The closest member distance and sum of distances of every element are seeded from init_sol and kept as it grows, so
+    each addition is one row of the matrix and one argmax
+    The added elements get their iteration in iter_values, starting from iterations
+    """
 
-    #Initialise iteration counter
-    iterations = 2
+    n = len(distance_matrix)
+    min_dist = np.full(n, np.inf, dtype=distance_matrix.dtype)
+    sum_dist = np.zeros(n, dtype=distance_matrix.dtype)
+
+    def add(elem):
+        row = distance_matrix[elem]
+        np.minimum(min_dist, row, out=min_dist)
+        np.add(sum_dist, row, out=sum_dist)
+        #Members are never chosen again
+        min_dist[elem] = -np.inf
+
+    for elem in init_sol:
+        add(elem)
+
+    #Sum distance of the solution set, counting each pair once, added up in the same order as the pairs are given
+    init_sol = [int(elem) for elem in init_sol]
+    pairs = distance_matrix[np.ix_(init_sol, init_sol)] / 2
+    init_sum = np.cumsum(pairs.ravel())[-1] if pairs.size else 0
 
     while len(init_sol) < subset_size:
 
-        #Initialise mininimum inter distance of the set and point to be appended to solution set
-        min_dist_to_s = float('-inf')
-        temp_selection = None
-
-        #Go through the whole matrix
-        for i in range(0, len(distance_matrix)):
-            
-            #If the indice is already in the set, pass
-            if i in init_sol:
-                continue
-
-            #Reset the max_min_dist of the set to infinite everytime when selecting the next candidate to add
-            max_min_dist = float('inf')
-
-            #Set the max_min_dist to the distance between elements in and outside solution set
-            for j in init_sol:
-                if distance_matrix[i,j] < max_min_dist:
-                    max_min_dist = distance_matrix[i, j]
-
-            #If min_dist_to_s is smaller than max_min_dist, min_dist_to_s takes value of max_min_dist
-            #So our min_dist of the set keeps increasing until i runs through all len(distance_matrix), the i that give the biggest min_dist is the temp_selection
-            if max_min_dist > min_dist_to_s:
-
-                min_dist_to_s = max_min_dist
-                temp_selection = i
-                print('MAX MIN ADD ' + str(temp_selection))
-            
-            #This is the tie-breaking rule, if max_min_dist equals min_dist_to_s, change temp_selection to the point that gives a higher sum distance
-            #This tie-breaking rule only applies if the bi-level model is in use
-            elif bilevel and max_min_dist == min_dist_to_s:
-
-                if init_sum + sum(distance_matrix[i, j] for j in init_sol) > init_sum + sum(distance_matrix[temp_selection, j] for j in init_sol):
-                    print('BREAKING TIE: adding ' + str(i) + ' will give a sum ' + str(init_sum + sum(distance_matrix[i, j] for j in init_sol)) + ' rather than '
-                          + str(temp_selection) + ' giving sum ' + str(init_sum + sum(distance_matrix[temp_selection, j] for j in init_sol)))
-                    temp_selection = i
-
-        #Append temp_selection to solution set and update sum distance
-        init_sum += sum(distance_matrix[temp_selection, j] for j in init_sol)
+        #The first element furthest from the solution, which is the smallest index among ties
+        temp_selection = int(np.argmax(min_dist))
+
+        #This is the tie-breaking rule, the tied element that gives the solution the highest sum distance is chosen instead
+        #This tie-breaking rule only applies if the bi-level model is in use
+        if bilevel:
+            ties = np.flatnonzero(min_dist == min_dist[temp_selection])
+            temp_selection = int(ties[np.argmax(init_sum + sum_dist[ties])])
+
+        #Update sum distance and the distances to the solution set
+        init_sum += sum_dist[temp_selection]
+        add(temp_selection)
         init_sol += [temp_selection]
 
         #Update the iter values of the added item and increment iter counter
         iter_values[temp_selection] = iterations
         iterations += 1
 
-        print('Adding '+ str(temp_selection))
+        logger.debug('Adding %d', temp_selection)
 
     return init_sol, iter_values, iterations
@@ -0,0 +1,170 @@
+import numpy as np
+import json
+import os
+
+from utils.profiler import phase
+from utils.condensedMatrix import is_condensed, read_header
+
+
+def build_neighbour_index(distance_matrix, neighbours, block_size=1024):
+
+    """
+    This function returns the indices of the nearest neighbours of every element, closest first, leaving out the element itself
+    Only the first neighbours of each row are kept, as int32, and the matrix is read block_size rows at a time
+    """
+
+    n = len(distance_matrix)
+    neighbours = min(neighbours, n - 1)
+    order = np.empty((n, neighbours), dtype=np.int32)
+
+    for start in range(0, n, block_size):
+
+        #Copy the block so the distance of each element to itself can be put last without changing the matrix
+        block = np.array(distance_matrix[start:start + block_size])
+        rows = np.arange(len(block))
+        block[rows, rows + start] = np.inf
+
+        #Partition out the nearest neighbours first, so only they are sorted
+        nearest = np.argpartition(block, neighbours - 1, axis=1)[:, :neighbours]
+        dist = np.take_along_axis(block, nearest, axis=1)
+        order[start:start + len(block)] = np.take_along_axis(nearest, np.argsort(dist, axis=1, kind='stable'), axis=1)
+
+    return order
+
+
+def _source(sim_file, distance_matrix):
+
+    #What the order of the index depends on besides the size, the stored values of sim_file and the working dtype
+    if is_condensed(sim_file):
+        header = read_header(sim_file)[0]
+        stored = {'layout': header.get('layout', 'condensed'), 'dtype': header['dtype'], 'scale': header.get('scale', 1.0)}
+    else:
+        stored = {'layout': 'npy', 'dtype': np.load(sim_file, mmap_mode='r').dtype.str, 'scale': 1.0}
+
+    return dict(stored, bytes=os.path.getsize(sim_file), working_dtype=np.dtype(distance_matrix.dtype).str)
+
+
+def neighbour_index(sim_file, distance_matrix, memory=256):
+
+    """
+    This function returns the neighbour index of distance_matrix within memory MB, cached on disk next to sim_file as
+    sim_file + '.neighbours.npy', with what it was built from in sim_file + '.neighbours.json'
+    The cache is reused unless it is older than sim_file, was built for a different size, or from stored values of another
+    dtype or scale, or for another working dtype, and the path of the cache is returned so worker processes can memory
+    map it rather than be sent a copy
+    If the cache can't be written, the index itself is returned instead
+    """
+
+    n = len(distance_matrix)
+    neighbours = int(min(n - 1, max(1, memory * 2**20 // (4 * n))))
+    index_file = sim_file + '.neighbours.npy'
+    source_file = sim_file + '.neighbours.json'
+    source = _source(sim_file, distance_matrix)
+
+    if os.path.exists(index_file) and os.path.exists(source_file) and os.path.getmtime(index_file) >= os.path.getmtime(sim_file):
+        with open(source_file) as f:
+            built_from = json.load(f)
+        if built_from == source and np.load(index_file, mmap_mode='r').shape == (n, neighbours):
+            return index_file
+
+    with phase('neighbour_index'):
+        order = build_neighbour_index(distance_matrix, neighbours)
+
+    try:
+        np.save(index_file, order)
+        with open(source_file, 'w') as f:
+            json.dump(source, f)
+    except OSError:
+        return order
+
+    return index_file
+
+
+class NeighbourCursor:
+
+    """
+    This class finds the closest solution member of elements from the neighbour index, for the recalculations in drop_update
+    order is the neighbour index or the path of its cache, and in_sol marks the solution members
+    cursor[i] is a position in row i of order with no solution member before it, so the walk along row i starts from there
+    window is how many neighbours are looked at in each step of a walk, by default about the gap between solution members
+    """
+
+    def __init__(self, order, solution, window=None):
+
+        self.order = np.load(order, mmap_mode='r') if isinstance(order, str) else order
+        self.cursor = np.zeros(len(self.order), dtype=np.int64)
+        self.in_sol = np.zeros(len(self.order), dtype=bool)
+        self.in_sol[solution] = True
+        self.window = window if window is not None else max(8, 2 * len(self.order) // max(1, len(solution)))
+
+
+    def add(self, add_elem, rows):
+
+        #The added element can only come before the cursor of rows it is at least as close to as their closest member
+        self.in_sol[add_elem] = True
+        self.cursor[rows] = 0
+
+
+    def drop(self, drop_elem):
+
+        #Dropping a member never puts a member before a cursor
+        self.in_sol[drop_elem] = False
+
+
+    def closest(self, distance_matrix, rows):
+
+        """
+        This returns the distance from each element in rows to its closest solution member and the number of members at
+        that distance, walking each row of the index a window at a time
+        done marks the rows worked out, the others ran out of neighbours and need a full scan
+        """
+
+        neighbours = self.order.shape[1]
+        steps = np.arange(self.window)
+
+        #Walk from the cursor to the first solution member
+        first = np.full(len(rows), -1)
+        pos = self.cursor[rows]
+        active = np.arange(len(rows))
+
+        while len(active):
+            p = pos[active, None] + steps
+            valid = p < neighbours
+            hit = valid & self.in_sol[self.order[rows[active, None], np.minimum(p, neighbours - 1)]]
+            has = hit.any(axis=1)
+            first[active[has]] = p[has, hit[has].argmax(axis=1)]
+            pos[active] += self.window
+            active = active[~has & valid[:, -1]]
+
+        found = np.flatnonzero(first >= 0)
+        self.cursor[rows[first < 0]] = neighbours
+        self.cursor[rows[found]] = first[found]
+
+        #Count the members tied with the first one, walking on until the distance goes up, which is usually straight away
+        steps = steps[:8]
+        found_rows = rows[found]
+        mins = distance_matrix[found_rows, self.order[found_rows, first[found]]]
+        counts = np.zeros(len(found), dtype=np.int64)
+        ended = np.zeros(len(found), dtype=bool)
+        pos = first[found]
+        active = np.arange(len(found))
+
+        while len(active):
+            p = pos[active, None] + steps
+            valid = p < neighbours
+            cand = self.order[found_rows[active, None], np.minimum(p, neighbours - 1)]
+            same = valid & (distance_matrix[found_rows[active, None], cand] == mins[active, None])
+            counts[active] += (same & self.in_sol[cand]).sum(axis=1)
+            over = (valid & ~same).any(axis=1)
+            ended[active[over]] = True
+            pos[active] += len(steps)
+            active = active[~over & valid[:, -1]]
+
+        done = np.zeros(len(rows), dtype=bool)
+        done[found[ended]] = True
+        min_dist = np.zeros(len(rows), dtype=mins.dtype)
+        min_dist_count = np.zeros(len(rows), dtype=np.int64)
+        min_dist[found] = mins
+        min_dist_count[found] = counts
+
+        return done, min_dist, min_dist_count
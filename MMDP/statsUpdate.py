@@ -1,123 +1,192 @@
 
-from copy import deepcopy
 import numpy as np
-import random
+import heapq
 
 
-def initialise_stats(distance_matrix, solution):
+def initialise_stats(distance_matrix, solution, block_size=1024):
 
     """
     This function calculates the minimum distance for every element in superset to solution elements,
     its distance sums to all solution elements, and number of solution elements having it as the closest point
+    The stats are numpy arrays indexed by element, worked out block_size rows of the matrix at a time
+    Distances tie only when they are exactly equal. A quantized matrix decodes each stored level to the same distance every
+    time, so pairs on the same level always tie and are all counted in min_dist_count, which is then often above 1
     """
 
-    min_dist = {}
-    sum_dist = {}
-    min_dist_count = {}
+    solution = np.asarray(solution)
+    n = len(distance_matrix)
 
-    for i in range(len(distance_matrix)):
+    min_dist = np.empty(n, dtype=np.result_type(distance_matrix.dtype, np.float32))
+    sum_dist = np.empty(n)
+    min_dist_count = np.empty(n, dtype=np.int64)
 
-        #Get a list of distances from the element i to all solution elements
-        dis_to_solu = [distance_matrix[i, j] for j in solution if i != j]
+    for start in range(0, n, block_size):
 
-        min_dist[i] = min(dis_to_solu)
-        sum_dist[i] = round(sum(dis_to_solu), 10)
-        min_dist_count[i] = dis_to_solu.count(min_dist[i])
+        #Distances from the elements in the block to all solution elements, leaving out the distance of an element to itself
+        rows = np.arange(start, min(start + block_size, n))
+        dis_to_solu = distance_matrix[np.ix_(rows, solution)]
+        itself = rows[:, None] == solution[None, :]
+
+        min_dist[rows] = np.where(itself, np.inf, dis_to_solu).min(axis=1)
+        sum_dist[rows] = np.round(np.where(itself, 0, dis_to_solu).sum(axis=1, dtype=np.float64), 10)
+        min_dist_count[rows] = ((dis_to_solu == min_dist[rows, None]) & ~itself).sum(axis=1)
 
     return min_dist, sum_dist, min_dist_count
 
 
-def drop_update(distance_matrix, solution, min_dist, sum_dist, min_dist_count, drop_elem):
+def drop_update(distance_matrix, solution, min_dist, sum_dist, min_dist_count, drop_elem, neighbours=None, objective=None):
 
     """
     This function updates min_dist, sum_dist, min_dist_count after dropping an element from the solution
+    neighbours is an optional NeighbourCursor to find the next closest points from, rather than scanning the solution
+    objective is an optional objTracker kept in step with the solution
     """
 
-    for i in range(len(distance_matrix)):
-
-        #Consider everything in the superset except for the dropped element
-        if i == drop_elem:
-            continue
-        
-        #sum_dist of any point in the superset will need to remove the distance from them to the dropped element
-        sum_dist[i] = round(sum_dist[i] - distance_matrix[i, drop_elem], 10)
-
-        #No need to modify min_dist or min_dist_count if distance between dropped element and i is bigger than min_dist (the dropped element is not the closest point in the solution for i)
-        #If the dropped element is the closest point
-        if min_dist[i] == distance_matrix[i, drop_elem]:
-            #Decrement min_dist_count if there is more than one closest point to i in the solution
-            if min_dist_count[i] > 1:
-                min_dist_count[i] = min_dist_count[i] - 1
-            #If the dropped element is the only closest point to i, need to recalculated min_dist and min_dist_count for i
-            else:
-                new_sol = deepcopy(solution)
-                new_sol.remove(drop_elem)
-                dis_to_solu = [distance_matrix[i, j] for j in new_sol if i != j]
-                min_dist[i] = min(dis_to_solu)
-                min_dist_count[i] = dis_to_solu.count(min_dist[i])
-    
+    #As the matrix is symmetric, the row of the dropped element has the distances from every point to it
+    drop_dist = distance_matrix[drop_elem]
+
+    #Consider everything in the superset except for the dropped element
+    others = np.ones(len(min_dist), dtype=bool)
+    others[drop_elem] = False
+
+    #sum_dist of any point in the superset will need to remove the distance from them to the dropped element
+    sum_dist[others] = np.round(sum_dist[others] - drop_dist[others], 10)
+
+    #No need to modify min_dist or min_dist_count if distance between dropped element and i is bigger than min_dist (the dropped element is not the closest point in the solution for i)
+    #If the dropped element is the closest point, decrement min_dist_count if there is more than one closest point to i in the solution
+    closest = others & (min_dist == drop_dist)
+    only_closest = closest & (min_dist_count == 1)
+    min_dist_count[closest & ~only_closest] -= 1
+
+    #If the dropped element is the only closest point, min_dist and min_dist_count are recalculated for all such points at once
+    rows = np.flatnonzero(only_closest)
+    changed = rows
+
+    if neighbours is not None:
+        neighbours.drop(drop_elem)
+        if len(rows):
+            done, new_min, new_count = neighbours.closest(distance_matrix, rows)
+            min_dist[rows[done]] = new_min[done]
+            min_dist_count[rows[done]] = new_count[done]
+            #Points whose closest member is past the end of the index are scanned in full
+            rows = rows[~done]
+
+    if len(rows):
+        new_sol = np.array([j for j in solution if j != drop_elem])
+        dis_to_solu = distance_matrix[np.ix_(rows, new_sol)]
+        itself = rows[:, None] == new_sol[None, :]
+
+        min_dist[rows] = np.where(itself, np.inf, dis_to_solu).min(axis=1)
+        min_dist_count[rows] = ((dis_to_solu == min_dist[rows, None]) & ~itself).sum(axis=1)
+
+    if objective is not None:
+        objective.drop(min_dist, sum_dist, drop_elem, changed)
+
     return min_dist, sum_dist, min_dist_count
 
 
-def add_update(distance_matrix, min_dist, sum_dist, min_dist_count, add_elem):
+def add_update(distance_matrix, min_dist, sum_dist, min_dist_count, add_elem, neighbours=None, objective=None):
 
     """
     This function updates min_dist, sum_dist, min_dist_count after adding an element to the solution
+    neighbours and objective are the optional NeighbourCursor and objTracker kept in step with the solution
     """
 
-    for i in range(len(distance_matrix)):
+    #As the matrix is symmetric, the row of the added element has the distances from every point to it
+    add_dist = distance_matrix[add_elem]
+
+    #Consider everything in the superset except for the added element
+    others = np.ones(len(min_dist), dtype=bool)
+    others[add_elem] = False
+
+    #sum_dist of any point in the superset will need to add the distance from them to the added element
+    sum_dist[others] = np.round(sum_dist[others] + add_dist[others], 10)
+
+    #No need to modify min_dist or min_dist_count if distance from i to added point is bigger than min_dist (added point is not the closest to i in solution)
+    #If distance from i to added point is the same as min_dist, increment min_dist_count by 1
+    #If distance from i to added point is smaller than min_dist, initialise min_dist_count to 1 and update min_dist
+    tie = others & (add_dist == min_dist)
+    closer = others & (add_dist < min_dist)
 
-        #Consider everything in the superset except for the added element
-        if i == add_elem:
-            continue
-        
-        #sum_dist of any point in the superset will need to add the distance from them to the added element
-        sum_dist[i] = round(sum_dist[i] + distance_matrix[i, add_elem], 10)
+    min_dist_count[tie] += 1
+    min_dist_count[closer] = 1
+    min_dist[closer] = add_dist[closer]
 
-        #No need to modify min_dist or min_dist_count if distance from i to added point is bigger than min_dist (added point is not the closest to i in solution)
-        #If distance from i to added point is the same as min_dist, increment min_dist_count by 1
-        if distance_matrix[i, add_elem] == min_dist[i]:
-            min_dist_count[i] += 1
-        #If distance from i to added point is smaller than min_dist, initialise min_dist_count to 1 and update min_dist
-        elif distance_matrix[i, add_elem] < min_dist[i]:
-            min_dist_count[i] = 1
-            min_dist[i] = distance_matrix[i, add_elem]
+    if neighbours is not None:
+        neighbours.add(add_elem, tie | closer)
+
+    if objective is not None:
+        objective.add(min_dist, sum_dist, add_elem, np.flatnonzero(closer))
 
     return min_dist, sum_dist, min_dist_count
 
 
-def create_neighborhood(solution, min_dist, iter_values, max_streak, plateau):
+def top_options(min_dist, solution, cls):
+
+    """
+    This function returns the cls non-solution indices with the biggest min_dist, in descending order of min_dist and then
+    ascending order of index, which is the order of a stable sort of all options
+    The options are only partitioned, so it is O(n) rather than O(n log n)
+    """
+
+    vals = np.array(min_dist, dtype=float)
+    vals[solution] = -np.inf
+    cls = min(cls, len(vals) - len(solution))
+
+    if cls <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    threshold = vals[np.argpartition(vals, len(vals) - cls)[len(vals) - cls]]
+
+    #Ties at the threshold are settled by the smallest indices, as in the stable sort
+    above = np.flatnonzero(vals > threshold)
+    ties = np.flatnonzero(vals == threshold)[:cls - len(above)]
+    cand = np.concatenate([above, ties])
+
+    return cand[np.lexsort((cand, -vals[cand]))]
+
+
+def create_neighborhood(solution, min_dist, iter_values, max_streak, plateau, rng=None):
 
     """
     This function returns the oldest element indices in solution and the sorted options of non-solution indices to be exchanged
+    rng is the numpy Generator for the random neighbourhood on plateaus
     """
 
-    cls = 50
+    if rng is None:
+        rng = np.random.default_rng()
 
-    #Separate drop and add neighborhoods
-    sol_iter = {i:iter_values[i] for i in solution}
-    min_dist_options = {k: min_dist[k] for k in min_dist if k not in solution}
+    cls = 50
 
-    #Get the oldest point in solution to drop
-    drop_elem = [i for i in sol_iter.keys() if sol_iter[i] == min(sol_iter.values())][0]
+    #Get the oldest point in solution to drop, the first one in solution order if there are ties
+    drop_elem = solution[int(np.argmin(np.asarray(iter_values, dtype=float)[solution]))]
 
     #If tabu list stays at maximum size for plateau iterations, randomly selects an add element from neighbourhood
     if max_streak >= plateau:
-        sort_options = dict(random.sample(list(min_dist_options.items()), min(len(min_dist_options.items()), cls)))
+        non_solution = np.ones(len(min_dist), dtype=bool)
+        non_solution[solution] = False
+        options = np.flatnonzero(non_solution)
+        cand = options[rng.choice(len(options), min(len(options), cls), replace=False)]
 
     else:
         #If not, selects add element normally considering move gains
-        sort_options = dict(sorted(min_dist_options.items(), key=lambda item: item[1], reverse=True)[:cls])
+        cand = top_options(min_dist, solution, cls)
+
+    sort_options = dict(zip(cand.tolist(), min_dist[cand].tolist()))
 
     return drop_elem, sort_options
 
 
-def search_add_elem(sort_options, sum_dist, solution, bilevel):
+def search_add_elem(sort_options, sum_dist, solution, bilevel, rng=None):
 
     """
     This function returns the element to be added
+    rng is the numpy Generator for breaking ties when the bi-level model is not in use
     """
 
+    if rng is None:
+        rng = np.random.default_rng()
+
     #Get the index of the point maximizing the min_dist from any point in solution
     max_min_value = next(iter(sort_options.values()))
     max_min_ind = []
@@ -130,13 +199,10 @@ def search_add_elem(sort_options, sum_dist, solution, bilevel):
 
     #This is for tie-breaking when there are multiple elements in max_min_ind list, temp_selection will be the one giving bigger sum_dist
     if bilevel:
-        for k in max_min_ind:
-            if k in sum_dist and sum_dist[k] == max([sum_dist[key] for key in max_min_ind]):
-                add_elem = k
-                break
+        add_elem = max_min_ind[int(np.argmax(sum_dist[max_min_ind]))]
     #If the bi-level model is not in use, the algorithm picks a random element that maximize the min_dist to add
     else:
-        add_elem = np.random.choice(max_min_ind, 1).item()
+        add_elem = rng.choice(max_min_ind, 1).item()
     
     return add_elem
 
@@ -147,16 +213,112 @@ def obj_values(min_dist, sum_dist, solution):
     This function is the main objective function of the bi-level maxsum problem
     """
 
-    #Get dictionaries of min pairwise and summed pairwise distances for all solution elements
-    pair_dist = {k: min_dist[k] for k in solution if k in min_dist}
-    pair_sum_dist = {k: sum_dist[k] for k in solution if k in sum_dist}
-
     #The objective value is the sum of the minimum pairwise distance and the summed pairwise distances of the solution set
-    min_pair = min(pair_dist.values())
-    sum_pair = round(sum(pair_sum_dist.values())/2, 10) #Because each pair dist will be added twice: sum_pair_a = dist[a,b]+dist[a,c], sum_pair_b = dist[b,a]+dist[b,c]
+    min_pair = float(min_dist[solution].min())
+    sum_pair = round(float(sum_dist[solution].sum())/2, 10) #Because each pair dist will be added twice: sum_pair_a = dist[a,b]+dist[a,c], sum_pair_b = dist[b,a]+dist[b,c]
 
     return min_pair, sum_pair
 
+def trial_values(distance_matrix, min_dist, sum_dist, solution, add_elem):
+
+    """
+    This function returns the objective values of the solution with add_elem added, without updating min_dist and sum_dist
+    It gives the same values as add_update followed by obj_values, but only needs the distances from add_elem to the solution
+    """
+
+    add_dist = distance_matrix[add_elem][solution]
+
+    #The min_dist of a solution element only changes if add_elem is closer to it, and min_dist of add_elem is already to the solution
+    min_pair = float(min(min_dist[add_elem], np.minimum(min_dist[solution], add_dist).min()))
+    sum_pair = round(float(np.append(np.round(sum_dist[solution] + add_dist, 10), sum_dist[add_elem]).sum())/2, 10)
+
+    return min_pair, sum_pair
+
+
+class objTracker:
+
+    """
+    This class keeps the objective values of the solution up to date through drops and adds, so they are not rebuilt
+    The min pairwise distance is the top of a heap of the min_dist of solution elements, where entries left by dropped
+    elements or by elements whose min_dist has changed are skipped once they get to the top
+    The summed pairwise distance is a running sum, as the sum_dist of an element is its share of the pairs it makes, and
+    it is summed again from sum_dist every so often so rounding does not build up
+    """
+
+    def __init__(self, min_dist, sum_dist, solution):
+
+        self.in_sol = np.zeros(len(min_dist), dtype=bool)
+        self.in_sol[solution] = True
+        self.size = len(solution)
+        self.updates = 0
+
+        self.heap = list(zip(min_dist[solution].tolist(), solution))
+        heapq.heapify(self.heap)
+        self.sum_pair = round(float(sum_dist[solution].sum())/2, 10)
+
+
+    def _push(self, min_dist, rows):
+
+        #Add the new min_dist of solution elements in rows, and rebuild the heap once it is mostly old entries
+        for k in rows[self.in_sol[rows]].tolist():
+            heapq.heappush(self.heap, (float(min_dist[k]), k))
+
+        if len(self.heap) > 4 * self.size + 64:
+            solution = np.flatnonzero(self.in_sol)
+            self.heap = list(zip(min_dist[solution].tolist(), solution.tolist()))
+            heapq.heapify(self.heap)
+
+
+    def drop(self, min_dist, sum_dist, drop_elem, changed):
+
+        #The pairs of the dropped element are taken off, and changed are the elements with a new min_dist
+        self.in_sol[drop_elem] = False
+        self.size -= 1
+        self.sum_pair = round(self.sum_pair - float(sum_dist[drop_elem]), 10)
+        self._push(min_dist, changed)
+
+
+    def add(self, min_dist, sum_dist, add_elem, changed):
+
+        self.in_sol[add_elem] = True
+        self.size += 1
+        self.sum_pair = round(self.sum_pair + float(sum_dist[add_elem]), 10)
+        self._push(min_dist, np.append(changed, add_elem))
+
+        self.updates += 1
+        if self.updates >= self.size:
+            self.sum_pair = round(float(sum_dist[self.in_sol].sum())/2, 10)
+            self.updates = 0
+
+
+    def min_pair(self, min_dist):
+
+        while True:
+            value, k = self.heap[0]
+            if self.in_sol[k] and min_dist[k] == value:
+                return value
+            heapq.heappop(self.heap)
+
+
+    def values(self, min_dist):
+
+        """
+        This returns the same values as obj_values for the solution
+        """
+
+        return self.min_pair(min_dist), self.sum_pair
+
+
+    def trial(self, min_dist, sum_dist, add_elem):
+
+        """
+        This returns the same values as trial_values for adding add_elem, without changing anything
+        As the matrix is symmetric, min_dist and sum_dist of add_elem are its closest and summed distances to the solution
+        """
+
+        return min(self.min_pair(min_dist), float(min_dist[add_elem])), round(self.sum_pair + float(sum_dist[add_elem]), 10)
+
+
 def adaptive_tabu_size(plateau, max_size, min_size, base_size, no_gain, iterations, max_streak):
 
     """
@@ -184,15 +346,16 @@ def aspiration_by_default(neighbourhood, drop_elem, tabu_list):
 
     """
     If all neighbours considered are tabu, return the oldest tabu on the list for execution
+    tabu_list maps each tabu move to the step it was made tabu at, so the oldest has the smallest step
     """
 
     neighbour = [k for k in neighbourhood.keys()]
     for i in neighbour:
         if drop_elem > i:
-            old_tabu = max((n for n in tabu_list if n[0][1] == drop_elem), key=lambda x: x[1], default=None)
+            old_tabu = min((n for n in tabu_list.items() if n[0][1] == drop_elem), key=lambda x: x[1], default=None)
             add_elem = old_tabu[0][0]
         else:
-            old_tabu = max((n for n in tabu_list if n[0][0] == drop_elem), key=lambda x: x[1], default=None)
+            old_tabu = min((n for n in tabu_list.items() if n[0][0] == drop_elem), key=lambda x: x[1], default=None)
             add_elem = old_tabu[0][1]
 
     return add_elem
\ No newline at end of file
@@ -1,62 +1,53 @@
-
-from collections import deque
+from collections import OrderedDict
 
 
 class tabuList:
 
     """
     This class stores information about tabu list
-    tabu_list stores the move and its current tenure
+    tabu_list maps each move to the step it was made tabu at, oldest first, so its tenure is step minus that
     list_len is the length of tabu list
-    move_list stores the indices of elements involved in the move
+    step counts the calls to increment_tabu_tenure, which is when the tenure of every move goes up by one
     """
 
     def __init__(self, list_len, max_tenure):
-        self.tabu_list = deque(maxlen=list_len)
-        self.move_list = deque(maxlen=list_len)
+        self.tabu_list = OrderedDict()
+        self.step = 0
+        self._list_len = list_len
         self._max_tenure = max_tenure
 
     def check_tabu(self, move):
 
         #(i,j) and (j,i) are considered the same move
-        return move in self.move_list or move[::-1] in self.move_list
+        made_at = self.tabu_list.get(move if move[0] <= move[1] else move[::-1])
+        return made_at is not None and self.step - made_at <= self._max_tenure
 
     def append_tabu_list(self, move):
 
         #Reset tenure to 0 if move already in tabu list
-        #The aspiration move is first removed and then appended again to avoid being dropped due to reaching max deque length before reaching max tenure
+        #The aspiration move is first removed and then appended again to avoid being dropped due to reaching max list length before reaching max tenure
         normalized_move = move if move[0] <= move[1] else move[::-1]
-        if normalized_move in self.move_list:
-            self.move_list.remove(normalized_move)
-            copy = list(self.tabu_list)
-            for tabu in copy:
-                if tabu[0] == normalized_move:
-                    self.tabu_list.remove(tabu)
-
-        self.tabu_list.append([normalized_move, 0])
-        self.move_list.append(normalized_move)
+        self.tabu_list.pop(normalized_move, None)
+        self.tabu_list[normalized_move] = self.step
+        self._trim()
 
     def increment_tabu_tenure(self):
-        #Increment tenure of all moves in the tabu list
-        for i in range(0, len(self.tabu_list)):
-            self.tabu_list[i][1] += 1
+        #Tenures are counted from the step each move was made tabu, so only the step moves on
+        self.step += 1
 
     def remove_expired_tabus(self):
-        #Remove moves that have expired
-        #Creating copy of the deque so not modifying while iterating over it
-        copy = list(self.tabu_list)
-        for tabu in copy:
-            if tabu[1] > self._max_tenure:
-                self.tabu_list.remove(tabu)
-                self.move_list.remove(tabu[0])
+        #Remove moves that have expired, which are always the oldest
+        while self.tabu_list and self.step - next(iter(self.tabu_list.values())) > self._max_tenure:
+            self.tabu_list.popitem(last=False)
 
     def adaptive_size(self, new_size):
 
         #Update lengths of tabu lists and tenure
-        new_tabu_list = deque(list(self.tabu_list), maxlen=new_size)
-        new_move_list = deque(list(self.move_list), maxlen=new_size)
-
-        self.tabu_list = new_tabu_list
-        self.move_list = new_move_list
-
+        self._list_len = new_size
         self._max_tenure = new_size
+        self._trim()
+
+    def _trim(self):
+        #Drop the oldest moves to keep the list at list_len
+        while len(self.tabu_list) > self._list_len:
+            self.tabu_list.popitem(last=False)
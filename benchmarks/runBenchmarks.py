@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+from benchmarks.syntheticMatrix import synthetic_dataset
+from MDP.TSMA import compute_MDP_tabu
+from MMDP.dropAddTS import computeSubset
+from MMDP.Expand import expandSubset
+from utils.progressLog import configure_logging
+
+import multiprocessing as mp
+import numpy as np
+import platform
+import resource
+import argparse
+import queue
+import tempfile
+import shutil
+import glob
+import json
+import time
+import sys
+import os
+
+#Grids of dataset sizes n and subset sizes k, the quick one is for checking a change and the full one for a release
+GRIDS = {
+    'quick': {'n': [1000], 'k': [10, 100]},
+    'full': {'n': [1000, 5000, 20000, 50000], 'k': [10, 100, 500, 2000]}
+}
+
+#Each solver takes the similarity matrix, heading and existing subset files, the subset size, the seed, the trace file and
+#the memory in MB to run out of core in, None to load the matrix
+SOLVERS = {
+    'mdp': lambda sim_file, heading_file, subset_file, k, seed, trace, memory: compute_MDP_tabu(sim_file, heading_file, k, seed=seed, trace=trace, memory=memory),
+    'mmd': lambda sim_file, heading_file, subset_file, k, seed, trace, memory: computeSubset(sim_file, heading_file, k, False, seed=seed, trace=trace, memory=memory),
+    'mmdp': lambda sim_file, heading_file, subset_file, k, seed, trace, memory: computeSubset(sim_file, heading_file, k, True, seed=seed, trace=trace, memory=memory),
+    'mmdp_expand': lambda sim_file, heading_file, subset_file, k, seed, trace, memory: expandSubset(sim_file, heading_file, subset_file, k, True, seed=seed, trace=trace, memory=memory)
+}
+
+
+def _case_process(results, solver, sim_file, heading_file, subset_file, k, seed, memory):
+
+    """
+    Run one benchmark case in its own process, so its peak memory is its own
+    """
+
+    trace_dir = tempfile.mkdtemp()
+
+    try:
+        start = time.perf_counter()
+        _, sim_list = SOLVERS[solver](sim_file, heading_file, subset_file, k, seed, os.path.join(trace_dir, 'trace.npz'), memory)
+        wall_seconds = time.perf_counter() - start
+
+        #The steps of the searches are counted from their traces
+        iterations = 0
+        for trace in glob.glob(os.path.join(trace_dir, '*.npz')):
+            with np.load(trace) as saved:
+                iterations += len(saved['time'])
+
+    finally:
+        shutil.rmtree(trace_dir)
+
+    dist = 1 - np.asarray(sim_list, dtype=float)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    results.put({
+        'wall_seconds': wall_seconds,
+        'iterations': iterations,
+        'iterations_per_second': iterations / wall_seconds if wall_seconds > 0 else 0.0,
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'major_faults': usage.ru_majflt,
+        'minor_faults': usage.ru_minflt,
+        'min_dist': float(dist.min()) if len(dist) else 0.0,
+        'sum_dist': float(dist.sum())
+    })
+
+
+def run_case(solver, sim_file, heading_file, subset_file, k, seed, memory=None):
+
+    results = mp.Queue()
+    proc = mp.Process(target=_case_process, args=(results, solver, sim_file, heading_file, subset_file, k, seed, memory))
+    proc.start()
+
+    #Get the result before joining, so the process is never left blocked on a full queue
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if proc.exitcode is not None:
+                raise RuntimeError(f'Benchmark {solver} k={k} on {sim_file} exited with code {proc.exitcode}')
+
+    proc.join()
+
+    return result
+
+
+def run_benchmarks(solvers, sizes, subset_sizes, data_dir, seed=0, memory=None):
+
+    """
+    This runs each solver for each dataset size n and subset size k smaller than n, and returns the results of the cases
+    The datasets are synthetic and made once in data_dir, and the expansion cases expand a random subset of k elements
+    by k more. With memory in MB the solvers run out of core, with a row cache of that size
+    """
+
+    cases = []
+
+    for n in sizes:
+        sim_file, heading_file = synthetic_dataset(data_dir, n, seed)
+
+        for k in subset_sizes:
+            if k >= n:
+                continue
+
+            #Existing subset for the expansion cases
+            subset_file = os.path.join(data_dir, f'synthetic_{n}_{seed}_subset_{k}.txt')
+            with open(subset_file, 'w') as f:
+                for i in np.sort(np.random.default_rng(seed).choice(n, k, replace=False)):
+                    f.write(f'Seq{i}\n')
+
+            for solver in solvers:
+                if solver.endswith('_expand') and 2 * k >= n:
+                    continue
+
+                print(f'Running {solver} n={n} k={k}', flush=True)
+                result = run_case(solver, sim_file, heading_file, subset_file, k, seed, memory)
+                cases.append(dict({'solver': solver, 'n': n, 'k': k, 'seed': seed, 'memory': memory}, **result))
+
+    return cases
+
+
+def objective(case):
+
+    #Objective of a case for its solver, bigger is better
+    if case['solver'] == 'mdp':
+        return (case['sum_dist'],)
+    if case['solver'] == 'mmd':
+        return (case['min_dist'],)
+    return (case['min_dist'], case['sum_dist'])
+
+
+def _worse(new, old):
+
+    #Compare objectives in order, allowing for rounding as they are added up from the similarities of the subset
+    for new_val, old_val in zip(new, old):
+        if abs(new_val - old_val) > 1e-9 * max(1, abs(old_val)):
+            return new_val < old_val
+
+    return False
+
+
+def compare(cases, baseline, tolerance=0.2):
+
+    """
+    This compares the cases with the ones of a baseline run and returns the regressions found
+    A case regresses if it is more than tolerance slower or bigger in memory than the baseline, or finds a worse subset
+    Cases are only compared with cases run with the same memory, in memory or out of core
+    """
+
+    regressions = []
+    base_cases = {(case['solver'], case['n'], case['k'], case['seed'], case.get('memory')): case for case in baseline['cases']}
+
+    for case in cases:
+        key = (case['solver'], case['n'], case['k'], case['seed'], case.get('memory'))
+        if key not in base_cases:
+            continue
+
+        base = base_cases[key]
+        name = f"{case['solver']} n={case['n']} k={case['k']}"
+
+        if case['wall_seconds'] > base['wall_seconds'] * (1 + tolerance):
+            regressions.append(f"{name}: wall time {case['wall_seconds']:.2f}s against {base['wall_seconds']:.2f}s")
+        if case['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {case['peak_rss_mb']:.0f}MB against {base['peak_rss_mb']:.0f}MB")
+
+        if _worse(objective(case), objective(base)):
+            regressions.append(f"{name}: objective {objective(case)} against {objective(base)}")
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the solvers on synthetic similarity matrices")
+    parser.add_argument('-g', '--grid', choices=list(GRIDS), default='quick', help="Grid of n and k to run (default: quick)")
+    parser.add_argument('-n', '--sizes', type=int, nargs='+', default=None, help="Dataset sizes to run instead of the grid's")
+    parser.add_argument('-k', '--subset_sizes', type=int, nargs='+', default=None, help="Subset sizes to run instead of the grid's")
+    parser.add_argument('-s', '--solvers', choices=list(SOLVERS), nargs='+', default=list(SOLVERS), help="Solvers to run (default: all)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the datasets and the searches (default: 0)")
+    parser.add_argument('--memory', type=int, default=None, help="Run the solvers out of core with a row cache of this many MB")
+    parser.add_argument('--data', type=str, default='benchmark_data', help="Directory the synthetic datasets are kept in (default: benchmark_data)")
+    parser.add_argument('-o', '--output', type=str, default='benchmark_results.json', help="JSON file to write the results to (default: benchmark_results.json)")
+    parser.add_argument('-b', '--baseline', type=str, default=None, help="JSON file of a baseline run to compare the results with")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2, help="Slow down or memory growth allowed against the baseline (default: 0.2)")
+    args = parser.parse_args()
+
+    configure_logging(-1)
+
+    grid = GRIDS[args.grid]
+    cases = run_benchmarks(args.solvers, args.sizes or grid['n'], args.subset_sizes or grid['k'], args.data, args.seed, args.memory)
+
+    with open(args.output, 'w') as f:
+        json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'cores': os.cpu_count(), 'cases': cases}, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(cases, json.load(f), args.tolerance)
+
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+        print('No regressions against ' + args.baseline)
+
+
+if __name__ == '__main__':
+    main()
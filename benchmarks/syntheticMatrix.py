@@ -0,0 +1,79 @@
+import numpy as np
+import json
+import os
+
+
+def synthetic_similarity(sim_file, n, seed=0, family_size=50, dim=16, decimals=3, dtype=np.float32, block_size=2048):
+
+    """
+    This function writes a seeded synthetic similarity matrix of n elements to sim_file (.npy), made to look like the
+    pairwise identities of a protein dataset: elements come in families of about family_size members on average, with a
+    few big families and many small ones, so the matrix has a block structure of high similarities within families and
+    low ones between them
+    Each element is a point around the centre of its family in dim dimensions, and the similarity of two elements is
+    1 / (1 + d^2 / (dim / 2)) for their squared distance d^2, rounded to decimals places so there are ties as in real data
+    The matrix is symmetric with values in [0, 1] and 1 on the diagonal, and it is written block_size rows at a time, so
+    it is never held in memory
+    """
+
+    rng = np.random.default_rng(seed)
+
+    #Family sizes follow a power law, so most of the elements are in a few of the families
+    families = max(1, n // family_size)
+    weights = 1 / np.arange(1, families + 1) ** 1.1
+    labels = rng.choice(families, n, p=weights / weights.sum())
+
+    #Each family has its own spread, so some families are much tighter than others
+    centres = rng.normal(0, 1, (families, dim))
+    spread = rng.uniform(0.2, 0.6, families)
+    points = centres[labels] + rng.normal(0, 1, (n, dim)) * spread[labels, None]
+    sq_norms = (points ** 2).sum(axis=1)
+
+    mat = np.lib.format.open_memmap(sim_file, mode='w+', dtype=dtype, shape=(n, n))
+
+    for row in range(0, n, block_size):
+        rows = slice(row, min(row + block_size, n))
+
+        for col in range(row, n, block_size):
+            cols = slice(col, min(col + block_size, n))
+
+            sq_dist = np.maximum(sq_norms[rows, None] + sq_norms[None, cols] - 2 * points[rows] @ points[cols].T, 0)
+            block = np.round(1 / (1 + sq_dist / (dim / 2)), decimals)
+
+            #Blocks on the diagonal are made symmetric from their upper triangle, the others are mirrored
+            if row == col:
+                block = np.triu(block) + np.triu(block, 1).T
+                np.fill_diagonal(block, 1)
+
+            mat[rows, cols] = block
+            mat[cols, rows] = block.T
+
+    mat.flush()
+    del mat
+
+    return sim_file
+
+
+def synthetic_dataset(data_dir, n, seed=0, **options):
+
+    """
+    This function returns the similarity matrix and heading files of a synthetic dataset of n elements in data_dir,
+    making them if they are not there yet
+    options are passed on to synthetic_similarity
+    """
+
+    os.makedirs(data_dir, exist_ok=True)
+    sim_file = os.path.join(data_dir, f'synthetic_{n}_{seed}.npy')
+    heading_file = os.path.join(data_dir, f'synthetic_{n}_{seed}.json')
+
+    if not os.path.exists(sim_file):
+        #Write to a temporary name first, so an interrupted run doesn't leave a part written matrix behind
+        part_file = sim_file[:-len('.npy')] + '.part.npy'
+        synthetic_similarity(part_file, n, seed, **options)
+        os.replace(part_file, sim_file)
+
+    if not os.path.exists(heading_file):
+        with open(heading_file, 'w') as f:
+            json.dump([f'Seq{i}' for i in range(n)], f)
+
+    return sim_file, heading_file
@@ -1,100 +1,372 @@
-
 import numpy as np
-from scipy.sparse import csr_matrix
-import json, sys
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+import tempfile
+import argparse
+import logging
+import shutil
+import json, os
+
+from utils.progressLog import configure_logging
+from utils.condensedMatrix import write_condensed
+from utils.sparseMatrix import write_sparse
+
+logger = logging.getLogger(__name__)
+
+
+def read_identities(file, chunk_size=1000000, n=None, out_file=None, dtype=np.float32):
+
+    """
+    Read a similarity file of 'header1 header2 value' lines into a dense symmetric matrix in a single pass
+    The lines are parsed chunk_size at a time by the C parser of pandas, the headers of each chunk are given indices in
+    bulk, with new headers added to the index as they are seen, and the values are put straight into a preallocated
+    matrix, which grows if more headers turn up than it has room for
+    n is the number of headers if it's known, otherwise the matrix starts at a size estimated from the size of the file
+    With out_file, the matrix is built in a memory map on disk and written to out_file as .npy, so it never has to fit in
+    memory, and the memory map of out_file is returned
+    The headers are sorted and the matrix is permuted to match, so the result doesn't depend on the order of the lines
+    A pair given more than once keeps its last value
+    """
+
+    names = []
+    cap = n if n else _estimate_size(file)
+    work_dir = os.path.dirname(os.path.abspath(out_file)) if out_file else None
+    buf, work_file = _new_buffer(cap, dtype, work_dir)
+
+    for rows, cols, values in _read_chunks(file, chunk_size, dtype, names):
+
+        if len(names) > cap:
+            new_cap = max(len(names), cap + cap // 2)
+            buf, work_file = _grow(buf, work_file, cap, new_cap, dtype, work_dir)
+            cap = new_cap
+
+        #Keep the last line of each pair in the chunk, in either order, so both orders of the pair get the same value
+        _, last = np.unique((np.minimum(rows, cols) * len(names) + np.maximum(rows, cols))[::-1], return_index=True)
+        last = len(rows) - 1 - last
+        rows, cols, values = rows[last], cols[last], values[last]
+
+        #Store each value and its symmetric counterpart
+        mat = buf.reshape(cap, cap)
+        mat[rows, cols] = values
+        mat[cols, rows] = values
+
+    size = len(names)
+    order = np.array(sorted(range(size), key=names.__getitem__), dtype=np.int64)
+    headers = [names[k] for k in order]
+    mat = buf.reshape(cap, cap)
+
+    if out_file:
+        #Write the sorted matrix to out_file a block of rows at a time, then drop the working copy
+        _unlink(out_file)
+        final = np.lib.format.open_memmap(out_file, mode='w+', dtype=dtype, shape=(size, size))
+        for start in range(0, size, 1024):
+            final[start:start + 1024] = mat[order[start:start + 1024]][:, order]
+        final.flush()
+
+        del mat, buf
+        os.remove(work_file)
+
+        return final, headers
+
+    _permute(mat, order, size)
+    del mat
+
+    return _compact(buf, cap, size), headers
+
+
+def read_sparse_identities(file, chunk_size=1000000, dtype=np.float32):
+
+    """
+    Read a similarity file of 'header1 header2 value' lines into a sparse symmetric CSR matrix in a single pass, for files
+    that only report some of the pairs, such as the output of foldseek or of needleall with a threshold
+    Memory grows with the number of lines rather than with n^2. Pairs not in the file are 0, and self pairs are left out
+    as the solvers set the diagonal themselves
+    The headers are sorted as by read_identities, and a pair given more than once keeps its last value
+    """
+
+    names = []
+    rows, cols, values = [], [], []
+
+    #Each pair is kept in both orders, one after the other, so the last value of a pair is the last in both orders
+    for chunk_rows, chunk_cols, chunk_values in _read_chunks(file, chunk_size, dtype, names):
+        rows.append(np.stack([chunk_rows, chunk_cols], axis=1).ravel())
+        cols.append(np.stack([chunk_cols, chunk_rows], axis=1).ravel())
+        values.append(np.repeat(chunk_values, 2))
+
+    n = len(names)
+    order = sorted(range(n), key=names.__getitem__)
+    headers = [names[k] for k in order]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+
+    rows = rank[np.concatenate(rows)] if rows else np.empty(0, dtype=np.int64)
+    cols = rank[np.concatenate(cols)] if cols else np.empty(0, dtype=np.int64)
+    values = np.concatenate(values) if values else np.empty(0, dtype=dtype)
+    off_diagonal = rows != cols
+
+    #np.unique finds the first of each pair in the reversed lines, which is the last in the file, and sorts the pairs by
+    #row then column, the order of a CSR matrix
+    keys, last = np.unique((rows * n + cols)[off_diagonal][::-1], return_index=True)
+    values = values[off_diagonal][::-1][last]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(keys // n, minlength=n))])
+
+    return csr_matrix((values, (keys % n).astype(np.int32), indptr), shape=(n, n)), headers
+
+
+def _read_chunks(file, chunk_size, dtype, names):
+
+    """
+    Parse the lines of a similarity file chunk_size at a time with the C parser of pandas, and give the header indices and
+    values of each chunk
+    The headers of a chunk are indexed in bulk, with new headers added to names as they are seen
+    """
+
+    index_dict = {}
+
+    #Headers are kept as strings, even ones like NA or 1e5
+    reader = pd.read_csv(file, sep=' ', header=None, names=['seq1', 'seq2', 'value'], dtype={'seq1': str, 'seq2': str, 'value': np.float64},
+                         keep_default_na=False, na_filter=False, engine='c', chunksize=chunk_size)
+    lines = 0
+
+    for chunk in reader:
+
+        seq1 = chunk['seq1'].to_numpy()
+        seq2 = chunk['seq2'].to_numpy()
+
+        #Index the headers of the chunk by hashing them all at once, so only the distinct ones are looked up
+        codes, uniques = pd.factorize(np.concatenate([seq1, seq2]))
+        lookup = np.empty(len(uniques), dtype=np.int64)
+        for k, name in enumerate(uniques):
+            idx = index_dict.get(name)
+            if idx is None:
+                idx = index_dict[name] = len(names)
+                names.append(name)
+            lookup[k] = idx
+
+        yield lookup[codes[:len(seq1)]], lookup[codes[len(seq1):]], chunk['value'].to_numpy(dtype=dtype)
+
+        lines += len(chunk)
+        logger.info('Processed %d lines, %d headers', lines, len(names))
 
 
-def read_identities(file, chunk_size=10000):
+def _estimate_size(file):
 
     """
-    Read large similarity files in chunks to manage memory better
+    Estimate the number of headers from the number of lines in the file, worked out from the length of its first lines
+    A file with both orders of each pair has about n^2 lines and a file with each pair once, as needleall writes, about
+    n^2 / 2, so the first lines are checked for the reverse of a pair they hold. If there is none the file is taken to
+    have each pair once, as the first lines of a big file can all be of one header. A matrix too big only costs the pages
+    it never writes to, which are never held in memory, while one too small has to grow and be copied
     """
 
-    #Get unique headers
-    headers = set()
-    with open(file, 'r') as fr:
-        for i, line in enumerate(fr):
-            if i % chunk_size == 0:
-                print(f'Processed {i} lines for headers...')
-            seq1, seq2, _ = line.strip().split(' ')
-            headers.add(seq1)
-            headers.add(seq2)
+    with open(file, 'rb') as f:
+        head = f.read(2**20)
 
-    #Create index mapping
-    headers = sorted(headers)
-    index_dict = {key: idx for idx, key in enumerate(headers)}
-    n = len(headers)
+    #Leave out the last line if it was cut off, and empty lines
+    first = head.split(b'\n')
+    first = [line for line in (first[:-1] if len(head) == 2**20 else first) if line]
+    lines = max(1, len(first))
+    total = os.path.getsize(file) / (len(head) / lines) if head else 0
 
-    #Initialise sparse matrix components
-    rows = []
-    cols = []
-    data = []
+    pairs = set(tuple(line.split(b' ')[:2]) for line in first)
+    both_orders = any((b, a) in pairs for a, b in pairs if a != b)
 
-    #Process file in chunks for matrix
-    with open(file, 'r') as fr:
-        chunk = []
-        counter = 1
-        for i, line in enumerate(fr):
-            if i % chunk_size == 0:
-                print(f'Processed {i} lines for matrix...')
-            chunk.append(line)
+    return max(16, int(np.sqrt(total if both_orders else 2 * total)) + 1)
 
-            if len(chunk) >= chunk_size:
-                process_chunk(chunk, index_dict, rows, cols, data)
-                chunk = []
-                counter += 1
-        
-        #Processing remaining lines
-        if chunk:
-            print('Processing remaining lines...')
-            process_chunk(chunk, index_dict, rows, cols, data)
 
-    #Create final sparse matrix
-    mat = csr_matrix((data, (rows, cols)), shape=(n, n))
+def _new_buffer(cap, dtype, work_dir):
 
-    return mat, headers
+    #Flat zeroed buffer for a cap x cap matrix, in memory or in a memory map in work_dir
+    if work_dir is None:
+        return np.zeros(cap * cap, dtype=dtype), None
 
+    fd, work_file = tempfile.mkstemp(suffix='.npy', dir=work_dir)
+    os.close(fd)
 
-def process_chunk(chunk, index_dict, rows, cols, data):
+    return np.lib.format.open_memmap(work_file, mode='w+', dtype=dtype, shape=(cap * cap,)), work_file
+
+
+def _grow(buf, work_file, cap, new_cap, dtype, work_dir):
+
+    #Move the matrix into a bigger buffer
+    new_buf, new_file = _new_buffer(new_cap, dtype, work_dir)
+    new_buf.reshape(new_cap, new_cap)[:cap, :cap] = buf.reshape(cap, cap)
+    logger.info('Matrix grown from %d to %d headers', cap, new_cap)
+
+    if work_file is not None:
+        del buf
+        os.remove(work_file)
+
+    return new_buf, new_file
+
+
+def _permute(mat, order, size):
+
+    """
+    Permute the top left size x size block of mat in place, so row and column p take the values of row and column order[p]
+    Rows are moved along the cycles of order, so only one spare row is needed, and columns a block of rows at a time
+    """
+
+    done = np.zeros(size, dtype=bool)
+
+    for start in range(size):
+        if done[start]:
+            continue
+
+        done[start] = True
+        if order[start] == start:
+            continue
+
+        spare = mat[start, :size].copy()
+        p = start
+        while order[p] != start:
+            mat[p, :size] = mat[order[p], :size]
+            p = order[p]
+            done[p] = True
+        mat[p, :size] = spare
+
+    for start in range(0, size, 1024):
+        mat[start:start + 1024, :size] = mat[start:start + 1024, order]
+
+
+def _compact(buf, cap, size):
+
+    """
+    Move the top left size x size block of the cap x cap matrix in buf to the start of buf, and give the rest back
+    Rows only move towards the start, so each one is copied before it is written over
+    """
+
+    if cap != size:
+        for row in range(1, size):
+            buf[row * size:(row + 1) * size] = buf[row * cap:row * cap + size]
+        buf.resize(size * size, refcheck=False)
+
+    return buf.reshape(size, size)
+
+
+#Heading and matrix files of each measure
+_FILE_MAPPING = {
+    1: ('id_headings.json', 'id_mat.npy'),
+    2: ('sim_headings.json', 'sim_mat.npy'),
+    3: ('tm_headings.json', 'tm_mat.npy')
+}
+
+
+def make_head_mat(file, measure, condensed=False, quantize=None, sparse=False, out_of_core=False):
 
     """
-    Process a chunk a lines and update matrix components
+    Read the similarity file and write the matrix and headings of each measure, as save_head_mat does
+    With out_of_core, the dense matrix is built in a memory map on disk rather than in memory, as read_identities does
+    with out_file, so it never has to fit in memory. It is built in the .npy matrix file itself, or for a condensed matrix
+    file in a temporary .npy file next to it, which the condensed matrix file is written from and which is then removed
     """
 
-    for line in chunk:
-        
-        seq1, seq2, value = line.strip().split(' ')
-        #Map index from seq names
-        i = index_dict[seq1]
-        j = index_dict[seq2]
-        value = float(value)
+    condensed = condensed or quantize is not None
+
+    if sparse:
+        mat, headers = read_sparse_identities(file)
+        save_head_mat(mat, headers, measure, condensed, quantize)
+        return
 
-        #Store each value and its symmetrix counterpart
-        rows.extend([i, j])
-        cols.extend([j, i])
-        data.extend([value, value])
+    if not out_of_core:
+        mat, headers = read_identities(file)
+        save_head_mat(mat, headers, measure, condensed, quantize)
+        return
 
+    out_file = _FILE_MAPPING[1 if measure == 0 else measure][1]
+    if condensed:
+        out_file = os.path.splitext(out_file)[0] + '.tmp.npy'
 
-def save_head_mat(mat, headers, measure):
+    mat, headers = read_identities(file, out_file=out_file)
+    try:
+        save_head_mat(mat, headers, measure, condensed, quantize)
+    finally:
+        del mat
+        if condensed:
+            os.remove(out_file)
 
-    file_mapping = {
-        1: ('id_headings.json', 'id_mat.npy'),
-        2: ('sim_headings.json', 'sim_mat.npy'),
-        3: ('tm_headings.json', 'tm_mat.npy')
-    }
 
-    measures = file_mapping.keys() if measure == 0 else [measure]
+def save_head_mat(mat, headers, measure, condensed=False, quantize=None):
+
+    """
+    Write the matrix and headings of each measure, measure 0 being all of them
+    With condensed, each measure gets a condensed matrix file (.cmat) holding its headings and the upper triangle of the
+    matrix, otherwise a .npy matrix file and a .json heading file
+    quantize ('uint8' or 'float16') stores the values of the condensed matrix file in a byte over 256 levels from 0 to the
+    largest value, or in a half precision float, rather than as the dtype of mat
+    A sparse mat, from read_sparse_identities, is always written as a condensed matrix file with the sparse layout
+    All the measures get the same matrix, so it is written once and the other matrix files are linked to it
+    """
+
+    measures = _FILE_MAPPING.keys() if measure == 0 else [measure]
+    condensed = condensed or issparse(mat)
+    written = None
 
     for m in measures:
-        if m in file_mapping:
-            header_file, mat_file = file_mapping[m]
-            
-            with open(header_file, 'w') as outfile:
-                json.dump(list(headers), outfile)
-            
-            np.save(mat_file, mat.toarray())
+        if m in _FILE_MAPPING:
+            header_file, mat_file = _FILE_MAPPING[m]
+
+            if condensed:
+                mat_file = os.path.splitext(mat_file)[0] + '.cmat'
+            else:
+                with open(header_file, 'w') as outfile:
+                    json.dump(list(headers), outfile)
+
+            #A matrix already memory mapped to the file is written in place, any other file is removed first, as it may be
+            #linked to the matrix file of another measure written before
+            if written is None and isinstance(mat, np.memmap) and os.path.abspath(mat.filename) == os.path.abspath(mat_file):
+                mat.flush()
+            elif written is not None:
+                _link(written, mat_file)
+            else:
+                _unlink(mat_file)
+                if issparse(mat):
+                    write_sparse(mat_file, mat, headers, quantize or mat.dtype)
+                elif condensed:
+                    write_condensed(mat_file, mat, headers, quantize or mat.dtype)
+                else:
+                    np.save(mat_file, mat)
+
+            written = mat_file
+
+
+def _unlink(path):
+
+    #Remove path if it exists, so writing to it makes a new file rather than changing the files it is linked to
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+def _link(src, dst):
+
+    #Hard link dst to src, or copy src if the file system can't link
+    _unlink(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 
 if __name__ == '__main__':
-    mat, headers = read_identities(sys.argv[1])
-    save_head_mat(mat, headers, int(sys.argv[2]))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create matrix and heading files from a similarity file")
+    parser.add_argument('similarity', type=str, help="Path to the similarity file of 'header1 header2 value' lines")
+    parser.add_argument('measure', type=int, choices=[0, 1, 2, 3],
+                        help="Measure of the similarities, 1 for sequence identity, 2 for sequence similarity, 3 for "
+                        "structure similarity (TM scores), 0 to write the files of all three")
+    parser.add_argument('--condensed', action='store_true',
+                        help="Write a condensed matrix file holding the headings and the upper triangle of the matrix, "
+                        "half the size of the .npy file, instead of .npy and .json files")
+    parser.add_argument('--quantize', type=str, choices=['uint8', 'float16'], default=None,
+                        help="Store the values of the condensed matrix file in a byte over 256 levels from 0 to the largest "
+                        "value, or as half precision floats, a quarter or half the size of float32 values. Implies --condensed")
+    parser.add_argument('--out_of_core', action='store_true',
+                        help="Build the matrix in a memory map on disk rather than in memory, for a matrix bigger than the "
+                        "memory. A condensed matrix file is written from a temporary .npy file next to it")
+    parser.add_argument('--sparse', action='store_true',
+                        help="Only keep the pairs in the similarity file, reading the pairs not in it as a similarity of 0, in "
+                        "a sparse condensed matrix file that grows with the number of pairs rather than n^2. Implies --condensed")
+    args = parser.parse_args()
+
+    configure_logging()
+    make_head_mat(args.similarity, args.measure, args.condensed, args.quantize, args.sparse, args.out_of_core)
@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 
-from MMDP.dropAddTS import computeSubset
-from MMDP.Expand import expandSubset
-from MDP.TSMA import compute_MDP_tabu
+from MMDP.dropAddTS import solveSubset
+from MMDP.Expand import solveExpand, load_curr_subset
+from MMDP import initSol
+from MMDP.neighbourIndex import neighbour_index
+from MDP.TSMA import solve_MDP_tabu, initialise_headings
+from MDP import TSMA
+from utils.sharedMatrix import SharedMatrix, attach_matrix
+from utils.condensedMatrix import is_condensed
+from utils.progressLog import configure_logging
+from utils import profiler
 
 import matplotlib.pyplot as plt
+import multiprocessing as mp
 import numpy as np
+import queue
+import time
 
 ##################
 
@@ -15,8 +25,8 @@ class CustomFormatter(argparse.RawTextHelpFormatter):
     pass
 
 parser = argparse.ArgumentParser(description="Solve Diversity Problems for protein sequence and structure datasets", formatter_class=CustomFormatter)
-parser.add_argument('-hd', '--heading', help="Path to the heading json file", type=str, required=True)
-parser.add_argument('-d', '--similarity', help="Path to the similarity npy file", type=str, required=True)
+parser.add_argument('-hd', '--heading', help="Path to the heading json file, not needed with a condensed matrix file", type=str, required=False)
+parser.add_argument('-d', '--similarity', help="Path to the similarity npy file, or a condensed matrix file made by init_head_mat.py", type=str, required=True)
 parser.add_argument('-e', '--expand', help="Path to the subset id txt file", type=str, required=False)
 parser.add_argument('-k', '--subset_size', help='Subset size', type=int, required=True)
 parser.add_argument('-s', '--solver', type=int, choices=[0, 1, 2, 3], default=0, required=False,
@@ -31,27 +41,109 @@ parser.add_argument('-m', '--measure', type=int, choices=[0, 1, 2, 3], default=0
                     " 1 - Sequence Pairwise Identity\n"
                     " 2 - Sequence Pairwise Similarity\n"
                     " 3 - Structural Similarity")
+parser.add_argument('-c', '--candidates', type=int, default=10, required=False,
+                    help="Candidate list size for TS-MA swaps, 0 to evaluate every swap (default: 10)")
+parser.add_argument('--population', type=int, default=1, required=False,
+                    help="Population size of the TS-MA memetic algorithm, 1 runs a single tabu search (default: 1)")
+parser.add_argument('--generations', type=int, default=10, required=False,
+                    help="Number of generations of the TS-MA memetic algorithm (default: 10)")
+parser.add_argument('-w', '--workers', type=int, default=1, required=False,
+                    help="Number of worker processes (default: 1)")
+parser.add_argument('-r', '--restarts', type=int, default=1, required=False,
+                    help="Number of independent searches to run, keeping the best (default: 1)")
+parser.add_argument('--seed', type=int, default=None, required=False,
+                    help="Seed for the random number generators, for repeatable runs")
+parser.add_argument('--neighbours', type=int, default=0, required=False,
+                    help="Memory in MB for a sorted neighbour index used by the MaxMin solvers, cached next to the\n"
+                    "similarity npy file, 0 to not use one (default: 0)")
+parser.add_argument('--mmap', action='store_true', required=False,
+                    help="Memory map the similarity npy file copy-on-write instead of reading it into memory. This only\n"
+                    "saves memory for the MaxSum solver, as the MaxMin solvers change every value, use --memory for them")
+parser.add_argument('--memory', type=int, default=None, required=False,
+                    help="Run out of core for a similarity matrix bigger than the memory, reading the matrix file memory\n"
+                    "mapped read-only with a cache of the rows in use of at most this many MB")
+parser.add_argument('-p', '--precision', type=int, choices=[32, 64], default=64, required=False,
+                    help="Floating point precision of the working matrix (default: 64)")
+parser.add_argument('--trace', type=str, choices=['npz', 'csv'], default=None, required=False,
+                    help="Write the values of each search at every step to a trace file of this format next to the\n"
+                    "subset files, one file per search")
+parser.add_argument('--profile', type=str, default=None, required=False,
+                    help="Time each phase of the run, with its peak memory, RSS growth and page faults, and write a JSON report to this file\n"
+                    "Memory allocations are traced, which slows the run down")
+verbosity = parser.add_mutually_exclusive_group()
+verbosity.add_argument('-v', '--verbose', action='store_true', required=False,
+                    help="Log every step of the searches rather than their progress every 1000 steps or 30 seconds")
+verbosity.add_argument('-q', '--quiet', action='store_true', required=False,
+                    help="Only log warnings and errors")
 
 args = parser.parse_args()
-_HEADPATH = args.heading
+if args.heading is None and not is_condensed(args.similarity):
+    parser.error('the heading file (-hd) is needed unless the similarity file is a condensed matrix file')
+
+_HEADPATH = args.heading or args.similarity
 _SIMPATH = args.similarity
 _IDPATH = args.expand
 _K = args.subset_size
 _SOLVER = args.solver
 _MEASURE = args.measure
+_CLS = args.candidates if args.candidates > 0 else None
+_POPULATION = args.population
+_GENERATIONS = args.generations
+_WORKERS = args.workers
+_RESTARTS = args.restarts
+_SEED = args.seed
+_NEIGHBOURS = args.neighbours
+_MMAP = args.mmap
+_MEMORY = args.memory
+_DTYPE = np.float32 if args.precision == 32 else np.float64
+_TRACE = args.trace
+_PROFILE = args.profile
+_VERBOSITY = 1 if args.verbose else -1 if args.quiet else 0
 
 ##################
 
 
 solver_mapping = {0: 'all', 1 : 'mdp', 2 : 'mmd', 3 : 'mmdp'}
+#Each solver takes the distance matrix of its 'matrix' module, the headings, which are only loaded once, and the neighbour index
 solver_method = {
-            1: {'func': lambda: compute_MDP_tabu(_SIMPATH, _HEADPATH, _K), 'prefix': 'mdp_subset'},
-            2: {'func': lambda: expandSubset(_SIMPATH, _HEADPATH, _IDPATH, _K, False) if _IDPATH else computeSubset(_SIMPATH, _HEADPATH, _K, False),
-                'prefix': 'mmd_expand' if _IDPATH else 'mmd_subset'},
-            3: {'func': lambda: expandSubset(_SIMPATH, _HEADPATH, _IDPATH, _K, True) if _IDPATH else computeSubset(_SIMPATH, _HEADPATH, _K, True),
-                'prefix': 'mmdp_expand' if _IDPATH else 'mmdp_subset'}
+            1: {'func': lambda mat, head, index: solve_MDP_tabu(mat, head, _K, _CLS, population=_POPULATION, generations=_GENERATIONS, workers=_WORKERS, seed=_SEED, restarts=_RESTARTS, trace=trace_file(1)),
+                'matrix': 'mdp', 'prefix': 'mdp_subset'},
+            2: {'func': lambda mat, head, index: solveExpand(mat, head, load_curr_subset(_IDPATH, head), _K, False, _SEED, index, trace_file(2)) if _IDPATH else solveSubset(mat, head, _K, False, _RESTARTS, _WORKERS, _SEED, index, trace_file(2)),
+                'matrix': 'mmdp', 'prefix': 'mmd_expand' if _IDPATH else 'mmd_subset'},
+            3: {'func': lambda mat, head, index: solveExpand(mat, head, load_curr_subset(_IDPATH, head), _K, True, _SEED, index, trace_file(3)) if _IDPATH else solveSubset(mat, head, _K, True, _RESTARTS, _WORKERS, _SEED, index, trace_file(3)),
+                'matrix': 'mmdp', 'prefix': 'mmdp_expand' if _IDPATH else 'mmdp_subset'}
         }
 
+#Distance matrix loading and in-place transform of each solver module, and whether its solvers use the neighbour index
+matrix_method = {
+        'mdp': {'load': TSMA.initialise_matrix, 'transform': TSMA.transform_matrix, 'index': False},
+        'mmdp': {'load': initSol.initialise_matrix, 'transform': initSol.transform_matrix, 'index': True}
+    }
+
+
+def trace_file(solver):
+
+    """
+    Get the trace file of a solver, next to its subset files, None if no trace is asked for
+    """
+
+    if _TRACE:
+        return f"{solver_method[solver]['prefix']}_{_K}_trace.{_TRACE}"
+
+    return None
+
+
+def load_index(name, mat):
+
+    """
+    Get the neighbour index for the solvers of a matrix, None if they don't use one or it's not asked for
+    """
+
+    if _NEIGHBOURS and matrix_method[name]['index']:
+        return neighbour_index(_SIMPATH, mat, _NEIGHBOURS)
+
+    return None
+
 measure_mapping = {0: 'all', 1 : 'id', 2 : 'sim', 3 : 'str'}
 measure_method = {
         'id': 'Sequence Identity',
@@ -90,15 +182,103 @@ def plot_res(sim_list, solver_title, measure_title):
     plt.close()
 
 
+def _solver_process(solver, spec, head, index, results):
+
+    """
+    Run one solver in a worker process on a distance matrix in shared memory, or read through its own accessor
+    """
+
+    #Start the phase stats of this process afresh, as it was forked with those of the main process
+    profiler.collect()
+
+    mat = attach_matrix(spec)
+    output = solver_method[solver]['func'](mat, head, index)
+    results.put((solver, output, profiler.collect()))
+
+
+def run_solvers(solvers, head):
+
+    """
+    Run the chosen solvers and return their results by solver
+    A single solver is run here on its own loaded matrix. Several solvers run at the same time in their own processes, with
+    the similarity matrix read from disk once and each distance matrix transformed once into shared memory
+    A condensed matrix file, or any matrix file when run out of core, is memory mapped by each process instead, through
+    its own accessor
+    """
+
+    if len(solvers) == 1:
+        solver = solvers[0]
+        name = solver_method[solver]['matrix']
+        mat = matrix_method[name]['load'](_SIMPATH, _MMAP, _DTYPE, memory=_MEMORY)
+        return {solver: solver_method[solver]['func'](mat, head, load_index(name, mat))}
+
+    accessor = _MEMORY is not None or is_condensed(_SIMPATH)
+    similarity_matrix = None if accessor else np.load(_SIMPATH, mmap_mode='r')
+    shared = {}
+    specs = {}
+    indices = {}
+    procs = {}
+    outputs = {}
+    results = mp.Queue()
+
+    try:
+        for solver in solvers:
+            name = solver_method[solver]['matrix']
+            if name not in specs:
+                if accessor:
+                    specs[name] = matrix_method[name]['load'](_SIMPATH, _MMAP, _DTYPE, memory=_MEMORY)
+                    indices[name] = load_index(name, specs[name])
+                else:
+                    with profiler.phase('load'):
+                        shared[name] = SharedMatrix(similarity_matrix, _DTYPE)
+                    matrix_method[name]['transform'](shared[name].array)
+                    specs[name] = shared[name].spec
+                    indices[name] = load_index(name, shared[name].array)
+
+            procs[solver] = mp.Process(target=_solver_process, args=(solver, specs[name], head, indices[name], results))
+            procs[solver].start()
+
+        #Collect results before joining, so no process is left blocked on a full queue
+        while len(outputs) < len(procs):
+            try:
+                solver, output, stats = results.get(timeout=1)
+                outputs[solver] = output
+                profiler.merge(stats)
+            except queue.Empty:
+                failed = [s for s, p in procs.items() if s not in outputs and p.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Solver {solver_mapping[failed[0]]} exited with code {procs[failed[0]].exitcode}")
+
+    finally:
+        for proc in procs.values():
+            if proc.is_alive() and len(outputs) < len(procs):
+                proc.terminate()
+            proc.join()
+        for block in shared.values():
+            block.close()
+
+    return outputs
+
+
 def main():
 
+    configure_logging(_VERBOSITY)
+    start = time.perf_counter()
+
+    if _PROFILE:
+        profiler.enable()
+
     if _K != 0:
 
+        head = initialise_headings(_HEADPATH)
+        solvers = [solver for solver in solver_method if _SOLVER == 0 or _SOLVER == solver]
+        outputs = run_solvers(solvers, head)
+
         for solver, details in solver_method.items():
 
             #Map modes to solver functions
-            if _SOLVER == 0 or _SOLVER == solver:
-                headings, sim_list = details['func']()
+            if solver in outputs:
+                headings, sim_list = outputs[solver]
                 data_to_write = headings
 
                 for mode, measure in measure_mapping.items():
@@ -113,6 +293,9 @@ def main():
 
                         plot_res(sim_list, solver_mapping[solver], measure)
 
+    if _PROFILE:
+        profiler.report(_PROFILE, time.perf_counter() - start)
+
 
 if __name__ == '__main__':
     main()
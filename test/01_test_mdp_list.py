@@ -1,25 +1,55 @@
 
 import unittest
 from collections import deque
+import numpy as np
 
 from MDP.tabuList import TabuList
 from MDP.Move import Move
 
 
+class _DequeList:
+
+    #The tabu list as it was kept before, a deque of [element, tenure] pairs, to check TabuList against
+    def __init__(self, list_len, max_tenure):
+        self.tabu_list = deque(maxlen=list_len)
+        self.element_list = deque(maxlen=list_len)
+        self.max_tenure = max_tenure
+
+    def append(self, path):
+        new = [elem for elem in path if elem not in self.element_list]
+        for elem in path:
+            if elem in self.element_list:
+                self.tabu_list[self.element_list.index(elem)][1] = 0
+        for elem in new:
+            self.tabu_list.append([elem, 0])
+            self.element_list.append(elem)
+
+    def increment(self):
+        for tabu in self.tabu_list:
+            tabu[1] += 1
+
+    def remove_expired(self):
+        for tabu in list(self.tabu_list):
+            if tabu[1] > self.max_tenure:
+                self.tabu_list.remove(tabu)
+                self.element_list.remove(tabu[0])
+
+
 class TestList(unittest.TestCase):
 
     def setUp(self):
 
         self.list = TabuList(3,1)
 
-        self.assertEqual(len(self.list.tabu_list), 0)
-        self.assertEqual(len(self.list.element_list), 0)
+        self.assertEqual(len(self.list), 0)
+        self.assertEqual(self.list.element_list, [])
         self.assertEqual(self.list._max_tenure, 1)
 
 
     def test_tabu_move(self):
-        
-        self.list.element_list = deque([1,2,4], maxlen=3)
+
+        self.list.append_tabu_list([1,2])
+        self.list.append_tabu_list([4,1])
         move_1 = Move([2,3,4], [2,3,1], [1,4])
         move_2 = Move([1,2,4], [2,3,4], [2,3])
         move_3 = Move([2,3,4], [2,4,5], [3,5])
@@ -28,53 +58,88 @@ class TestList(unittest.TestCase):
         self.assertTrue(self.list.is_move_tabu(move_2))
         self.assertFalse(self.list.is_move_tabu(move_3))
 
+        #Check the tabu state of many elements at once
+        self.assertEqual(self.list.is_tabu(np.arange(6)).tolist(), [False, True, True, False, True, False])
+
 
     def test_append(self):
 
-        self.list.tabu_list = deque([[2,0]], maxlen=3)
-        self.list.element_list = deque([2], maxlen=3)
-        
-        #Check if move is appended
-        self.list.append_tabu_list([1,4])
-        self.assertEqual(len(self.list.tabu_list), 3)
-        self.assertEqual(len(self.list.element_list), 3)
-        self.assertEqual(self.list.tabu_list, deque([[2,0], [1,0], [4,0]], maxlen=3))
-        self.assertEqual(self.list.element_list, deque([2,1,4], maxlen=3))
+        self.list.append_tabu_list([2,0])
+        self.list.remove_expired_tabus()
+        self.assertEqual(self.list.element_list, [2,0])
+
+        #Check if move is appended, and elements already on the list keep their place
+        self.list.append_tabu_list([1,0])
+        self.assertEqual(len(self.list), 3)
+        self.assertEqual(self.list.element_list, [2,0,1])
 
         #Check if list is kept at maxlen
         self.list.append_tabu_list([1,3])
-        self.assertEqual(len(self.list.tabu_list), 3)
-        self.assertEqual(len(self.list.element_list), 3)
-        self.assertEqual(self.list.tabu_list, deque([[1,0], [4,0], [3,0]], maxlen=3))
-        self.assertEqual(self.list.element_list, deque([1,4,3], maxlen=3))
+        self.assertEqual(len(self.list), 3)
+        self.assertEqual(self.list.element_list, [0,1,3])
+        self.assertFalse(self.list.is_tabu([2])[0])
 
         #Check if tabu can be appended again
-        self.list.append_tabu_list([3,4])
-        self.assertEqual(len(self.list.tabu_list), 3)
-        self.assertEqual(len(self.list.element_list), 3)
-        self.assertEqual(self.list.tabu_list, deque([[1,0], [4,0], [3,0]], maxlen=3))
-        self.assertEqual(self.list.element_list, deque([1,4,3], maxlen=3))
+        self.list.append_tabu_list([3,1])
+        self.assertEqual(len(self.list), 3)
+        self.assertEqual(self.list.element_list, [0,1,3])
+
 
-    
     def test_increment(self):
 
-        self.list.tabu_list = deque([[2,1], [1,1], [4,0]], maxlen=3)
-        self.list.element_list = deque([2,1,4], maxlen=3)
+        self.list.append_tabu_list([2,1])
+        self.list.increment_tabu_tenure()
+        self.list.append_tabu_list([4,1])
         self.list.increment_tabu_tenure()
 
-        self.assertEqual(len(self.list.tabu_list), 3)
-        self.assertEqual(len(self.list.element_list), 3)
-        self.assertEqual(self.list.tabu_list, deque([[2,2], [1,2], [4,1]], maxlen=3))
-        self.assertEqual(self.list.element_list, deque([2,1,4], maxlen=3))
+        #Check tenures are counted from the step each element was last made tabu, and that an element stays tabu until it
+        #is taken off the list once its tenure is over
+        self.assertEqual(self.list.step, 2)
+        self.assertEqual(self.list.tabu_until[[1,2,4]].tolist(), [3,2,3])
+        self.assertEqual(self.list.is_tabu([1,2,4]).tolist(), [True, True, True])
+
+        self.list.remove_expired_tabus()
+        self.assertEqual(self.list.is_tabu([1,2,4]).tolist(), [True, False, True])
+        self.assertEqual(self.list.element_list, [1,4])
 
 
     def test_remove(self):
 
-        self.list.tabu_list = deque([[2,2], [1,1], [4,0]], maxlen=3)
-        self.list.element_list = deque([2,1,4], maxlen=3)
+        self.list.append_tabu_list([2,1])
+        self.list.increment_tabu_tenure()
+        self.list.append_tabu_list([1,4])
+        self.list.increment_tabu_tenure()
         self.list.remove_expired_tabus()
 
-        self.assertEqual(len(self.list.tabu_list), 2)
-        self.assertEqual(len(self.list.element_list), 2)
-        self.assertEqual(self.list.tabu_list, deque([[1,1], [4,0]], maxlen=3))
-        self.assertEqual(self.list.element_list, deque([1,4], maxlen=3))
+        self.assertEqual(len(self.list), 2)
+        self.assertEqual(self.list.element_list, [1,4])
+
+        #Check an expired element can be made tabu again
+        self.list.append_tabu_list([2,3])
+        self.assertEqual(self.list.element_list, [4,2,3])
+
+
+    def test_old_list(self):
+
+        #Check the list gives the same tabu states as the deque it replaced, in the order the search uses it, for lists
+        #longer and shorter than the tenure
+        rng = np.random.default_rng(0)
+
+        for list_len, max_tenure in [(40, 3), (4, 4), (3, 10)]:
+            tabu_list = TabuList(list_len, max_tenure, 50)
+            old = _DequeList(list_len, max_tenure)
+
+            for _ in range(300):
+                mask = tabu_list.is_tabu(np.arange(50))
+                self.assertEqual(np.flatnonzero(mask).tolist(), sorted(old.element_list))
+
+                tabu_list.remove_expired_tabus()
+                old.remove_expired()
+                self.assertEqual(tabu_list.element_list, list(old.element_list))
+                self.assertEqual(len(tabu_list), len(old.element_list))
+
+                path = rng.choice(50, 2, replace=False).tolist()
+                tabu_list.append_tabu_list(path)
+                old.append(path)
+                tabu_list.increment_tabu_tenure()
+                old.increment()
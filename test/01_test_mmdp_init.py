@@ -55,6 +55,19 @@ class TestInitSol(unittest.TestCase):
         self.assertAlmostEqual(dist_mat[3, 1], 0.3)
 
 
+    def test_initialise_matrix_mmap(self):
+
+        #Test memory mapped loading at single precision
+        dist_mat = initialise_matrix(self.sim_file, mmap=True, dtype=np.float32)
+
+        self.assertEqual(dist_mat.dtype, np.float32)
+        self.assertEqual(dist_mat[3, 3], 0)
+        self.assertAlmostEqual(dist_mat[1, 2], 0.4, places=6)
+
+        #Check the file on disk is left unchanged
+        self.assertEqual(np.load(self.sim_file)[1, 2], 0.6)
+
+
     def test_initialise_headings(self):
 
         #Test headings initialization
@@ -96,4 +109,22 @@ class TestInitSol(unittest.TestCase):
 
         self.assertNotEqual(sol_with_bi, sol_without_bi)
 
-    
\ No newline at end of file
+
+    def test_farthest_first(self):
+
+        #Check each added element is the furthest from the solution, with ties broken by sum and then by index
+        rng = np.random.default_rng(0)
+        dist_mat = np.round(rng.random((40, 40)), 1)
+        dist_mat = (dist_mat + dist_mat.T) / 2
+        np.fill_diagonal(dist_mat, 0)
+
+        for bilevel in [False, True]:
+            solution, iter_values, iterations = farthest_first(dist_mat, [3, 17], 10, bilevel, [0] * 40, 1)
+            self.assertEqual(solution[:2], [3, 17])
+            self.assertEqual(iterations, 9)
+
+            for k in range(2, 10):
+                options = [i for i in range(40) if i not in solution[:k]]
+                key = lambda i: (dist_mat[i, solution[:k]].min(), dist_mat[i, solution[:k]].sum() if bilevel else 0, -i)
+                self.assertEqual(solution[k], max(options, key=key))
+                self.assertEqual(iter_values[solution[k]], k - 1)
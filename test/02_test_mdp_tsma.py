@@ -39,7 +39,7 @@ class TestTSMA(unittest.TestCase):
 
         self.val = [0, 1, 1, 0, 1]
         self.sol = Solution(self.val)
-        self.delta = [0.122, 2.05, 100.295, -6.833, 99.745]
+        self.delta = np.array([0.122, 2.05, 100.295, -6.833, 99.745])
         self.dist_mat =  np.array([
             [0, 0.2, 0.4, 0.3, 0.1],
             [0.2, 0, 0.6, 0.7, 0.5],
@@ -75,6 +75,19 @@ class TestTSMA(unittest.TestCase):
         self.assertAlmostEqual(dist_mat[3, 1], 0.7)
 
 
+    def test_initialise_matrix_mmap(self):
+
+        #Test memory mapped loading at single precision
+        dist_mat = initialise_matrix(self.sim_file, mmap=True, dtype=np.float32)
+
+        self.assertEqual(dist_mat.dtype, np.float32)
+        self.assertTrue(np.isnan(dist_mat[2, 2]))
+        self.assertAlmostEqual(dist_mat[2, 4], 0.99, places=6)
+
+        #Check the file on disk is left unchanged
+        self.assertEqual(np.load(self.sim_file)[2, 4], 1.0)
+
+
     def test_initialise_headings(self):
 
         #Test headings initialization
@@ -111,6 +124,46 @@ class TestTSMA(unittest.TestCase):
         self.assertAlmostEqual(delta[1], 2.05)
 
 
+    def test_delta_matches_loop(self):
+
+        #Reference delta from the pairwise loops the matrix product replaces
+        def loop_delta(mat, sol):
+            delta = [0] * len(sol.val)
+            for i in sol.members:
+                for j in sol.members:
+                    if i != j and mat[i, j] != 1:
+                        delta[i] += (- (1 - mat[i, j]))*0.5 + (mat[i, j]/(1 - mat[i, j]))
+            for i in sol.non_members:
+                for j in sol.members:
+                    if i != j and mat[i, j] != 1:
+                        delta[i] += ((1 - mat[i, j]))*0.5 - (mat[i, j]/(1 - mat[i, j]))
+            return delta
+
+        #Test on the distance matrix, the loaded matrix with nan diagonal, and the raw matrix with values of 1
+        for mat in [self.dist_mat, initialise_matrix(self.sim_file), self.sim_mat]:
+            for val in [self.val, [1, 0, 1, 1, 0], [0, 0, 1, 0, 1]]:
+                sol = Solution(val)
+                np.testing.assert_allclose(initialise_delta(mat, sol), loop_delta(mat, sol), rtol=1e-12)
+
+
+    def test_solution_swap(self):
+
+        #Test the member and non-member indices are kept in step with val through a swap
+        sol = Solution(self.val)
+        sol.swap(2, 0)
+        self.assertEqual(sol.val.tolist(), [1,1,0,0,1])
+        self.assertEqual(sorted(sol.members.tolist()), [0,1,4])
+        self.assertEqual(sorted(sol.non_members.tolist()), [2,3])
+        for i in range(self.super_size):
+            indices = sol.members if sol.val[i] == 1 else sol.non_members
+            self.assertEqual(indices[sol.pos[i]], i)
+
+        #Test copies are independent of the original
+        best = sol.copy()
+        sol.swap(4, 3)
+        self.assertEqual(best.val.tolist(), [1,1,0,0,1])
+
+
     def test_sep_ind(self):
 
         #Test if indices can be separated correctly
@@ -129,25 +182,63 @@ class TestTSMA(unittest.TestCase):
         self.assertAlmostEqual(sim_list, [0.6, 0.5, 0.99])
 
 
+    def test_swap_fitness(self):
+
+        #Test fitness carried forward through a swap matches rescoring the new solution
+        test = MEnzDPTabuSearch(self.sol, self.subset_size, self.subset_size, 200, 10, opt_tuple=[self.dist_mat, self.delta])
+        self.assertAlmostEqual(self.sol.fitness, -100.59)
+
+        fitness = test._swap_fitness(self.sol, 2, 0)
+        self.assertAlmostEqual(fitness, test._score(Solution([1,1,0,0,1])))
+
+        #Test the contributions are kept up to date after the swap
+        move = Move(self.sol, None, [2,0], fitness)
+        test._apply_move(move)
+        test._post_swap_change(move)
+        self.assertAlmostEqual(test._swap_fitness(self.sol, 4, 3), test._score(Solution([1,1,0,1,0])))
+
+
     def test_neighbourhood(self):
 
         #Test neighbourhood creation
         test = MEnzDPTabuSearch(self.sol, self.subset_size, self.subset_size, 200, 10, opt_tuple=[self.dist_mat, self.delta])
         neighbourhood = test._create_neighbourhood()
 
-        self.assertEqual(len(neighbourhood), 6)
-        self.assertAlmostEqual(neighbourhood[0].path, [2,0])
-        self.assertAlmostEqual(neighbourhood[0].new_sol.val, [1,1,0,0,1])
-        self.assertAlmostEqual(neighbourhood[1].path, [4,0])
-        self.assertAlmostEqual(neighbourhood[1].new_sol.val, [1,1,1,0,0])
+        self.assertEqual(len(neighbourhood), 2)
+        self.assertEqual(neighbourhood[0].path, [2,0])
+        self.assertAlmostEqual(neighbourhood[0].fitness, test._score(Solution([1,1,0,0,1])))
+        self.assertEqual(neighbourhood[1].path, [2,0])
+
+        #Check tabu elements are masked out of the second move
+        test.tabu_list.append_tabu_list([2,0])
+        neighbourhood = test._create_neighbourhood()
+        self.assertEqual(neighbourhood[0].path, [2,0])
+        self.assertEqual(neighbourhood[1].path, [4,3])
+        self.assertAlmostEqual(neighbourhood[1].fitness, test._score(Solution([0,1,1,1,0])))
+
+        #Check the candidate lists can be cut down, and the full block is used without them
+        test.cls_num = 1
+        self.assertEqual(test._create_neighbourhood()[0].path, [2,0])
+        test.cls_num = None
+        self.assertEqual(test._create_neighbourhood()[0].path, [2,0])
+
+
+    def test_candidate_list(self):
+
+        #Check candidate lists are sorted by delta and then index, with ties at the cut settled by the biggest indices
+        delta = np.array([0.5, 0.1, 0.5, 0.9, 0.5, 0.2])
+        indices = np.arange(6)
+        self.assertEqual(candidate_list(indices, delta, 3).tolist(), [3, 4, 2])
+        self.assertEqual(candidate_list(indices, delta, 10).tolist(), [3, 4, 2, 0, 5, 1])
+        self.assertEqual(candidate_list(indices, delta, None).tolist(), [3, 4, 2, 0, 5, 1])
 
 
     def test_post_swap(self):
 
         #Test post swap changes
         test = MEnzDPTabuSearch(self.sol, self.subset_size, self.subset_size, 200, 10, opt_tuple=[self.dist_mat, self.delta])
-        new_sol = Solution([1,1,0,0,1])
-        move = Move(self.sol, new_sol, [2,0])
+        move = Move(self.sol, None, [2,0])
+        self.sol.swap(2, 0)
         test._post_swap_change(move)
 
         self.assertAlmostEqual(round(self.delta[0],3), -0.189)
@@ -1,7 +1,7 @@
 
 import unittest
 import numpy as np
-from collections import deque
+from collections import OrderedDict
 
 from MMDP.statsUpdate import *
 
@@ -26,9 +26,9 @@ class TestStatsUpdate(unittest.TestCase):
         min_dist, sum_dist, min_dist_count = initialise_stats(self.sim_mat, solution)
 
         #Check size of the stat lists
-        self.assertEqual(len(min_dist.keys()), len(self.sim_mat))
-        self.assertEqual(len(sum_dist.keys()), len(self.sim_mat))
-        self.assertEqual(len(min_dist_count.keys()), len(self.sim_mat))
+        self.assertEqual(len(min_dist), len(self.sim_mat))
+        self.assertEqual(len(sum_dist), len(self.sim_mat))
+        self.assertEqual(len(min_dist_count), len(self.sim_mat))
 
         #Check a few values to ensure the function works correctly
         self.assertAlmostEqual(min_dist[0], 0.1)
@@ -40,15 +40,15 @@ class TestStatsUpdate(unittest.TestCase):
 
         solution = [2, 4, 1]
         drop_elem = 2
-        min_dist = {0: 0.1, 1: 0.5, 2: 0.6, 3: 0.3, 4: 0.5}
-        sum_dist = {0: 0.7, 1: 1.1, 2: 1.5, 3: 1.4, 4: 1.4}
-        min_dist_count = {0: 1, 1: 1, 2: 1, 3: 2, 4: 1}
+        min_dist = np.array([0.1, 0.5, 0.6, 0.3, 0.5])
+        sum_dist = np.array([0.7, 1.1, 1.5, 1.4, 1.4])
+        min_dist_count = np.array([1, 1, 1, 2, 1])
         drop_min_dist, drop_sum_dist, drop_min_dist_count = drop_update(self.sim_mat, solution, min_dist, sum_dist, min_dist_count, drop_elem)
 
         #Check size of the stat lists
-        self.assertEqual(len(drop_min_dist.keys()), len(self.sim_mat))
-        self.assertEqual(len(drop_sum_dist.keys()), len(self.sim_mat))
-        self.assertEqual(len(drop_min_dist_count.keys()), len(self.sim_mat))
+        self.assertEqual(len(drop_min_dist), len(self.sim_mat))
+        self.assertEqual(len(drop_sum_dist), len(self.sim_mat))
+        self.assertEqual(len(drop_min_dist_count), len(self.sim_mat))
 
         #Check a few values to ensure the function works correctly
         self.assertAlmostEqual(drop_min_dist[0], 0.1)
@@ -59,15 +59,15 @@ class TestStatsUpdate(unittest.TestCase):
     def test_add_update(self):
 
         add_elem = 3
-        min_dist = {0: 0.1, 1: 0.5, 2: 0.6, 3: 0.3, 4: 0.5}
-        sum_dist = {0: 0.3, 1: 0.5, 2: 1.5, 3: 1.1, 4: 0.5}
-        min_dist_count = {0: 1, 1: 1, 2: 1, 3: 1, 4: 1}
+        min_dist = np.array([0.1, 0.5, 0.6, 0.3, 0.5])
+        sum_dist = np.array([0.3, 0.5, 1.5, 1.1, 0.5])
+        min_dist_count = np.array([1, 1, 1, 1, 1])
         add_min_dist, add_sum_dist, add_min_dist_count = add_update(self.sim_mat, min_dist, sum_dist, min_dist_count, add_elem)
 
         #Check size of the stat lists
-        self.assertEqual(len(add_min_dist.keys()), len(self.sim_mat))
-        self.assertEqual(len(add_sum_dist.keys()), len(self.sim_mat))
-        self.assertEqual(len(add_min_dist_count.keys()), len(self.sim_mat))
+        self.assertEqual(len(add_min_dist), len(self.sim_mat))
+        self.assertEqual(len(add_sum_dist), len(self.sim_mat))
+        self.assertEqual(len(add_min_dist_count), len(self.sim_mat))
 
         #Check a few values to ensure the function works correctly
         self.assertAlmostEqual(add_min_dist[0], 0.1)
@@ -79,7 +79,7 @@ class TestStatsUpdate(unittest.TestCase):
 
         #Check if function drops the oldest element
         solution = [2, 4, 1]
-        min_dist = {0: 0.1, 1: 0.5, 2: 0.6, 3: 0.3, 4: 0.5}
+        min_dist = np.array([0.1, 0.5, 0.6, 0.3, 0.5])
         min_options = {3: 0.3, 0: 0.1}
         iter_values = [0, 3, 1, 0, 2]
 
@@ -88,11 +88,24 @@ class TestStatsUpdate(unittest.TestCase):
         self.assertEqual(sort_options, min_options)
 
 
+    def test_top_options(self):
+
+        #Check the options are the same as a stable sort of all of them, including ties at the cut
+        rng = np.random.default_rng(0)
+        min_dist = np.round(rng.random(200), 1)
+        solution = list(rng.choice(200, 20, replace=False))
+        options = [i for i in range(200) if i not in solution]
+
+        for cls in [1, 7, 50, 180]:
+            expected = sorted(options, key=lambda i: min_dist[i], reverse=True)[:cls]
+            self.assertEqual(top_options(min_dist, solution, cls).tolist(), expected)
+
+
     def test_search_add_elem(self):
 
         solution = [2, 4]
         sort_options = {1: 0.3, 3: 0.3}
-        sum_dist = {0: 0.3, 1: 0.5, 2: 1.5, 3: 1.1, 4: 0.5}
+        sum_dist = np.array([0.3, 0.5, 1.5, 1.1, 0.5])
 
         #Check if bilevel is interpreted correctly
         add_elem_1 = search_add_elem(sort_options, sum_dist, solution, bilevel=False)
@@ -104,8 +117,8 @@ class TestStatsUpdate(unittest.TestCase):
 
     def test_obj_values(self):
 
-        min_dist = {0: 0.1, 1: 0.5, 2: 0.6, 3: 0.3, 4: 0.5}
-        sum_dist = {0: 0.7, 1: 1.1, 2: 1.5, 3: 1.4, 4: 1.4}
+        min_dist = np.array([0.1, 0.5, 0.6, 0.3, 0.5])
+        sum_dist = np.array([0.7, 1.1, 1.5, 1.4, 1.4])
         solution = [2, 4, 1]
         min_pair, sum_pair = obj_values(min_dist, sum_dist, solution)
 
@@ -113,6 +126,45 @@ class TestStatsUpdate(unittest.TestCase):
         self.assertEqual(min_pair, 0.5)
         self.assertAlmostEqual(sum_pair, 2)
 
+
+    def test_trial_values(self):
+
+        #Check every trial move gives the same values as updating the stats and scoring the new solution
+        solution = [2, 4]
+        for add_elem in [0, 1, 3]:
+            min_dist, sum_dist, min_dist_count = initialise_stats(self.sim_mat, solution)
+            trial = trial_values(self.sim_mat, min_dist, sum_dist, solution, add_elem)
+
+            add_min_dist, add_sum_dist, _ = add_update(self.sim_mat, min_dist, sum_dist, min_dist_count, add_elem)
+            self.assertEqual(trial, obj_values(add_min_dist, add_sum_dist, solution + [add_elem]))
+
+
+    def test_obj_tracker(self):
+
+        #Check the tracked objective values follow the solution through drops and adds
+        solution = [1, 2, 4]
+        min_dist, sum_dist, min_dist_count = initialise_stats(self.sim_mat, solution)
+        objective = objTracker(min_dist, sum_dist, solution)
+        self.assertEqual(objective.values(min_dist), obj_values(min_dist, sum_dist, solution))
+
+        for drop_elem, add_elem in [(2, 3), (1, 0), (4, 2), (3, 4)]:
+            drop_update(self.sim_mat, solution, min_dist, sum_dist, min_dist_count, drop_elem, objective=objective)
+            solution = [i for i in solution if i != drop_elem]
+
+            #Check trial moves are scored without changing the tracked values
+            for trial_elem in set(range(5)) - set(solution):
+                trial_min, trial_sum = objective.trial(min_dist, sum_dist, trial_elem)
+                expected_min, expected_sum = trial_values(self.sim_mat, min_dist, sum_dist, solution, trial_elem)
+                self.assertEqual(trial_min, expected_min)
+                self.assertAlmostEqual(trial_sum, expected_sum)
+
+            add_update(self.sim_mat, min_dist, sum_dist, min_dist_count, add_elem, objective=objective)
+            solution = solution + [add_elem]
+
+            min_pair, sum_pair = objective.values(min_dist)
+            self.assertEqual(min_pair, obj_values(min_dist, sum_dist, solution)[0])
+            self.assertAlmostEqual(sum_pair, obj_values(min_dist, sum_dist, solution)[1])
+
     
     def test_adaptive(self):
 
@@ -143,13 +195,13 @@ class TestStatsUpdate(unittest.TestCase):
 
         sort_options = {1: 0.3, 3: 0.3}
         drop_elem = 1
-        tabu_list = deque([[(1,2), 4], [(1,4), 3], [(4,5), 0]], maxlen=3)
+        tabu_list = OrderedDict([((1,2), 0), ((1,4), 1), ((4,5), 4)])
         add_elem = aspiration_by_default(sort_options, drop_elem, tabu_list)
         self.assertEqual(add_elem, 2)
 
         sort_options = {1: 0.3, 3: 0.3}
         drop_elem = 4
-        tabu_list = deque([[(1,2), 4], [(1,4), 3], [(4,5), 0]], maxlen=3)
+        tabu_list = OrderedDict([((1,2), 0), ((1,4), 1), ((4,5), 4)])
         add_elem = aspiration_by_default(sort_options, drop_elem, tabu_list)
         self.assertEqual(add_elem, 1)
 
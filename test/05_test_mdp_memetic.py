@@ -0,0 +1,97 @@
+import unittest
+import numpy as np
+
+from MDP.TSMA import *
+from MDP.Solution import Solution
+from utils.sharedMatrix import SharedMatrix, MatrixPool, attach_matrix, shared_spec
+
+
+def _row_sum(mat, task):
+    return float(np.nansum(mat[task]))
+
+
+class TestMemetic(unittest.TestCase):
+
+    def setUp(self):
+
+        #Create a random symmetric similarity matrix with nan diagonal, as given by initialise_matrix
+        rng = np.random.default_rng(0)
+        sim_mat = rng.random((30, 30)) * 0.9
+        self.mat = (sim_mat + sim_mat.T) / 2
+        np.fill_diagonal(self.mat, np.nan)
+        self.k = 6
+
+
+    def test_shared_matrix(self):
+
+        #Check the matrix read back from shared memory is the same as the one put in
+        with SharedMatrix(self.mat) as shared:
+            np.testing.assert_array_equal(attach_matrix(shared.spec), self.mat)
+
+        #Check tasks give the same results in a worker pool as in process
+        with MatrixPool(self.mat, 2, _row_sum) as pool:
+            pooled = pool.map([0, 1, 2])
+        with MatrixPool(self.mat, 1, _row_sum) as pool:
+            self.assertEqual(pool.map([0, 1, 2]), pooled)
+
+        #Check a matrix already in shared memory is given to the workers as is, at the precision it was shared at
+        with SharedMatrix(self.mat, np.float32) as shared:
+            self.assertEqual(shared.array.dtype, np.float32)
+            self.assertEqual(shared_spec(shared.array), shared.spec)
+            self.assertIsNone(shared_spec(self.mat))
+            with MatrixPool(shared.array, 2, _row_sum) as pool:
+                self.assertIsNone(pool.shared)
+                np.testing.assert_allclose(pool.map([0, 1, 2]), pooled, rtol=1e-6)
+
+
+    def test_crossover(self):
+
+        parent_a = Solution([1, 1, 1, 1, 0, 0, 0, 0])
+        parent_b = Solution([0, 1, 1, 0, 1, 1, 0, 0])
+        child = backbone_crossover(parent_a, parent_b, 4, np.random.default_rng(1))
+
+        #Check the backbone is kept and the rest comes from the parents
+        self.assertEqual(len(child.members), 4)
+        self.assertTrue(child.val[1] and child.val[2])
+        self.assertEqual(child.val[6] + child.val[7], 0)
+        self.assertEqual(child.val[0] + child.val[3], 1)
+        self.assertEqual(child.val[4] + child.val[5], 1)
+
+
+    def test_update_population(self):
+
+        population = [Solution([1, 1, 0, 0, 0], 1.0), Solution([0, 0, 1, 1, 0], 2.0)]
+
+        #Check a child already in the population is not added
+        self.assertIs(update_population(population, Solution([1, 1, 0, 0, 0], 1.0), 2), population)
+
+        #Check the population size is kept and the poorer close individual is dropped
+        new_pop = update_population(population, Solution([1, 0, 1, 0, 0], 0.5), 2)
+        self.assertEqual(len(new_pop), 2)
+        self.assertEqual([sol.fitness for sol in new_pop], [1.0, 2.0])
+
+
+    def test_memetic_search(self):
+
+        #Check the memetic search returns a valid solution with the right fitness, using worker processes
+        best = memetic_search(self.mat, self.k, 3, 2, workers=2, seed=0, max_steps=50, max_wait=20)
+        self.assertEqual(len(best.members), self.k)
+
+        search = MEnzDPTabuSearch(best.copy(), self.k, self.k, 1, opt_tuple=[self.mat, initialise_delta(self.mat, best)])
+        self.assertAlmostEqual(best.fitness, search._score(best))
+
+        #Check the same seed gives the same result
+        again = memetic_search(self.mat, self.k, 3, 2, workers=2, seed=0, max_steps=50, max_wait=20)
+        self.assertEqual(sorted(again.members.tolist()), sorted(best.members.tolist()))
+
+
+    def test_multi_start(self):
+
+        #Check the best of the restarts is returned, and the same seed gives the same result with or without workers
+        best = multi_start(self.mat, self.k, 3, workers=2, seed=1, max_steps=50, max_wait=20)
+        again = multi_start(self.mat, self.k, 3, workers=1, seed=1, max_steps=50, max_wait=20)
+        self.assertEqual(sorted(again.members.tolist()), sorted(best.members.tolist()))
+        self.assertAlmostEqual(again.fitness, best.fitness)
+
+        single = multi_start(self.mat, self.k, 1, seed=1, max_steps=50, max_wait=20)
+        self.assertGreaterEqual(best.fitness, single.fitness)
@@ -0,0 +1,39 @@
+import unittest, io, contextlib
+import numpy as np
+
+from MMDP.dropAddTS import multi_start
+from MMDP.statsUpdate import obj_values, initialise_stats
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+
+        #Create a random symmetric distance matrix with 0 diagonal, as given by initialise_matrix
+        rng = np.random.default_rng(0)
+        dist_mat = rng.random((20, 20))
+        self.dist_mat = (dist_mat + dist_mat.T) / 2
+        np.fill_diagonal(self.dist_mat, 0)
+        self.subset_size = 5
+
+
+    def test_multi_start(self):
+
+        for bilevel in [False, True]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                best = multi_start(self.dist_mat, self.subset_size, bilevel, restarts=3, workers=2, seed=1)
+                again = multi_start(self.dist_mat, self.subset_size, bilevel, restarts=3, workers=1, seed=1)
+                single = multi_start(self.dist_mat, self.subset_size, bilevel, restarts=1, seed=1)
+
+            #Check the same seed gives the same result with or without workers
+            self.assertEqual(best, again)
+
+            #Check the returned objective values belong to the returned solution
+            solution, best_min, best_sum = best
+            self.assertEqual(len(solution), self.subset_size)
+            min_pair, sum_pair = obj_values(*initialise_stats(self.dist_mat, solution)[:2], solution)
+            self.assertAlmostEqual(best_min, min_pair)
+            self.assertAlmostEqual(best_sum, sum_pair)
+
+            #Check the best of the restarts is kept
+            self.assertGreaterEqual(best_min, single[1])
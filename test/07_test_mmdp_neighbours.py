@@ -0,0 +1,123 @@
+import unittest, io, contextlib, os, tempfile, json
+import numpy as np
+
+from MMDP.neighbourIndex import build_neighbour_index, neighbour_index, NeighbourCursor
+from MMDP.statsUpdate import initialise_stats, drop_update, add_update
+from MMDP.dropAddTS import multi_start
+from MMDP.initSol import initialise_matrix
+from utils.condensedMatrix import write_condensed
+
+
+class TestNeighbours(unittest.TestCase):
+
+    def setUp(self):
+
+        #Create a random symmetric distance matrix with 0 diagonal and many tied distances
+        rng = np.random.default_rng(0)
+        dist_mat = np.round(rng.random((30, 30)), 1)
+        self.dist_mat = (dist_mat + dist_mat.T) / 2
+        np.fill_diagonal(self.dist_mat, 0)
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.sim_file = os.path.join(self.temp_dir, 'sim_mat.npy')
+        np.save(self.sim_file, 1 - self.dist_mat)
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_build_index(self):
+
+        order = build_neighbour_index(self.dist_mat, 10, block_size=7)
+
+        #Check each row holds the nearest neighbours in order, leaving out the element itself
+        self.assertEqual(order.shape, (30, 10))
+        self.assertEqual(order.dtype, np.int32)
+        for i in range(30):
+            self.assertNotIn(i, order[i])
+            dist = self.dist_mat[i, order[i]]
+            self.assertTrue(np.all(np.diff(dist) >= 0))
+            self.assertEqual(dist[-1], np.sort(np.delete(self.dist_mat[i], i))[9])
+
+
+    def test_cache(self):
+
+        #Check the index is saved next to the matrix file and reused
+        index_file = neighbour_index(self.sim_file, self.dist_mat, memory=1)
+        self.assertEqual(index_file, os.path.join(self.temp_dir, 'sim_mat.npy.neighbours.npy'))
+        self.assertEqual(np.load(index_file).shape, (30, 29))
+
+        mtime = os.path.getmtime(index_file)
+        self.assertEqual(neighbour_index(self.sim_file, self.dist_mat, memory=1), index_file)
+        self.assertEqual(os.path.getmtime(index_file), mtime)
+
+
+    def test_cache_source(self):
+
+        #Check the index of a quantized condensed matrix file is not reused for the .npy file with the same name, or for
+        #another working dtype
+        cmat_file = os.path.join(self.temp_dir, 'sim_mat.cmat')
+        write_condensed(cmat_file, 1 - self.dist_mat + 0.003, [f'seq{i}' for i in range(30)], np.uint8)
+
+        quantized = initialise_matrix(cmat_file)
+        quantized_file = neighbour_index(cmat_file, quantized, memory=1)
+        dist_mat = initialise_matrix(self.sim_file)
+        index_file = neighbour_index(self.sim_file, dist_mat, memory=1)
+
+        self.assertNotEqual(index_file, quantized_file)
+        np.testing.assert_array_equal(np.load(index_file), build_neighbour_index(dist_mat, 29))
+        np.testing.assert_array_equal(np.load(quantized_file), build_neighbour_index(quantized, 29))
+
+        mtime = os.path.getmtime(index_file)
+        self.assertEqual(neighbour_index(self.sim_file, dist_mat, memory=1), index_file)
+        self.assertEqual(os.path.getmtime(index_file), mtime)
+
+        dist_mat = initialise_matrix(self.sim_file, dtype=np.float32)
+        neighbour_index(self.sim_file, dist_mat, memory=1)
+        np.testing.assert_array_equal(np.load(index_file), build_neighbour_index(dist_mat, 29))
+        with open(self.sim_file + '.neighbours.json') as f:
+            self.assertEqual(json.load(f)['working_dtype'], '<f4')
+
+        #The search with the index finds the same subset as without it
+        for bilevel in [False, True]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                best = multi_start(dist_mat, 5, bilevel, seed=1)
+                indexed = multi_start(dist_mat, 5, bilevel, seed=1, index=index_file)
+
+            self.assertEqual(best, indexed)
+
+
+    def test_updates(self):
+
+        #Check the stats updated with the index are the same as without, including when the index runs out
+        for neighbours in [3, 29]:
+            cursor = NeighbourCursor(build_neighbour_index(self.dist_mat, neighbours), [0, 5, 10, 15, 20], window=2)
+            solution = [0, 5, 10, 15, 20]
+            stats = initialise_stats(self.dist_mat, solution)
+            index_stats = [stat.copy() for stat in stats]
+
+            for drop_elem, add_elem in [(0, 1), (5, 0), (10, 29), (1, 7), (20, 5)]:
+                stats = drop_update(self.dist_mat, solution, *stats, drop_elem)
+                index_stats = drop_update(self.dist_mat, solution, *index_stats, drop_elem, cursor)
+                solution = [i for i in solution if i != drop_elem] + [add_elem]
+                stats = add_update(self.dist_mat, *stats, add_elem)
+                index_stats = add_update(self.dist_mat, *index_stats, add_elem, cursor)
+
+                for stat, index_stat in zip(stats, index_stats):
+                    np.testing.assert_array_equal(stat, index_stat)
+
+
+    def test_multi_start(self):
+
+        #Check the search finds the same subset with the index
+        index_file = neighbour_index(self.sim_file, self.dist_mat, memory=1)
+        for bilevel in [False, True]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                best = multi_start(self.dist_mat, 5, bilevel, restarts=2, seed=1)
+                indexed = multi_start(self.dist_mat, 5, bilevel, restarts=2, seed=1, index=index_file)
+
+            self.assertEqual(best, indexed)
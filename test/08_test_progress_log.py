@@ -0,0 +1,32 @@
+import unittest, logging
+
+from utils.progressLog import ProgressReporter
+
+
+class TestProgressLog(unittest.TestCase):
+
+    def setUp(self):
+
+        self.logger = logging.getLogger('test_progress')
+
+
+    def test_every(self):
+
+        #Check progress is only logged once every iterations
+        progress = ProgressReporter(self.logger, every=10, seconds=3600)
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            for i in range(1, 36):
+                progress(i, 'Iter %d', i)
+
+        self.assertEqual(logs.output, ['INFO:test_progress:Iter 10', 'INFO:test_progress:Iter 20', 'INFO:test_progress:Iter 30'])
+
+
+    def test_seconds(self):
+
+        #Check progress is logged every step when the time limit is always reached
+        progress = ProgressReporter(self.logger, every=1000, seconds=0)
+        with self.assertLogs(self.logger, level='INFO') as logs:
+            for i in range(1, 4):
+                progress(i, 'Iter %d', i)
+
+        self.assertEqual(len(logs.output), 3)
@@ -0,0 +1,74 @@
+import unittest, os, tempfile
+import numpy as np
+
+from utils.traceRecorder import TraceRecorder, trace_path
+from MMDP.dropAddTS import multi_start
+from MDP import TSMA
+
+
+class TestTraceRecorder(unittest.TestCase):
+
+    def setUp(self):
+
+        #Create a random symmetric distance matrix with 0 diagonal
+        rng = np.random.default_rng(0)
+        dist_mat = rng.random((20, 20))
+        self.dist_mat = (dist_mat + dist_mat.T) / 2
+        np.fill_diagonal(self.dist_mat, 0)
+
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_record(self):
+
+        #Check rows are kept past the first buffer and written the same to both formats
+        recorder = TraceRecorder([('step', np.int64), ('score', np.float64)], capacity=4)
+        for i in range(10):
+            recorder.record(i, i / 3)
+
+        self.assertEqual(len(recorder), 10)
+        np.testing.assert_array_equal(recorder.data['step'], np.arange(10))
+        self.assertTrue(np.all(np.diff(recorder.data['time']) >= 0))
+
+        npz_file = os.path.join(self.temp_dir, 'trace.npz')
+        csv_file = os.path.join(self.temp_dir, 'trace.csv')
+        recorder.save(npz_file)
+        recorder.save(csv_file)
+
+        with np.load(npz_file) as saved:
+            self.assertEqual(list(saved.keys()), ['time', 'step', 'score'])
+            np.testing.assert_array_equal(saved['score'], np.arange(10) / 3)
+
+        saved = np.genfromtxt(csv_file, delimiter=',', names=True)
+        np.testing.assert_array_equal(saved['score'], np.arange(10) / 3)
+
+
+    def test_search_traces(self):
+
+        #Check each search writes its own trace, ending on the best values it returns
+        trace = os.path.join(self.temp_dir, 'mmdp_trace.npz')
+        best = multi_start(self.dist_mat, 5, True, restarts=2, seed=1, trace=trace)
+
+        best_mins = []
+        for i in range(2):
+            with np.load(trace_path(trace, i)) as saved:
+                self.assertGreater(len(saved['iteration']), 0)
+                self.assertTrue(np.all(np.diff(saved['best_min']) >= 0))
+                self.assertTrue(np.all(saved['min'] <= saved['best_min']))
+                best_mins.append(saved['best_min'][-1])
+
+        self.assertEqual(max(best_mins), best[1])
+
+        sim_mat = 1 - self.dist_mat
+        np.fill_diagonal(sim_mat, np.nan)
+        trace = os.path.join(self.temp_dir, 'mdp_trace.csv')
+        best = TSMA.multi_start(sim_mat, 5, 1, seed=1, trace=trace, max_steps=50, max_wait=20)
+        saved = np.genfromtxt(trace_path(trace, 0), delimiter=',', names=True)
+        self.assertAlmostEqual(saved['best_fitness'][-1], best.fitness)
@@ -0,0 +1,100 @@
+import unittest, os, tempfile, json
+import numpy as np
+
+from utils import profiler
+from utils.sharedMatrix import MatrixPool
+
+
+def _alloc_task(mat, task):
+    with profiler.phase('task'):
+        return float(np.ones(task).sum())
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+
+        profiler.enable()
+        profiler.collect()
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+
+        profiler.disable()
+        profiler.collect()
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_phases(self):
+
+        #Check nested phases are timed and the peak of the inner one is passed on to the outer one
+        with profiler.phase('outer'):
+            for _ in range(3):
+                with profiler.phase('inner'):
+                    np.ones(2**18)
+
+        stats = profiler.collect()
+        self.assertEqual(stats['outer']['calls'], 1)
+        self.assertEqual(stats['inner']['calls'], 3)
+        self.assertGreaterEqual(stats['outer']['seconds'], stats['inner']['seconds'])
+        self.assertGreaterEqual(stats['inner']['traced_peak_mb'], 2)
+        self.assertGreaterEqual(stats['outer']['traced_peak_mb'], stats['inner']['traced_peak_mb'])
+        self.assertGreater(stats['inner']['minor_faults'], 0)
+        self.assertGreaterEqual(stats['outer']['minor_faults'], stats['inner']['minor_faults'])
+        self.assertEqual(profiler.collect(), {})
+
+
+    def test_rss_growth(self):
+
+        #Check each phase reports how much it grew the RSS by, not the peak of the process before it
+        with profiler.phase('load'):
+            kept = np.ones(2**23)
+        with profiler.phase('search'):
+            kept.sum()
+
+        stats = profiler.collect()
+        if os.path.exists('/proc/self/statm'):
+            self.assertGreater(stats['load']['rss_growth_mb'], 50)
+        self.assertLess(stats['search']['rss_growth_mb'], 10)
+        del kept
+
+
+    def test_workers(self):
+
+        #Check the stats of the tasks run in worker processes are added to the ones of this process
+        with MatrixPool(np.zeros((4, 4)), 2, _alloc_task) as pool:
+            results = pool.map([10, 20, 30])
+
+        self.assertEqual(results, [10.0, 20.0, 30.0])
+        self.assertEqual(profiler.collect()['task']['calls'], 3)
+
+
+    def test_report(self):
+
+        #Check the report is written slowest phase first
+        with profiler.phase('fast'):
+            pass
+        with profiler.phase('slow'):
+            sum(range(10**5))
+
+        report_file = os.path.join(self.temp_dir, 'profile.json')
+        profiler.report(report_file, 1.0)
+        with open(report_file) as f:
+            report = json.load(f)
+
+        self.assertEqual(list(report['phases']), ['slow', 'fast'])
+        self.assertEqual(report['wall_seconds'], 1.0)
+        self.assertGreater(report['rss_peak_mb'], 0)
+
+
+    def test_disabled(self):
+
+        #Check nothing is recorded with profiling off
+        profiler.disable()
+        with profiler.phase('off'):
+            pass
+
+        self.assertEqual(profiler.collect(), {})
@@ -0,0 +1,61 @@
+import unittest, os, tempfile
+import numpy as np
+
+from benchmarks.syntheticMatrix import synthetic_similarity, synthetic_dataset
+from benchmarks.runBenchmarks import compare
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_synthetic_similarity(self):
+
+        #Check the matrix is a symmetric similarity matrix with unit diagonal, the same whatever the block size
+        sim_file = synthetic_similarity(os.path.join(self.temp_dir, 'a.npy'), 300, seed=1, block_size=64)
+        mat = np.load(sim_file)
+
+        self.assertEqual(mat.shape, (300, 300))
+        np.testing.assert_array_equal(mat, mat.T)
+        np.testing.assert_array_equal(np.diag(mat), 1)
+        self.assertGreaterEqual(mat.min(), 0)
+        self.assertLessEqual(mat.max(), 1)
+
+        other = np.load(synthetic_similarity(os.path.join(self.temp_dir, 'b.npy'), 300, seed=1, block_size=1000))
+        np.testing.assert_array_equal(mat, other)
+
+        #Check there are families, with some pairs much more similar than most
+        off_diag = mat[~np.eye(300, dtype=bool)]
+        self.assertGreater(np.percentile(off_diag, 99), 2 * np.median(off_diag))
+
+
+    def test_dataset(self):
+
+        #Check the dataset is made once and reused
+        sim_file, heading_file = synthetic_dataset(self.temp_dir, 50, seed=2)
+        mtime = os.path.getmtime(sim_file)
+        self.assertEqual(synthetic_dataset(self.temp_dir, 50, seed=2), (sim_file, heading_file))
+        self.assertEqual(os.path.getmtime(sim_file), mtime)
+
+
+    def test_compare(self):
+
+        base = {'solver': 'mmdp', 'n': 100, 'k': 10, 'seed': 0, 'wall_seconds': 1.0, 'peak_rss_mb': 100, 'min_dist': 0.5, 'sum_dist': 20.0}
+        baseline = {'cases': [base]}
+
+        #Check only slow downs, memory growth and worse subsets beyond the tolerance are regressions
+        self.assertEqual(compare([dict(base, wall_seconds=1.1, sum_dist=20.0 + 1e-12)], baseline), [])
+        self.assertEqual(len(compare([dict(base, wall_seconds=1.5)], baseline)), 1)
+        self.assertEqual(len(compare([dict(base, peak_rss_mb=200, sum_dist=19.0)], baseline)), 2)
+        self.assertEqual(compare([dict(base, min_dist=0.6, sum_dist=19.0)], baseline), [])
+        self.assertEqual(compare([dict(base, k=20, wall_seconds=9.0)], baseline), [])
@@ -0,0 +1,170 @@
+import unittest, os, tempfile, json
+import numpy as np
+
+from init_head_mat import read_identities, save_head_mat, make_head_mat, _estimate_size
+from utils.condensedMatrix import CondensedMatrix
+from MMDP.initSol import initialise_matrix
+
+
+class TestInitHeadMat(unittest.TestCase):
+
+    def setUp(self):
+
+        #Write the upper triangle of a random similarity matrix, self pairs included, in a shuffled order
+        rng = np.random.default_rng(0)
+        self.names = [f'seq{i:02d}' for i in range(30)]
+        sim = np.round(rng.random((30, 30)), 3)
+        self.sim = np.triu(sim) + np.triu(sim, 1).T
+
+        pairs = [(i, j) for i in range(30) for j in range(i, 30)]
+        rng.shuffle(pairs)
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.sim_file = os.path.join(self.temp_dir, 'sim.txt')
+        with open(self.sim_file, 'w') as f:
+            for i, j in pairs:
+                f.write(f'{self.names[i]} {self.names[j]} {self.sim[i, j]}\n')
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_read_identities(self):
+
+        #Check small chunks and a matrix that has to grow give the sorted symmetric matrix
+        for n in [None, 4, 30]:
+            mat, headers = read_identities(self.sim_file, chunk_size=50, n=n)
+
+            self.assertEqual(headers, self.names)
+            self.assertEqual(mat.shape, (30, 30))
+            self.assertEqual(mat.dtype, np.float32)
+            np.testing.assert_array_equal(mat, self.sim.astype(np.float32))
+
+
+    def test_both_orders(self):
+
+        #Check a pair given in both orders with different values keeps the value of the last line in both orders
+        with open(self.sim_file, 'a') as f:
+            f.write(f'{self.names[7]} {self.names[3]} 0.25\n')
+            f.write(f'{self.names[3]} {self.names[7]} 0.75\n')
+            f.write(f'{self.names[9]} {self.names[2]} 0.5\n')
+
+        mat, headers = read_identities(self.sim_file, chunk_size=10000)
+
+        np.testing.assert_array_equal(mat, mat.T)
+        self.assertEqual((mat[3, 7], mat[2, 9]), (0.75, 0.5))
+
+
+    def test_out_file(self):
+
+        #Check the matrix written to disk is the same, and no working files are left behind
+        out_file = os.path.join(self.temp_dir, 'sim_mat.npy')
+        mat, headers = read_identities(self.sim_file, chunk_size=50, n=4, out_file=out_file)
+
+        self.assertEqual(headers, self.names)
+        self.assertIsInstance(mat, np.memmap)
+        del mat
+
+        np.testing.assert_array_equal(np.load(out_file), self.sim.astype(np.float32))
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['sim.txt', 'sim_mat.npy'])
+
+
+    def test_save_head_mat(self):
+
+        #Check all measures share one condensed matrix file holding the headings
+        mat, headers = read_identities(self.sim_file)
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            save_head_mat(mat, headers, 0, condensed=True)
+        finally:
+            os.chdir(cwd)
+
+        files = [os.path.join(self.temp_dir, f'{m}_mat.cmat') for m in ['id', 'sim', 'tm']]
+        self.assertTrue(all(os.path.samefile(files[0], f) for f in files[1:]))
+
+        condensed = CondensedMatrix(files[1])
+        self.assertEqual(condensed.headings, self.names)
+        np.testing.assert_array_equal(np.asarray(condensed)[~np.eye(30, dtype=bool)], mat[~np.eye(30, dtype=bool)])
+
+
+    def test_out_of_core(self):
+
+        #Check the files built on disk are the same as the ones built in memory, for each kind of matrix file, and that the
+        #temporary .npy file of a condensed matrix file is removed
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            for condensed, quantize, mat_file in [(False, None, 'id_mat.npy'), (True, None, 'id_mat.cmat'), (False, 'uint8', 'id_mat.cmat')]:
+                make_head_mat(self.sim_file, 1, condensed, quantize)
+                with open(mat_file, 'rb') as f:
+                    in_memory = f.read()
+                os.remove(mat_file)
+
+                make_head_mat(self.sim_file, 1, condensed, quantize, out_of_core=True)
+                with open(mat_file, 'rb') as f:
+                    self.assertEqual(f.read(), in_memory)
+                self.assertFalse(os.path.exists('id_mat.tmp.npy'))
+                os.remove(mat_file)
+        finally:
+            os.chdir(cwd)
+
+
+    def test_rewrite_measure(self):
+
+        #Check writing the files of one measure after all measures leaves the files of the other measures as they were,
+        #though their matrix files were linked to the same file
+        other_file = os.path.join(self.temp_dir, 'other.txt')
+        with open(other_file, 'w') as f:
+            f.write('a b 0.5\nb c 0.25\n')
+
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            for condensed, out_of_core, ext in [(False, False, 'npy'), (True, False, 'cmat'), (False, True, 'npy'), (True, True, 'cmat')]:
+                make_head_mat(self.sim_file, 0, condensed, out_of_core=out_of_core)
+                with open(f'id_mat.{ext}', 'rb') as f:
+                    before = f.read()
+
+                make_head_mat(other_file, 2, condensed, out_of_core=out_of_core)
+
+                for m in ['id', 'tm']:
+                    with open(f'{m}_mat.{ext}', 'rb') as f:
+                        self.assertEqual(f.read(), before)
+                    if not condensed:
+                        with open(f'{m}_headings.json') as f:
+                            self.assertEqual(json.load(f), self.names)
+
+                self.assertFalse(os.path.samefile(f'id_mat.{ext}', f'sim_mat.{ext}'))
+                self.assertEqual(len(np.asarray(initialise_matrix(f'sim_mat.{ext}'))), 3)
+
+                for f in os.listdir('.'):
+                    if f.endswith(('.npy', '.cmat', '.json')):
+                        os.remove(f)
+        finally:
+            os.chdir(cwd)
+
+
+    def test_estimate_size(self):
+
+        #Check the size is estimated closely enough that the matrix never has to grow, for a file with each pair once, as
+        #the one of setUp, and for a file with both orders of each pair
+        both_file = os.path.join(self.temp_dir, 'both.txt')
+        with open(both_file, 'w') as f:
+            for i in range(300):
+                for j in range(300):
+                    f.write(f'seq{i:03d} seq{j:03d} 0.5\n')
+
+        one_file = os.path.join(self.temp_dir, 'one.txt')
+        with open(one_file, 'w') as f:
+            for i in range(300):
+                for j in range(i, 300):
+                    f.write(f'seq{i:03d} seq{j:03d} 0.5\n')
+
+        for sim_file, n in [(self.sim_file, 30), (both_file, 300), (one_file, 300)]:
+            self.assertGreaterEqual(_estimate_size(sim_file), n)
+            self.assertLess(_estimate_size(sim_file), n * 1.1)
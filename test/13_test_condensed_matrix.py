@@ -0,0 +1,124 @@
+import unittest, os, pickle, tempfile
+import numpy as np
+
+from utils.condensedMatrix import CondensedMatrix, write_condensed, is_condensed
+from MMDP import initSol
+from MMDP.dropAddTS import multi_start
+from MDP import TSMA
+
+
+class TestCondensedMatrix(unittest.TestCase):
+
+    def setUp(self):
+
+        #Create a random symmetric similarity matrix with ties and values of 1, written to a condensed matrix file
+        rng = np.random.default_rng(0)
+        sim_mat = np.round(rng.random((40, 40)), 1).astype(np.float32)
+        self.sim_mat = np.triu(sim_mat, 1) + np.triu(sim_mat, 1).T
+        np.fill_diagonal(self.sim_mat, 1)
+        self.headings = [f'seq{i}' for i in range(40)]
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.npy_file = os.path.join(self.temp_dir, 'sim_mat.npy')
+        self.cmat_file = os.path.join(self.temp_dir, 'sim_mat.cmat')
+        np.save(self.npy_file, self.sim_mat)
+        write_condensed(self.cmat_file, self.sim_mat, self.headings, block_size=7)
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_indexing(self):
+
+        #Check every kind of indexing the solvers use gives the values of the dense matrix
+        mat = CondensedMatrix(self.cmat_file)
+        dense = self.sim_mat
+        rows = np.array([0, 5, 39, 5])
+        cols = np.array([3, 5, 0, 38])
+
+        self.assertTrue(is_condensed(self.cmat_file))
+        self.assertFalse(is_condensed(self.npy_file))
+        self.assertEqual(mat.headings, self.headings)
+        self.assertEqual((len(mat), mat.shape, mat.dtype), (40, (40, 40), np.float32))
+        self.assertLess(os.path.getsize(self.cmat_file), os.path.getsize(self.npy_file) * 0.6)
+
+        np.testing.assert_array_equal(np.asarray(mat), dense)
+        np.testing.assert_array_equal(mat[7], dense[7])
+        np.testing.assert_array_equal(mat[-1], dense[-1])
+        np.testing.assert_array_equal(mat[10:25], dense[10:25])
+        np.testing.assert_array_equal(mat[rows], dense[rows])
+        np.testing.assert_array_equal(mat[rows, cols], dense[rows, cols])
+        np.testing.assert_array_equal(mat[np.ix_(rows, cols)], dense[np.ix_(rows, cols)])
+        np.testing.assert_array_equal(mat[rows[:, None], cols[None, :2]], dense[rows[:, None], cols[None, :2]])
+        np.testing.assert_array_equal(mat[3, :], dense[3, :])
+        np.testing.assert_array_equal(mat[:, 3], dense[:, 3])
+        np.testing.assert_array_equal(np.sum(mat, axis=1), np.sum(dense, axis=1))
+        self.assertEqual(mat[4, 9], dense[4, 9])
+
+        with self.assertRaises(IndexError):
+            mat[40]
+
+        #Worker processes are sent the file to open again rather than its values
+        self.assertLess(len(pickle.dumps(mat)), dense.nbytes)
+        np.testing.assert_array_equal(pickle.loads(pickle.dumps(mat))[12], dense[12])
+
+
+    def test_solver_matrices(self):
+
+        #Check the solver modules read the same distance matrices and headings from both files, and find the same subsets
+        for module in [initSol, TSMA]:
+            for dtype in [None, np.float64]:
+                dense = module.initialise_matrix(self.npy_file, dtype=dtype)
+                condensed = module.initialise_matrix(self.cmat_file, dtype=dtype)
+
+                self.assertEqual(condensed.dtype, dense.dtype)
+                np.testing.assert_array_equal(np.asarray(condensed), dense)
+
+            self.assertEqual(module.initialise_headings(self.cmat_file), dict(enumerate(self.headings)))
+
+        dense = initSol.initialise_matrix(self.npy_file)
+        condensed = initSol.initialise_matrix(self.cmat_file)
+        self.assertEqual(multi_start(condensed, 8, True, restarts=2, seed=1), multi_start(dense, 8, True, restarts=2, seed=1))
+
+        dense = TSMA.initialise_matrix(self.npy_file)
+        condensed = TSMA.initialise_matrix(self.cmat_file)
+        best = TSMA.multi_start(condensed, 8, seed=1, max_steps=100, max_wait=50)
+        self.assertEqual(best.fitness, TSMA.multi_start(dense, 8, seed=1, max_steps=100, max_wait=50).fitness)
+
+
+    def test_quantized(self):
+
+        #Check quantized values are within half a level, with the ends exact, and that the solvers find the same subsets
+        #as on the dense matrix of the decoded values
+        for dtype, error in [(np.uint8, 0.5 / 255), (np.float16, 2**-11)]:
+            write_condensed(self.cmat_file, self.sim_mat + 0.001, self.headings, dtype)
+            mat = CondensedMatrix(self.cmat_file)
+            decoded = np.asarray(mat)
+
+            self.assertEqual((mat.stored_dtype, mat.dtype), (np.dtype(dtype), np.float32))
+            self.assertLess(os.path.getsize(self.cmat_file), self.sim_mat.nbytes / 2 * np.dtype(dtype).itemsize / 4 + 4096)
+            off_diagonal = ~np.eye(40, dtype=bool)
+            self.assertTrue(np.all(np.abs(decoded - (self.sim_mat + 0.001))[off_diagonal] <= error))
+
+            np.fill_diagonal(decoded, 1)
+            np.save(self.npy_file, decoded)
+
+            dense = initSol.initialise_matrix(self.npy_file)
+            condensed = initSol.initialise_matrix(self.cmat_file)
+            np.testing.assert_array_equal(np.asarray(condensed), dense)
+            self.assertEqual(multi_start(condensed, 8, True, seed=1), multi_start(dense, 8, True, seed=1))
+
+            dense = TSMA.initialise_matrix(self.npy_file)
+            condensed = TSMA.initialise_matrix(self.cmat_file)
+            np.testing.assert_array_equal(np.asarray(condensed), dense)
+            best = TSMA.multi_start(condensed, 8, seed=1, max_steps=100, max_wait=50)
+            self.assertEqual(best.fitness, TSMA.multi_start(dense, 8, seed=1, max_steps=100, max_wait=50).fitness)
+
+        #The largest value is on the top level, so similarities of 1 stay 1
+        write_condensed(self.cmat_file, self.sim_mat, self.headings, np.uint8)
+        i, j = np.argwhere((self.sim_mat == 1) & off_diagonal)[0]
+        self.assertEqual(CondensedMatrix(self.cmat_file)[i, j], 1)
@@ -0,0 +1,94 @@
+import unittest, os, pickle, tempfile
+import numpy as np
+
+from init_head_mat import read_identities, read_sparse_identities
+from utils.sparseMatrix import SparseMatrix, write_sparse
+from utils.condensedMatrix import open_matrix
+from MMDP import initSol
+from MMDP.dropAddTS import multi_start
+from MDP import TSMA
+
+
+class TestSparseMatrix(unittest.TestCase):
+
+    def setUp(self):
+
+        #Write a similarity file reporting about one pair in ten, some in both orders, with self pairs
+        rng = np.random.default_rng(0)
+        self.names = [f'seq{i:03d}' for i in range(120)]
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.sim_file = os.path.join(self.temp_dir, 'sim.txt')
+        with open(self.sim_file, 'w') as f:
+            for i in rng.permutation(120):
+                for j in range(120):
+                    if i == j or rng.random() < 0.05:
+                        f.write(f'{self.names[i]} {self.names[j]} {round(rng.random(), 3)}\n')
+
+        self.cmat_file = os.path.join(self.temp_dir, 'sim_mat.cmat')
+        self.npy_file = os.path.join(self.temp_dir, 'sim_mat.npy')
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_read_sparse_identities(self):
+
+        #Check the sparse matrix holds the same pairs as the dense one, without the diagonal
+        dense, headers = read_identities(self.sim_file)
+        sparse, sparse_headers = read_sparse_identities(self.sim_file, chunk_size=100)
+
+        np.fill_diagonal(dense, 0)
+        self.assertEqual(sparse_headers, headers)
+        self.assertEqual(sparse.diagonal().any(), False)
+        self.assertLess(sparse.nnz, 120 * 120 / 5)
+        np.testing.assert_array_equal(sparse.toarray(), dense)
+
+
+    def test_sparse_matrix(self):
+
+        #Check the sparse accessor reads the pairs as the dense matrix, with the pairs not in the file as 0
+        sparse, headers = read_sparse_identities(self.sim_file)
+        write_sparse(self.cmat_file, sparse, headers)
+        mat = open_matrix(self.cmat_file)
+        dense = sparse.toarray()
+        np.fill_diagonal(dense, 1)
+        rows = np.array([0, 5, 119, 5])
+        cols = np.array([3, 5, 0, 118])
+
+        self.assertIsInstance(mat, SparseMatrix)
+        self.assertEqual(mat.headings, headers)
+        self.assertLess(os.path.getsize(self.cmat_file), dense.nbytes / 2)
+        np.testing.assert_array_equal(np.asarray(mat), dense)
+        np.testing.assert_array_equal(mat[7], dense[7])
+        np.testing.assert_array_equal(mat[rows, cols], dense[rows, cols])
+        np.testing.assert_array_equal(mat[np.ix_(rows, cols)], dense[np.ix_(rows, cols)])
+        np.testing.assert_allclose(np.sum(mat, axis=1), np.sum(dense, axis=1), rtol=1e-6)
+        np.testing.assert_array_equal(pickle.loads(pickle.dumps(mat))[12], dense[12])
+
+
+    def test_solvers(self):
+
+        #Check the solvers find the same subsets on the sparse file as on the dense matrix, for plain and quantized values
+        sparse, headers = read_sparse_identities(self.sim_file)
+
+        for dtype in [np.float32, np.uint8]:
+            write_sparse(self.cmat_file, sparse, headers, dtype)
+            np.save(self.npy_file, np.asarray(open_matrix(self.cmat_file)))
+
+            for module in [initSol, TSMA]:
+                np.testing.assert_array_equal(np.asarray(module.initialise_matrix(self.cmat_file)), module.initialise_matrix(self.npy_file))
+
+            dense = initSol.initialise_matrix(self.npy_file)
+            mat = initSol.initialise_matrix(self.cmat_file)
+            self.assertEqual(multi_start(mat, 10, True, restarts=2, seed=1), multi_start(dense, 10, True, restarts=2, seed=1))
+            self.assertEqual(multi_start(mat, 10, False, seed=1), multi_start(dense, 10, False, seed=1))
+
+            dense = TSMA.initialise_matrix(self.npy_file)
+            mat = TSMA.initialise_matrix(self.cmat_file)
+            best = TSMA.multi_start(mat, 10, seed=1, max_steps=100, max_wait=50)
+            self.assertAlmostEqual(best.fitness, TSMA.multi_start(dense, 10, seed=1, max_steps=100, max_wait=50).fitness)
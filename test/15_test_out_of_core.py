@@ -0,0 +1,114 @@
+import unittest, os, pickle, tempfile
+import numpy as np
+
+from utils.memmapMatrix import MemmapMatrix
+from utils.condensedMatrix import open_matrix, write_condensed
+from MMDP import initSol
+from MMDP.dropAddTS import multi_start
+from MDP import TSMA
+
+
+class TestOutOfCore(unittest.TestCase):
+
+    def setUp(self):
+
+        #Create a random symmetric similarity matrix with ties and values of 1
+        rng = np.random.default_rng(0)
+        sim_mat = np.round(rng.random((40, 40)), 1).astype(np.float32)
+        self.sim_mat = np.triu(sim_mat, 1) + np.triu(sim_mat, 1).T
+        np.fill_diagonal(self.sim_mat, 1)
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.npy_file = os.path.join(self.temp_dir, 'sim_mat.npy')
+        self.cmat_file = os.path.join(self.temp_dir, 'sim_mat.cmat')
+        np.save(self.npy_file, self.sim_mat)
+
+
+    def tearDown(self):
+
+        for f in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, f))
+        os.rmdir(self.temp_dir)
+
+
+    def test_indexing(self):
+
+        #Check every kind of indexing the solvers use gives the values of the matrix, without a cache and with one
+        rows = np.array([0, 5, 39, 5])
+        cols = np.array([3, 5, 0, 38])
+        tall = np.arange(2, 30)
+
+        self.assertIsInstance(open_matrix(self.npy_file), MemmapMatrix)
+
+        for mat in [MemmapMatrix(self.npy_file), MemmapMatrix(self.npy_file).cached(4096)]:
+            dense = self.sim_mat
+
+            self.assertEqual((len(mat), mat.shape, mat.dtype), (40, (40, 40), np.float32))
+            np.testing.assert_array_equal(np.asarray(mat), dense)
+            np.testing.assert_array_equal(mat[7], dense[7])
+            np.testing.assert_array_equal(mat[10:25], dense[10:25])
+            np.testing.assert_array_equal(mat[rows], dense[rows])
+            np.testing.assert_array_equal(mat[rows, cols], dense[rows, cols])
+            np.testing.assert_array_equal(mat[np.ix_(rows, cols)], dense[np.ix_(rows, cols)])
+            np.testing.assert_array_equal(mat[np.ix_(tall, cols)], dense[np.ix_(tall, cols)])
+            np.testing.assert_array_equal(mat[np.ix_(cols, cols[:2])], dense[np.ix_(cols, cols[:2])])
+            np.testing.assert_array_equal(mat[:, 3], dense[:, 3])
+            np.testing.assert_array_equal(np.sum(mat, axis=1), np.sum(dense, axis=1))
+            self.assertEqual(mat[4, 9], dense[4, 9])
+
+            #Worker processes are sent the file to open again rather than its values, and start with an empty cache
+            self.assertLess(len(pickle.dumps(mat)), dense.nbytes)
+            np.testing.assert_array_equal(pickle.loads(pickle.dumps(mat))[12], dense[12])
+
+
+    def test_row_cache(self):
+
+        #Check the cache keeps the rows read last within its memory, and that they cannot be changed by a solver
+        mat = MemmapMatrix(self.npy_file).cached(3 * 40 * 4)
+
+        for i in [0, 1, 2, 0, 3]:
+            row = mat[i]
+
+        self.assertEqual(list(mat._cache), [2, 0, 3])
+        self.assertLessEqual(mat._cached, 3 * 40 * 4)
+        self.assertIs(mat[0], mat._cache[0])
+        self.assertFalse(row.flags.writeable)
+
+        #A transformed accessor reads the rows through its transform into its own cache
+        distance = mat.transformed(initSol.to_distance, 0)
+        self.assertEqual(len(distance._cache), 0)
+        np.testing.assert_array_equal(distance[3], np.where(np.arange(40) == 3, 0, 1 - self.sim_mat[3]))
+        np.testing.assert_array_equal(mat[3], self.sim_mat[3])
+
+        #Blocks of rows for sums are kept to a quarter of the cache
+        self.assertEqual(list(mat._blocks())[:2], [(0, 1), (1, 2)])
+
+
+    def test_solver_matrices(self):
+
+        #Check the solver modules read the same distance matrices out of core, from a .npy or condensed matrix file, and
+        #find the same subsets
+        write_condensed(self.cmat_file, self.sim_mat, [f'seq{i}' for i in range(40)])
+
+        for module in [initSol, TSMA]:
+            dense = module.initialise_matrix(self.npy_file)
+            for sim_file in [self.npy_file, self.cmat_file]:
+                mat = module.initialise_matrix(sim_file, memory=1)
+                self.assertEqual(mat.cache_bytes, 2**20)
+                np.testing.assert_array_equal(np.asarray(mat), dense)
+
+        dense = initSol.initialise_matrix(self.npy_file)
+        for memory in [0, 1]:
+            mat = initSol.initialise_matrix(self.npy_file, memory=memory)
+            self.assertEqual(multi_start(mat, 8, True, restarts=2, seed=1), multi_start(dense, 8, True, restarts=2, seed=1))
+            self.assertEqual(multi_start(mat, 8, False, seed=1), multi_start(dense, 8, False, seed=1))
+
+        dense = TSMA.initialise_matrix(self.npy_file)
+        for memory in [0, 1]:
+            mat = TSMA.initialise_matrix(self.npy_file, memory=memory)
+            best = TSMA.multi_start(mat, 8, seed=1, max_steps=100, max_wait=50)
+            self.assertEqual(best.fitness, TSMA.multi_start(dense, 8, seed=1, max_steps=100, max_wait=50).fitness)
+
+
+if __name__ == '__main__':
+    unittest.main()
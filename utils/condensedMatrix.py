@@ -0,0 +1,226 @@
+import numpy as np
+import struct
+import json
+
+from utils.matrixAccessor import MatrixAccessor
+from utils.memmapMatrix import MemmapMatrix
+
+#A condensed matrix file starts with the magic string, the format version and the length of the JSON header after it
+MAGIC = b'\x93CMAT'
+VERSION = 1
+_PREAMBLE = struct.Struct('<5sB2xQ')
+
+#The values start on a multiple of this many bytes
+_ALIGN = 64
+
+
+def is_condensed(path):
+
+    """
+    This function tells if path is a condensed matrix file, of either layout, rather than a .npy file
+    """
+
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def open_matrix(path):
+
+    """
+    This function returns the accessor of the condensed matrix file path for its layout, the condensed upper triangle
+    or the sparse rows written by utils.sparseMatrix.write_sparse, or a MemmapMatrix if path is a .npy file
+    """
+
+    if not is_condensed(path):
+        return MemmapMatrix(path)
+
+    if read_header(path)[0].get('layout', 'condensed') == 'csr':
+        #Imported here as the sparse layout builds on this module
+        from utils.sparseMatrix import SparseMatrix
+        return SparseMatrix(path)
+
+    return CondensedMatrix(path)
+
+
+def read_header(path):
+
+    """
+    This function returns the JSON header of the condensed matrix file path, and the offset of its values in the file
+    """
+
+    with open(path, 'rb') as f:
+        magic, version, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a condensed matrix file')
+        if version != VERSION:
+            raise ValueError(f'{path} is a version {version} condensed matrix file, only version {VERSION} can be read')
+
+        header = json.loads(f.read(length))
+
+    return header, _PREAMBLE.size + length
+
+
+def row_starts(n):
+
+    """
+    This function returns the position of the first value of each row in the condensed upper triangle of an n x n matrix,
+    with the total number of values at the end, so row i is stored at starts[i]:starts[i + 1]
+    """
+
+    rows = np.arange(n + 1, dtype=np.int64)
+
+    return rows * n - rows * (rows + 1) // 2
+
+
+def aligned(offset):
+    return offset + (-offset % _ALIGN)
+
+
+def write_header(path, header):
+
+    """
+    This function starts the condensed matrix file path with the preamble and the JSON header, padded so the values after
+    it are aligned, and returns the offset of the values
+    """
+
+    header = json.dumps(header).encode()
+    header += b' ' * (aligned(_PREAMBLE.size + len(header)) - _PREAMBLE.size - len(header))
+
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+
+    return _PREAMBLE.size + len(header)
+
+
+def value_scale(dtype, top):
+
+    """
+    This function returns the scale of values stored as dtype, whose largest value is top
+    An unsigned integer dtype (e.g. np.uint8 for 256 levels) puts top on its top level, a float dtype has a scale of 1
+    """
+
+    if np.dtype(dtype).kind == 'u' and top > 0:
+        return top / np.iinfo(dtype).max
+
+    return 1.0
+
+
+def encode(values, dtype, scale):
+
+    #Values to store as dtype, rounded to the nearest level for an unsigned integer dtype, with values below 0 stored as 0
+    values = values / scale if scale != 1 else values
+    if np.dtype(dtype).kind == 'u':
+        values = np.clip(np.rint(values), 0, np.iinfo(dtype).max)
+
+    return values.astype(dtype)
+
+
+def write_condensed(path, mat, headings, dtype=np.float32, diagonal=1.0, block_size=None, scale=None):
+
+    """
+    This function writes the symmetric matrix mat with its headings to path as a condensed matrix file
+    The file has a JSON header with the size, dtype, scale, diagonal value and headings, followed by the upper triangle of
+    mat without the diagonal, row by row, as dtype, so it takes half the space of a .npy file and is memory mapped for
+    reading. mat is read block_size rows at a time, about 4M values by default, so it can itself be memory mapped
+    Values are stored as value / scale and read back as stored * scale, with scale from value_scale if not given
+    """
+
+    n = len(mat)
+    dtype = np.dtype(dtype)
+    starts = row_starts(n)
+    block_size = block_size or max(1, 2**22 // max(1, n))
+
+    def upper_blocks():
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+
+            #The upper triangle of a block of rows is one run of the values, in the same row major order as a mask of it
+            upper = np.arange(n)[None, :] > np.arange(start, stop)[:, None]
+            yield start, stop, np.asarray(mat[start:stop])[upper]
+
+    if scale is None:
+        top = max((float(values.max()) for _, _, values in upper_blocks() if len(values)), default=0.0) if dtype.kind == 'u' else 0.0
+        scale = value_scale(dtype, top)
+
+    offset = write_header(path, {'n': n, 'dtype': dtype.str, 'scale': scale, 'diagonal': diagonal, 'headings': list(headings)})
+    with open(path, 'r+b') as f:
+        f.truncate(offset + int(starts[-1]) * dtype.itemsize)
+
+    if starts[-1] == 0:
+        return path
+
+    data = np.memmap(path, dtype=dtype, mode='r+', offset=offset, shape=(int(starts[-1]),))
+    for start, stop, values in upper_blocks():
+        data[starts[start]:starts[stop]] = encode(values, dtype, scale)
+
+    data.flush()
+    del data
+
+    return path
+
+
+class CondensedMatrix(MatrixAccessor):
+
+    """
+    This class reads a condensed matrix file written by write_condensed, memory mapped, so opening it costs next to
+    nothing and only the pages read are held in memory
+    Values stored in 8 or 16 bits are decoded as they are read, so a matrix stored as uint8 takes an eighth of the memory
+    of a float64 one
+    Pair (i, j) with i < j is at starts[i] + j - i - 1, so row i is the run of its values after the diagonal and one value
+    from each of the rows before it
+    It can be sent to worker processes, which open the file again rather than being sent its values
+    """
+
+    def __init__(self, path):
+        header, offset = read_header(path)
+        super().__init__(header['n'], header['dtype'], header['diagonal'], header.get('scale', 1.0))
+        self.path = path
+        self.headings = header['headings']
+        self.offset = offset
+        self._open()
+
+
+    def _open(self):
+
+        starts = row_starts(self.n)
+        self._starts = starts
+        #Pair (i, j) with i < j is at _base[i] + j
+        self._base = starts[:-1] - np.arange(self.n) - 1
+
+        if starts[-1]:
+            self.data = np.memmap(self.path, dtype=self.stored_dtype, mode='r', offset=self.offset, shape=(int(starts[-1]),)).view(np.ndarray)
+        else:
+            self.data = np.empty(0, dtype=self.stored_dtype)
+
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for key in ('data', '_starts', '_base'):
+            del state[key]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+    def _row(self, i):
+        row = np.empty(self.n, dtype=self.stored_dtype)
+        row[:i] = self.data[self._base[:i] + i]
+        row[i + 1:] = self.data[self._starts[i]:self._starts[i + 1]]
+        return row
+
+
+    def _pairs(self, rows, cols):
+        low = np.minimum(rows, cols)
+        high = np.maximum(rows, cols)
+
+        #Pairs on the diagonal are not stored, they are read from the first value and set after
+        if len(self.data) == 0:
+            return np.zeros(low.shape, dtype=self.stored_dtype)
+        return self.data[np.where(low == high, 0, self._base[low] + high)]
@@ -0,0 +1,262 @@
+import numpy as np
+import collections
+import copy
+
+
+class MatrixAccessor:
+
+    """
+    This class is the base of the symmetric matrices the solvers read from without holding them as a numpy array
+    A subclass gives the stored values of pairs of elements with _pairs, and a whole row with _row if it can do better
+    than one pair per column, both as new arrays
+    Values are decoded from stored_dtype, times scale, cast to dtype and passed through transform, the in-place change a
+    solver module makes to a loaded similarity matrix, and the diagonal is set to diagonal, so the solvers get the same
+    values as from their own matrix. dtype is at least float32 if not given
+    Values stored in 8 or 16 bits are decoded through a table of the final value of every stored code, so equal codes
+    always give equal values, and the transform is worked out once per code rather than once per value read
+    It supports the indexing the solvers use, mat[i], mat[a:b], mat[i, j], mat[np.ix_(rows, cols)] and pairs of integer
+    arrays, as well as len(mat), mat.shape, mat.dtype and np.sum(mat, axis=1)
+    Whole rows can be kept in a cache of least recently read rows, see cached
+    """
+
+    ndim = 2
+
+    def __init__(self, n, stored_dtype, diagonal=1.0, scale=1.0, dtype=None):
+        self.n = n
+        self.stored_dtype = np.dtype(stored_dtype)
+        self.dtype = np.dtype(dtype or np.result_type(self.stored_dtype, np.float32))
+        self.diagonal = diagonal
+        self.scale = scale
+        self.transform = None
+        self._table = self._decode_table()
+        self.cache_bytes = None
+        self._cache = None
+        self._cached = 0
+
+
+    @property
+    def shape(self):
+        return (self.n, self.n)
+
+
+    def __len__(self):
+        return self.n
+
+
+    def transformed(self, transform, diagonal, dtype=None):
+
+        """
+        This returns an accessor reading the same stored values through transform, with diagonal on the diagonal and
+        values cast to dtype if given
+        """
+
+        mat = copy.copy(self)
+        mat.transform = transform
+        mat.diagonal = diagonal
+        if dtype is not None:
+            mat.dtype = np.dtype(dtype)
+        mat._table = mat._decode_table()
+
+        return mat
+
+
+    def cached(self, max_bytes):
+
+        """
+        This returns an accessor keeping the whole rows it reads, decoded and transformed, in a cache of at most max_bytes,
+        dropping the least recently read rows first, so the rows of the elements a search keeps swapping in and out are
+        only read from the file again once they have dropped out. The cached rows are read-only
+        Blocks of rows read for sums are kept to about a quarter of max_bytes as well
+        """
+
+        mat = copy.copy(self)
+        mat.cache_bytes = max_bytes
+        mat._cache = collections.OrderedDict()
+        mat._cached = 0
+
+        return mat
+
+
+    def __getstate__(self):
+
+        #Cached rows are neither copied nor sent to worker processes, each copy starts with an empty cache
+        state = self.__dict__.copy()
+        if self._cache is not None:
+            state['_cache'] = collections.OrderedDict()
+            state['_cached'] = 0
+
+        return state
+
+
+    def _decode_table(self):
+
+        #Final value of every code of a value stored in 8 or 16 bits, indexed by the bits of the code as an unsigned integer
+        if self.stored_dtype.itemsize > 2:
+            return None
+
+        codes = np.arange(2 ** (8 * self.stored_dtype.itemsize), dtype=f'u{self.stored_dtype.itemsize}')
+        with np.errstate(invalid='ignore', over='ignore'):
+            return self._decode(codes.view(self.stored_dtype))
+
+
+    def _decode(self, values):
+
+        values = np.asarray(values, dtype=np.float64 if self.scale != 1 else self.dtype)
+        if self.scale != 1:
+            values = (values * self.scale).astype(self.dtype)
+        if self.transform is not None:
+            values = self.transform(values)
+
+        return values
+
+
+    def _row(self, i):
+        return self._pairs(np.full(self.n, i), np.arange(self.n))
+
+
+    def _rows(self, rows):
+        if len(rows) == 0:
+            return np.empty((0, self.n), dtype=self.stored_dtype)
+        return np.stack([self._row(i) for i in rows])
+
+
+    def _finish(self, values, diagonal):
+
+        #Values from _pairs and _row are new arrays, so they are changed in place
+        if self._table is not None:
+            values = np.asarray(self._table[np.asarray(values).view(f'u{self.stored_dtype.itemsize}')])
+        else:
+            values = self._decode(values)
+        values[diagonal] = self.diagonal
+
+        return values
+
+
+    def _whole_row(self, i):
+
+        diagonal = np.zeros(self.n, dtype=bool)
+        diagonal[i] = True
+        if self._cache is None:
+            return self._finish(self._row(i), diagonal)
+
+        row = self._cache.get(i)
+        if row is not None:
+            self._cache.move_to_end(i)
+            return row
+
+        row = self._finish(self._row(i), diagonal)
+        row.flags.writeable = False
+        self._cache[i] = row
+        self._cached += row.nbytes
+
+        #The newest row is always kept, even if it is bigger than the cache on its own
+        while self._cached > self.cache_bytes and len(self._cache) > 1:
+            self._cached -= self._cache.popitem(last=False)[1].nbytes
+
+        return row
+
+
+    def _cached_block(self, rows, cols):
+
+        #The block mat[np.ix_(rows, cols)] of more rows than columns, as the statistics of a solution are, is taken from the
+        #cached rows of its columns, which hold the same values as the matrix is symmetric, if they all fit in the cache
+        #A smaller block is taken from them too if they are all cached already, as the rows of a solution are in a search
+        if self._cache is None or rows.ndim != 2 or rows.shape[1] != 1 or cols.ndim != 2 or cols.shape[0] != 1:
+            return None
+        if cols.shape[1] * self.n * self.dtype.itemsize > self.cache_bytes:
+            return None
+        cols = cols[0].tolist()
+        if rows.shape[0] <= len(cols) and not all(j in self._cache for j in cols):
+            return None
+
+        return np.stack([self._whole_row(j)[rows[:, 0]] for j in cols], axis=1)
+
+
+    def _check(self, index):
+
+        index = np.asarray(index)
+        if index.dtype.kind not in 'iu':
+            raise IndexError('Only integers, slices and integer arrays are valid indices')
+        if index.size and (index.min() < -self.n or index.max() >= self.n):
+            raise IndexError(f'Index out of bounds for size {self.n}')
+
+        return np.where(index < 0, index + self.n, index)
+
+
+    def __getitem__(self, key):
+
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        if len(key) == 1:
+            rows = np.arange(self.n)[key[0]] if isinstance(key[0], slice) else self._check(key[0])
+
+            if rows.ndim == 0:
+                return self._whole_row(int(rows))
+
+            flat = rows.ravel()
+            values = self._finish(self._rows(flat), flat[:, None] == np.arange(self.n)[None, :])
+            return values.reshape(rows.shape + (self.n,))
+
+        rows, cols = key
+        all_rows = isinstance(rows, slice)
+        all_cols = isinstance(cols, slice)
+
+        #Slices are turned into ranges along their own axis, as numpy does when they are mixed with integer arrays
+        if all_rows and all_cols:
+            rows, cols = np.arange(self.n)[rows][:, None], np.arange(self.n)[cols][None, :]
+        elif all_rows:
+            cols = self._check(cols)
+            rows = np.arange(self.n)[rows].reshape((-1,) + (1,) * cols.ndim)
+        elif all_cols:
+            rows = self._check(rows)[..., None]
+            cols = np.arange(self.n)[cols]
+        else:
+            rows, cols = self._check(rows), self._check(cols)
+            block = self._cached_block(rows, cols)
+            if block is not None:
+                return block
+
+        rows, cols = np.broadcast_arrays(rows, cols)
+        values = self._finish(self._pairs(rows, cols), rows == cols)
+
+        return values[()] if values.ndim == 0 else values
+
+
+    def _blocks(self):
+
+        #Blocks of rows of about 4M values, so a block is never much bigger than a few rows of a big matrix, or of a quarter of
+        #the memory of the cache if there is one
+        values = 2**22 if self._cache is None else self.cache_bytes // 4 // self.dtype.itemsize
+        size = max(1, values // max(1, self.n))
+        for start in range(0, self.n, size):
+            yield start, min(start + size, self.n)
+
+
+    def sum(self, axis=None, dtype=None, out=None):
+
+        """
+        This sums the matrix as np.sum does, a block of rows at a time
+        The matrix is symmetric, so the sums along either axis are its row sums
+        """
+
+        sums = np.empty(self.n, dtype=np.dtype(dtype or self.dtype))
+        for start, stop in self._blocks():
+            sums[start:stop] = self[start:stop].sum(axis=1, dtype=dtype)
+
+        result = sums if axis is not None else sums.sum(dtype=dtype)
+        if out is not None:
+            out[...] = result
+            return out
+
+        return result
+
+
+    def __array__(self, dtype=None, copy=None):
+
+        #The whole matrix, only for small matrices and tests
+        dense = np.empty(self.shape, dtype=self.dtype)
+        for start, stop in self._blocks():
+            dense[start:stop] = self[start:stop]
+
+        return dense if dtype is None else dense.astype(dtype, copy=False)
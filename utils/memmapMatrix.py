@@ -0,0 +1,91 @@
+import numpy as np
+import mmap
+
+from utils.matrixAccessor import MatrixAccessor
+
+
+class MemmapMatrix(MatrixAccessor):
+
+    """
+    This class reads a similarity matrix .npy file memory mapped read-only, so a matrix bigger than the memory can be
+    searched. Values are changed by the transform of a solver as they are read rather than in place, so no page of the
+    file is ever copied and the system can always drop the pages read to make room for others
+    A run of rows, as summed by a solver, is read as one block in the order it is stored. The pages of rows read whole are
+    let go of straight after, as a pass over the matrix does not come back to them and a search keeps the rows it reads
+    again in its row cache
+    The matrix is symmetric, so a block of many rows by a few columns, as the statistics of a solution read, is read from
+    the rows of its columns instead, each of them one run of the file, so it touches a few rows rather than all of them
+    It can be sent to worker processes, which open the file again rather than being sent its values
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+        super().__init__(len(self.data), self.data.dtype)
+
+
+    def _open(self):
+
+        with open(self.path, 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            if fortran_order or len(shape) != 2 or shape[0] != shape[1]:
+                raise ValueError(f'{self.path} is not a square matrix in C order')
+
+            self._offset = f.tell()
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if shape[0] else None
+
+        if self._mmap is None:
+            self.data = np.empty(shape, dtype=dtype)
+        else:
+            self.data = np.frombuffer(self._mmap, dtype=dtype, count=shape[0] * shape[1], offset=self._offset).reshape(shape)
+
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['data'], state['_mmap']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+    def _release(self, start, stop):
+
+        #Let go of the whole pages of rows start:stop, they are read again from the file, or the page cache, if needed
+        if not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+
+        row_bytes = self.n * self.data.itemsize
+        first = -(-(self._offset + start * row_bytes) // mmap.PAGESIZE) * mmap.PAGESIZE
+        last = (self._offset + stop * row_bytes) // mmap.PAGESIZE * mmap.PAGESIZE
+        if first < last:
+            self._mmap.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+
+    def _row(self, i):
+        row = np.array(self.data[i])
+        self._release(i, i + 1)
+        return row
+
+
+    def _rows(self, rows):
+
+        if len(rows) > 1 and rows[-1] - rows[0] == len(rows) - 1 and np.all(np.diff(rows) == 1):
+            block = np.array(self.data[rows[0]:rows[-1] + 1])
+            self._release(rows[0], rows[-1] + 1)
+            return block
+
+        return self.data[rows].reshape(len(rows), self.n)
+
+
+    def _pairs(self, rows, cols):
+
+        #A block of more rows than columns is read transposed, along the rows of its columns
+        if rows.ndim == 2 and rows.shape[0] > rows.shape[1]:
+            return self.data[cols.T, rows.T].T
+
+        return self.data[rows, cols]
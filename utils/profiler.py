@@ -0,0 +1,171 @@
+import contextlib
+import tracemalloc
+import resource
+import time
+import json
+import os
+
+_enabled = False
+_stats = {}
+_stack = []
+_NULL = contextlib.nullcontext()
+
+
+def enable():
+
+    """
+    This function turns on profiling for this process and the worker processes started after it
+    Memory allocations are traced from here on, which slows the run down
+    """
+
+    global _enabled
+    _enabled = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+
+    """
+    This function turns off profiling and stops tracing memory allocations, the stats so far are kept
+    """
+
+    global _enabled
+    _enabled = False
+    tracemalloc.stop()
+
+
+def enabled():
+    return _enabled
+
+
+def _rss_mb():
+    #Peak resident set size of this process so far, ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rss_now_mb():
+    #Resident set size of this process now, from the pages in the second field of /proc/self/statm, 0 without /proc
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return 0.0
+
+
+def _faults():
+    #Page faults of this process so far, major ones read a page from disk and minor ones map a page already in memory
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_majflt, usage.ru_minflt
+
+
+def _new_stat():
+    return {'calls': 0, 'seconds': 0.0, 'traced_peak_mb': 0.0, 'rss_growth_mb': 0.0, 'major_faults': 0, 'minor_faults': 0}
+
+
+class _Phase:
+
+    __slots__ = ('name', 'start', 'peak', 'faults', 'rss')
+
+    def __init__(self, name):
+        self.name = name
+        self.peak = 0
+
+    def __enter__(self):
+
+        #The traced peak is reset for each phase, so the peak so far is passed on to the phase it is nested in first
+        peak = tracemalloc.get_traced_memory()[1]
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, peak)
+        tracemalloc.reset_peak()
+
+        _stack.append(self)
+        self.faults = _faults()
+        self.rss = _rss_now_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+
+        seconds = time.perf_counter() - self.start
+        major, minor = _faults()
+        _stack.pop()
+
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, self.peak)
+
+        stat = _stats.setdefault(self.name, _new_stat())
+        stat['calls'] += 1
+        stat['seconds'] += seconds
+        stat['major_faults'] += major - self.faults[0]
+        stat['minor_faults'] += minor - self.faults[1]
+        stat['traced_peak_mb'] = max(stat['traced_peak_mb'], self.peak / 2**20)
+        stat['rss_growth_mb'] = max(stat['rss_growth_mb'], _rss_now_mb() - self.rss)
+
+
+def phase(name):
+
+    """
+    This function returns a context manager timing the code run in it as the phase name, with the peak of traced
+    memory, how much the RSS of the process grew by from the start to the end of it, the most over its calls, and the
+    page faults of the process while in it
+    If profiling is off it returns a shared context manager that does nothing
+    """
+
+    if not _enabled:
+        return _NULL
+
+    return _Phase(name)
+
+
+def collect():
+
+    """
+    This function returns the phase stats of this process and clears them, so a worker process can send them back
+    """
+
+    global _stats
+    stats, _stats = _stats, {}
+
+    return stats
+
+
+def merge(stats):
+
+    """
+    This function adds the phase stats sent back by a worker process to the ones of this process
+    """
+
+    for name, stat in stats.items():
+        own = _stats.setdefault(name, _new_stat())
+        own['calls'] += stat['calls']
+        own['seconds'] += stat['seconds']
+        own['major_faults'] += stat['major_faults']
+        own['minor_faults'] += stat['minor_faults']
+        own['traced_peak_mb'] = max(own['traced_peak_mb'], stat['traced_peak_mb'])
+        own['rss_growth_mb'] = max(own['rss_growth_mb'], stat['rss_growth_mb'])
+
+
+def report(report_file, wall_seconds):
+
+    """
+    This function writes the phase stats to report_file as JSON, slowest phase first, with the peak RSS of this process
+    and of its worker processes, and the page faults of this process
+    Phases nested in other phases are counted in both, and the phases of worker processes add up across workers
+    """
+
+    phases = dict(sorted(_stats.items(), key=lambda item: item[1]['seconds'], reverse=True))
+    summary = {
+        'wall_seconds': wall_seconds,
+        'rss_peak_mb': _rss_mb(),
+        'workers_rss_peak_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'traced_peak_mb': max((stat['traced_peak_mb'] for stat in phases.values()), default=0.0),
+        'major_faults': _faults()[0],
+        'minor_faults': _faults()[1],
+        'phases': phases
+    }
+
+    with open(report_file, 'w') as f:
+        json.dump(summary, f, indent=4)
@@ -0,0 +1,41 @@
+import logging
+import time
+
+
+def configure_logging(verbosity=0):
+
+    """
+    This function sets up logging for a run, verbosity -1 only shows warnings, 0 shows the progress and results of the
+    searches and 1 shows every step of them
+    Worker processes started after this inherit the set up
+    """
+
+    level = {-1: logging.WARNING, 0: logging.INFO}.get(verbosity, logging.DEBUG)
+    logging.basicConfig(level=level, format='%(asctime)s %(processName)s %(name)s %(levelname)s: %(message)s')
+
+
+class ProgressReporter:
+
+    """
+    This class logs the progress of a search at info level once every iterations or every seconds, whichever comes first,
+    so a long search writes a few lines rather than one for each step
+    The message is only formatted when it is logged
+    """
+
+    def __init__(self, logger, every=1000, seconds=30):
+
+        self.logger = logger
+        self.every = every
+        self.seconds = seconds
+        self._last_iter = 0
+        self._last_time = time.monotonic()
+
+
+    def __call__(self, iteration, msg, *args):
+
+        if iteration - self._last_iter < self.every and time.monotonic() - self._last_time < self.seconds:
+            return
+
+        self._last_iter = iteration
+        self._last_time = time.monotonic()
+        self.logger.info(msg, *args)
@@ -0,0 +1,151 @@
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import numpy as np
+
+from utils import profiler
+from utils.matrixAccessor import MatrixAccessor
+
+
+#Shared memory blocks created or attached in this process, with the matrix in each, kept open while they are read from
+_blocks = {}
+
+
+class SharedMatrix:
+
+    """
+    This class puts a matrix in shared memory once, so worker processes can read it without each holding a copy
+    dtype is the dtype of the shared copy, which is the dtype of mat if not given
+    spec is the (name, shape, dtype) of the block, which is all that needs to be sent to the workers
+    """
+
+    def __init__(self, mat, dtype=None):
+        dtype = np.dtype(mat.dtype if dtype is None else dtype)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(mat.shape)) * dtype.itemsize, 1))
+        self.array = np.ndarray(mat.shape, dtype=dtype, buffer=self.shm.buf)
+        self.array[...] = mat
+        self.spec = (self.shm.name, mat.shape, dtype.str)
+        _blocks[self.shm.name] = (self.shm, self.array)
+
+    def close(self):
+        del _blocks[self.shm.name]
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_matrix(spec):
+
+    """
+    This function returns the matrix in the shared memory block described by spec, without copying it
+    spec can also be a matrix accessor, which reads its own file and is returned as it is
+    """
+
+    if isinstance(spec, MatrixAccessor):
+        return spec
+
+    name, shape, dtype = spec
+
+    if name not in _blocks:
+        #Workers are children of the process that created the block and share its resource tracker, so the block is
+        #only unlinked once, by its creator
+        shm = shared_memory.SharedMemory(name=name)
+        _blocks[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+    return _blocks[name][1]
+
+
+def shared_spec(mat):
+
+    """
+    This function returns the spec of the shared memory block holding mat, or None if mat is not in shared memory
+    """
+
+    for name, (shm, array) in _blocks.items():
+        if array is mat:
+            return (name, array.shape, array.dtype.str)
+
+    return None
+
+
+#Matrix and task function of a pool worker, set once when the worker starts
+_pool_mat = None
+_pool_func = None
+
+
+def _init_worker(spec, func, profile):
+    global _pool_mat, _pool_func
+    _pool_mat = attach_matrix(spec)
+    _pool_func = func
+
+    #Profile the tasks if the pool was made with profiling on, starting from no stats
+    if profile:
+        profiler.enable()
+    profiler.collect()
+
+
+def _run_task(task):
+    result = _pool_func(_pool_mat, task)
+    if profiler.enabled():
+        return result, profiler.collect()
+    return result
+
+
+class MatrixPool:
+
+    """
+    This class runs func(mat, task) for lists of tasks in a pool of worker processes, which read mat from shared memory
+    func has to be a module level function so it can be sent to the workers
+    With a single worker the tasks are run in this process on mat itself, with no pool or shared memory
+    If mat is already in shared memory, the workers read the same block rather than a new copy, and a matrix accessor is
+    sent to the workers as it is
+    """
+
+    def __init__(self, mat, workers, func):
+        self.mat = mat
+        self.func = func
+        self.shared = None
+        self.pool = None
+
+        if workers > 1:
+            spec = mat if isinstance(mat, MatrixAccessor) else shared_spec(mat)
+            if spec is None:
+                self.shared = SharedMatrix(mat)
+                spec = self.shared.spec
+            self.pool = mp.Pool(workers, initializer=_init_worker, initargs=(spec, func, profiler.enabled()))
+
+    def map(self, tasks):
+        if self.pool is None:
+            return [self.func(self.mat, task) for task in tasks]
+        results = self.pool.map(_run_task, tasks, chunksize=1)
+
+        #With profiling on, the workers send back the stats of each task with its result
+        if profiler.enabled():
+            for _, stats in results:
+                profiler.merge(stats)
+            return [result for result, _ in results]
+
+        return results
+
+    def close(self, terminate=False):
+        if self.pool is not None:
+            if terminate:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            if self.shared is not None:
+                self.shared.close()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        #Stop the workers straight away if the tasks failed
+        self.close(terminate=exc_type is not None)
@@ -0,0 +1,153 @@
+import numpy as np
+
+from utils.matrixAccessor import MatrixAccessor
+from utils.condensedMatrix import read_header, write_header, aligned, value_scale, encode
+
+
+def _layout(n, nnz, offset, dtype):
+
+    #Offsets of the row pointers, column indices and values in the file, and the end of the file
+    indptr = offset
+    indices = aligned(indptr + (n + 1) * 8)
+    data = aligned(indices + nnz * 4)
+
+    return indptr, indices, data, data + nnz * np.dtype(dtype).itemsize
+
+
+def write_sparse(path, mat, headings, dtype=np.float32, diagonal=1.0, scale=None):
+
+    """
+    This function writes the symmetric sparse matrix mat with its headings to path as a condensed matrix file with the
+    sparse layout, which only holds the pairs in mat, so its size grows with their number rather than with n^2
+    mat is a CSR matrix, e.g. a scipy.sparse.csr_matrix, with each pair in both orders, sorted columns in each row and
+    nothing on the diagonal, as init_head_mat.read_sparse_identities gives
+    Pairs not in mat are read as 0, and values are stored as with write_condensed
+    """
+
+    n = mat.shape[0]
+    nnz = len(mat.data)
+    dtype = np.dtype(dtype)
+
+    if scale is None:
+        scale = value_scale(dtype, float(mat.data.max()) if nnz and dtype.kind == 'u' else 0.0)
+
+    offset = write_header(path, {'layout': 'csr', 'n': n, 'nnz': nnz, 'dtype': dtype.str, 'scale': scale, 'diagonal': diagonal, 'headings': list(headings)})
+    indptr_at, indices_at, data_at, end = _layout(n, nnz, offset, dtype)
+
+    with open(path, 'r+b') as f:
+        f.truncate(end)
+        f.seek(indptr_at)
+        np.asarray(mat.indptr, dtype='<i8').tofile(f)
+        f.seek(indices_at)
+        np.asarray(mat.indices, dtype='<i4').tofile(f)
+
+        #The values are encoded a block at a time, so there is never a second copy of all of them
+        f.seek(data_at)
+        for start in range(0, nnz, 2**22):
+            encode(np.asarray(mat.data[start:start + 2**22]), dtype, scale).tofile(f)
+
+    return path
+
+
+class SparseMatrix(MatrixAccessor):
+
+    """
+    This class reads a condensed matrix file with the sparse layout, memory mapped, so memory and disk use grow with the
+    number of pairs stored rather than with n^2
+    Pairs not stored are read as a stored 0, a similarity of 0, so a distance of 1 for the MaxMin solvers
+    A row is built from the pairs stored in it, and a pair is found by a binary search of the sorted columns of its row
+    It can be sent to worker processes, which open the file again rather than being sent its values
+    """
+
+    def __init__(self, path):
+        header, offset = read_header(path)
+        super().__init__(header['n'], header['dtype'], header['diagonal'], header.get('scale', 1.0))
+        self.path = path
+        self.headings = header['headings']
+        self.nnz = header['nnz']
+        self.offset = offset
+        self._open()
+
+
+    def _open(self):
+
+        indptr_at, indices_at, data_at, _ = _layout(self.n, self.nnz, self.offset, self.stored_dtype)
+        self.indptr = np.memmap(self.path, dtype='<i8', mode='r', offset=indptr_at, shape=(self.n + 1,)).view(np.ndarray)
+
+        if self.nnz:
+            self.indices = np.memmap(self.path, dtype='<i4', mode='r', offset=indices_at, shape=(self.nnz,)).view(np.ndarray)
+            self.data = np.memmap(self.path, dtype=self.stored_dtype, mode='r', offset=data_at, shape=(self.nnz,)).view(np.ndarray)
+        else:
+            self.indices = np.empty(0, dtype='<i4')
+            self.data = np.empty(0, dtype=self.stored_dtype)
+
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for key in ('indptr', 'indices', 'data'):
+            del state[key]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+    def _row(self, i):
+        row = np.zeros(self.n, dtype=self.stored_dtype)
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        row[self.indices[start:stop]] = self.data[start:stop]
+        return row
+
+
+    def _pairs(self, rows, cols):
+
+        if self.nnz == 0:
+            return np.zeros(np.shape(rows), dtype=self.stored_dtype)
+
+        #Binary search for the first stored column of each row that is not below the column of the pair, all pairs at once
+        low = self.indptr[rows]
+        high = end = self.indptr[rows + 1]
+        active = low < high
+
+        while active.any():
+            mid = (low + high) // 2
+            below = self.indices[np.minimum(mid, self.nnz - 1)] < cols
+            low = np.where(active & below, mid + 1, low)
+            high = np.where(active & ~below, mid, high)
+            active = low < high
+
+        at = np.minimum(low, self.nnz - 1)
+        found = (low < end) & (self.indices[at] == cols)
+
+        return np.where(found, self.data[at], 0).astype(self.stored_dtype)
+
+
+    def sum(self, axis=None, dtype=None, out=None):
+
+        """
+        This sums the matrix as np.sum does, from the stored pairs, with the pairs not stored in each row added in one go,
+        so it takes time in the number of pairs stored rather than n^2
+        The sums are in float64 and in another order from those of a dense matrix, so they can differ in the last bits
+        """
+
+        #Value of a pair not stored, once decoded and transformed
+        absent = float(self._finish(np.zeros(1, dtype=self.stored_dtype), np.zeros(1, dtype=bool))[0])
+
+        sums = np.zeros(self.n)
+        for start in range(0, self.nnz, 2**22):
+            stop = min(start + 2**22, self.nnz)
+            rows = np.searchsorted(self.indptr, np.arange(start, stop), side='right') - 1
+            values = self._finish(np.array(self.data[start:stop]), np.zeros(stop - start, dtype=bool))
+            sums += np.bincount(rows, weights=values, minlength=self.n)
+
+        sums += (self.n - 1 - np.diff(self.indptr)) * absent + self.diagonal
+        sums = sums.astype(np.dtype(dtype or self.dtype))
+
+        result = sums if axis is not None else sums.sum(dtype=dtype)
+        if out is not None:
+            out[...] = result
+            return out
+
+        return result
@@ -0,0 +1,68 @@
+import numpy as np
+import time
+import os
+
+#Codes of the move made in a step of a tabu search
+ACCEPT, ASPIRATION, DEFAULT = 0, 1, 2
+
+
+def trace_path(trace, number):
+
+    """
+    This function returns the trace file of search number of a run, from the trace file of the run
+    """
+
+    base, ext = os.path.splitext(trace)
+
+    return f'{base}_{number}{ext}'
+
+
+class TraceRecorder:
+
+    """
+    This class records one row of values for each step of a search into a preallocated structured array, which doubles
+    when full, so a step costs one row assignment and no string formatting
+    columns is a list of (name, dtype), and a time column of seconds since the recorder was made comes first
+    """
+
+    def __init__(self, columns, capacity=4096):
+
+        self._buf = np.zeros(capacity, dtype=[('time', np.float64)] + list(columns))
+        self._len = 0
+        self._start = time.perf_counter()
+
+
+    def __len__(self):
+        return self._len
+
+
+    @property
+    def data(self):
+        #The rows recorded so far
+        return self._buf[:self._len]
+
+
+    def record(self, *values):
+
+        if self._len == len(self._buf):
+            self._buf = np.concatenate([self._buf, np.zeros_like(self._buf)])
+
+        self._buf[self._len] = (time.perf_counter() - self._start,) + values
+        self._len += 1
+
+
+    def save(self, path):
+
+        """
+        This writes the trace to path, as comma separated values with a header if path ends in .csv, and otherwise as a
+        .npz file of one array per column
+        """
+
+        data = self.data
+        names = data.dtype.names
+
+        if path.endswith('.csv'):
+            fmt = ['%d' if np.issubdtype(data.dtype[name], np.integer) else '%.17g' for name in names]
+            np.savetxt(path, data, fmt=fmt, delimiter=',', header=','.join(names), comments='')
+        else:
+            np.savez(path, **{name: data[name] for name in names})